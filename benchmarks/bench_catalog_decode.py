@@ -0,0 +1,103 @@
+"""
+Benchmark products.json decoding: the old response.json() dict path against
+catalog_decode.decode_products.
+
+Usage:
+    python benchmarks/bench_catalog_decode.py [catalog.json ...]
+
+Pass recorded catalogs (e.g. saved with
+`curl -o dtlr.json "https://www.dtlr.com/products.json?limit=250"`); with no
+arguments a synthetic 250-product catalog shaped like a real store is used.
+"""
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_decode import decode_products
+
+
+def synthetic_catalog(count: int = 250, seed: int = 7) -> bytes:
+    """A products.json body with the fields and rough sizes of a sneaker store"""
+    rng = random.Random(seed)
+    brands = ["Nike", "Jordan", "Adidas", "New Balance", "Asics", "Puma"]
+    products = []
+    for i in range(count):
+        brand = rng.choice(brands)
+        product_id = 7000000000 + i
+        products.append({
+            "id": product_id,
+            "title": f"{brand} Model {rng.randint(1, 999)} '{rng.choice(['Black', 'White', 'Panda', 'Bred'])}'",
+            "handle": f"{brand.lower().replace(' ', '-')}-model-{i}",
+            "body_html": "<p>" + " ".join(rng.choice(["premium", "leather", "upper", "cushioned", "sole"]) for _ in range(120)) + "</p>",
+            "published_at": "2025-03-01T10:00:00-05:00",
+            "created_at": "2025-02-20T10:00:00-05:00",
+            "updated_at": f"2025-03-0{rng.randint(1, 9)}T10:00:00-05:00",
+            "vendor": brand,
+            "product_type": "Footwear",
+            "tags": [brand, "Sneakers", f"size-run-{rng.randint(1, 5)}"],
+            "variants": [{
+                "id": product_id * 100 + size,
+                "title": str(size / 2),
+                "option1": str(size / 2), "option2": None, "option3": None,
+                "sku": f"SKU{product_id}{size}",
+                "requires_shipping": True, "taxable": True, "featured_image": None,
+                "available": rng.random() > 0.4,
+                "price": f"{rng.randint(90, 300)}.00",
+                "grams": 1200, "compare_at_price": None, "position": size,
+                "product_id": product_id,
+                "created_at": "2025-02-20T10:00:00-05:00",
+                "updated_at": "2025-03-01T10:00:00-05:00"
+            } for size in range(14, 30)],
+            "images": [{
+                "id": product_id * 10 + n, "created_at": "2025-02-20T10:00:00-05:00", "position": n + 1,
+                "updated_at": "2025-02-20T10:00:00-05:00", "product_id": product_id, "variant_ids": [],
+                "src": f"https://cdn.shopify.com/s/files/1/0000/products/{product_id}_{n}.jpg",
+                "width": 2000, "height": 2000
+            } for n in range(5)],
+            "options": [{"name": "Size", "position": 1, "values": [str(s / 2) for s in range(14, 30)]}]
+        })
+    return json.dumps({"products": products}).encode()
+
+
+def legacy_decode(body: bytes):
+    """What response.json() produced before: the full nested dict tree"""
+    return json.loads(body).get("products", [])
+
+
+def measure(decode, body: bytes, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        decode(body)
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    result = decode(body)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return statistics.median(timings), retained, peak
+
+
+def main():
+    paths = sys.argv[1:]
+    catalogs = [(path, open(path, 'rb').read()) for path in paths] or [("synthetic-250", synthetic_catalog())]
+    repeats = 50
+
+    for name, body in catalogs:
+        print(f"\n{name}: {len(body) / 1024:.0f} KiB, {len(decode_products(body))} products")
+        for label, decode in [("response.json()", legacy_decode), ("decode_products", decode_products)]:
+            median, retained, peak = measure(decode, body, repeats)
+            print(f"  {label:<16} {median * 1000:8.2f} ms   retained {retained / 1024:8.0f} KiB   peak {peak / 1024:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Exercise the shared Discord rate limiter against a local stand-in for Discord.
+
+The stand-in enforces Discord-style webhook buckets (--limit requests per
+--reset seconds, per webhook or one bucket shared by all with --shared-bucket)
+and answers with realistic X-RateLimit-* headers. With --global-after N it
+answers request N with a global 429 and counts anything sent while that
+pause lasts (after a short grace for requests already in flight). A correct
+limiter finishes close to the ideal time the buckets allow, with at most one
+429 per shared bucket while it learns the bucket ids, and no requests during
+the pause.
+
+Usage:
+    python benchmarks/bench_discord_ratelimit.py [--webhooks 4] [--messages 20]
+        [--limit 5] [--reset 2] [--shared-bucket] [--global-after 10]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from discord_ratelimit import rate_limiter
+from discord_webhook import RateLimitedDiscordWebhook, close_webhook_session
+from standins import DiscordStandIn
+
+PAYLOAD = {"username": "Monitor", "embeds": [{"title": "Nike Dunk Low 'Panda'", "fields": []}]}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--webhooks", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=20, help="messages per webhook")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--reset", type=float, default=2.0)
+    parser.add_argument("--shared-bucket", action="store_true")
+    parser.add_argument("--global-after", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    discord = DiscordStandIn(args.limit, args.reset, args.shared_bucket, args.global_after)
+    runner = web.AppRunner(discord.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    webhooks = []
+    for index in range(args.webhooks):
+        webhook = RateLimitedDiscordWebhook(f"https://discord.com/api/webhooks/{index}/token")
+        webhook.webhook_url = f"http://127.0.0.1:{port}/api/webhooks/{index}/token"
+        webhooks.append(webhook)
+
+    async def sender(webhook):
+        return [await webhook._send_webhook_with_backoff(PAYLOAD) for _ in range(args.messages)]
+
+    peak_depth = [0]
+
+    async def sample_depth():
+        while True:
+            peak_depth[0] = max(peak_depth[0], rate_limiter.stats()["queued"])
+            await asyncio.sleep(0.01)
+
+    # Send concurrently per webhook too, the way batches from several users overlap
+    monitor = asyncio.create_task(sample_depth())
+    start = time.monotonic()
+    results = await asyncio.gather(*(sender(w) for w in webhooks for _ in range(2)))
+    elapsed = time.monotonic() - start
+    monitor.cancel()
+
+    total = args.webhooks * args.messages * 2
+    per_bucket = total if args.shared_bucket else args.messages * 2
+    ideal = max((math.ceil(per_bucket / args.limit) - 1) * args.reset, 1.0 if args.global_after else 0)
+    delivered = sum(result is not None for batch in results for result in batch)
+    print(f"{total} messages over {args.webhooks} webhooks"
+          f"{' sharing one bucket' if args.shared_bucket else ''}, {args.limit}/{args.reset:g}s per bucket")
+    print(f"  delivered {delivered}/{total} in {elapsed:.2f}s (ideal ~{ideal:.2f}s)")
+    print(f"  bucket 429s {discord.bucket_429s}, requests during global pause {discord.global_violations}, "
+          f"peak queue depth {peak_depth[0]}")
+    print(f"  limiter {json.dumps(rate_limiter.stats())}")
+
+    await close_webhook_session()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""
+End-to-end benchmark: MonitorManager against local Shopify and Discord stand-ins.
+
+The stand-ins (benchmarks/standins.py) run in a child process so their CPU
+is not billed to the monitor. After a warm-up that lets every store finish
+its baseline scan, the catalogs start churning: new products, some matching
+one of the keywords, and restocks. The benchmark then reports, for the
+measured window, polls/s, the monitor process's CPU and peak RSS, and the
+p50/p99 time from a matching product appearing in a catalog to its embed
+reaching the webhook stand-in.
+
+Usage:
+    python benchmarks/bench_end_to_end.py [--stores 50] [--keywords 20] [--duration 30]
+        [--churn 2] [--interval 1] [--latency 0.02] [--rate-429 0] [--rate-5xx 0]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import aiohttp
+import psutil
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+
+from standins import make_keywords
+
+
+class StandInRepository:
+    """The two MonitorRepository calls MonitorManager makes while running"""
+
+    async def config_versions(self):
+        return {}
+
+    async def ping(self):
+        return True
+
+
+def start_standins(args) -> tuple:
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS, "standins.py"), "--no-churn",
+         "--stores", str(args.stores), "--catalog-size", str(args.catalog_size), "--churn", str(args.churn),
+         "--keywords", str(args.keywords), "--latency", str(args.latency),
+         "--rate-429", str(args.rate_429), "--rate-5xx", str(args.rate_5xx)],
+        stdout=subprocess.PIPE, text=True
+    )
+    return process, json.loads(process.stdout.readline())
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stores", type=int, default=50)
+    parser.add_argument("--keywords", type=int, default=20)
+    parser.add_argument("--catalog-size", type=int, default=500)
+    parser.add_argument("--churn", type=float, default=2.0, help="catalog changes per second, all stores")
+    parser.add_argument("--interval", type=float, default=1.0, help="monitor_delay between polls of a store")
+    parser.add_argument("--rate-limit", type=float, default=5.0, help="requests per second per store")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    args = parser.parse_args()
+
+    standins, endpoints = start_standins(args)
+    workdir = tempfile.TemporaryDirectory()
+    try:
+        # main.py logs to ./logs and keeps its SQLite state in the working directory
+        os.environ["SEEN_PRODUCTS_DB"] = os.path.join(workdir.name, "seen_products.db")
+        os.environ["OUTBOX_DB"] = os.path.join(workdir.name, "notification_outbox.db")
+        os.chdir(workdir.name)
+        logging.disable(logging.WARNING)
+        import main as monitor_main
+
+        config = SimpleNamespace(
+            rate_limit=args.rate_limit, batch_size=args.concurrency, max_products=args.catalog_size,
+            initial_product_limit=150, monitor_delay=args.interval, min_cycle_delay=0.05,
+            success_delay_multiplier=0.25
+        )
+        manager = monitor_main.MonitorManager(1, "https://discord.com/api/webhooks/1/standin", config,
+                                              StandInRepository())
+        manager.webhook.webhook_url = endpoints["webhook"]
+        keywords = make_keywords(args.keywords)
+        process = psutil.Process()
+
+        async with aiohttp.ClientSession() as control:
+            async def standin_stats():
+                async with control.get(f"{endpoints['control']}/_stats") as response:
+                    return await response.json()
+
+            print(f"{args.stores} stores x {args.catalog_size} products, {args.keywords} keywords, "
+                  f"{args.churn:g} changes/s, {args.interval:g}s poll interval")
+            runner = asyncio.create_task(manager.monitor_stores(endpoints["stores"], keywords))
+            await asyncio.sleep(args.warmup)
+
+            before = await standin_stats()
+            cpu_before = process.cpu_times()
+            started = time.monotonic()
+            async with control.post(f"{endpoints['control']}/_churn") as response:
+                await response.read()
+
+            peak_rss = process.memory_info().rss
+            while time.monotonic() - started < args.duration:
+                await asyncio.sleep(0.5)
+                peak_rss = max(peak_rss, process.memory_info().rss)
+            elapsed = time.monotonic() - started
+            cpu_after = process.cpu_times()
+            after = await standin_stats()
+
+            manager.running = False
+            await runner
+            await manager.monitor.cleanup()
+            await monitor_main.close_webhook_session()
+            monitor_main.seen_products.close()
+            monitor_main.outbox_journal.close()
+
+        cpu = (cpu_after.user + cpu_after.system - cpu_before.user - cpu_before.system) / elapsed
+        polls = after["shopify"]["polls"] - before["shopify"]["polls"]
+        print(f"  polls/s            {polls / elapsed:8.1f}   ({after['shopify']['not_modified']} answered 304)")
+        print(f"  monitor CPU        {cpu * 100:8.1f} % of one core")
+        print(f"  monitor peak RSS   {peak_rss / 2 ** 20:8.1f} MiB")
+        if after["notified"]:
+            print(f"  appear -> webhook  p50 {after['latency_p50'] * 1000:8.1f} ms   "
+                  f"p99 {after['latency_p99'] * 1000:8.1f} ms   "
+                  f"({after['notified']}/{after['shopify']['matching_products_added']} notified)")
+        else:
+            print("  appear -> webhook  no matching products were notified")
+        print(f"  shopify {json.dumps(after['shopify'])}")
+        print(f"  discord {json.dumps(after['discord'])}")
+    finally:
+        standins.terminate()
+        standins.wait()
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
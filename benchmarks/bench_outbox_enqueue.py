@@ -0,0 +1,101 @@
+"""
+Benchmark what the durable outbox journal adds to a store poll.
+
+Times NotificationOutbox.submit per notification with and without an
+OutboxJournal (the part that runs inline on the poll path), then the batched
+SQLite write-back that runs off the event loop. No webhook is contacted: the
+delivery workers never get to run while submit is being timed.
+
+Usage:
+    python benchmarks/bench_outbox_enqueue.py [--count 20000] [--batch 10]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notification_outbox import NotificationOutbox
+from outbox_journal import OutboxJournal
+from products import Product, Variant
+from seen_store import SeenProductStore
+
+
+class IdleWebhook:
+    """Stands in for RateLimitedDiscordWebhook; never asked to send during the benchmark"""
+
+    def __init__(self, webhook_url: str):
+        self.webhook_url = webhook_url
+
+    async def send_product_notification(self, product) -> bool:
+        return True
+
+
+def make_products(count: int):
+    return [
+        Product(
+            id=index, title=f"Nike Dunk Low 'Panda' {index}", handle=f"dunk-low-{index}",
+            store_url="https://kith.com", price="110.00", image_url="https://cdn.shopify.com/p.jpg",
+            vendor="Nike", product_type="Footwear", tags=("sneakers", "nike"),
+            variants=tuple(Variant(index * 20 + size, str(size), True, 3) for size in range(7, 14))
+        )
+        for index in range(count)
+    ]
+
+
+async def time_submits(outbox: NotificationOutbox, products, batch: int):
+    webhook = IdleWebhook("https://discord.com/api/webhooks/0/bench")
+    timings = []
+    for start in range(0, len(products), batch):
+        chunk = products[start:start + batch]
+        began = time.perf_counter()
+        await outbox.submit(webhook, "https://kith.com", chunk, 1, lambda store_url, product_id, event, user_id: None)
+        timings.append((time.perf_counter() - began) / len(chunk))
+    return statistics.median(timings) * 1e6, max(timings) * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=10, help="products per submit, as from one store poll")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    products = make_products(args.count)
+    with tempfile.TemporaryDirectory() as directory:
+        seen = SeenProductStore(os.path.join(directory, "seen.db"))
+        seen.load()  # As the monitor does at startup; misses then never touch disk
+        print(f"{args.count} notifications, {args.batch} per submit")
+
+        outbox = NotificationOutbox(seen, max_pending=args.count)
+        p50, worst = await time_submits(outbox, products, args.batch)
+        print(f"  submit, no journal       p50 {p50:6.2f} us   max {worst:7.2f} us per notification")
+        await outbox.close(timeout=0)
+
+        journal = OutboxJournal(os.path.join(directory, "outbox.db"), flush_batch=args.count + 1)
+        outbox = NotificationOutbox(seen, journal, max_pending=args.count)
+        p50, worst = await time_submits(outbox, products, args.batch)
+        print(f"  submit, with journal     p50 {p50:6.2f} us   max {worst:7.2f} us per notification")
+
+        pending = len(journal.writes)
+        began = time.perf_counter()
+        journal.flush()
+        elapsed = time.perf_counter() - began
+        print(f"  write-back (off loop)    {pending} rows in {elapsed * 1000:.1f} ms "
+              f"({elapsed / pending * 1e6:.2f} us per row)")
+
+        for queue in outbox.queues.values():
+            queue.items.clear()
+            queue.index.clear()
+        await outbox.close(timeout=0)
+        journal.close()
+        seen.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+"""
+Benchmark webhook time-to-deliver: a fresh connector and session per
+notification (the old delivery path) against the shared keep-alive session.
+
+A local aiohttp server stands in for Discord and answers 204. Loopback
+connections are nearly free, so the server delays the first request on each
+new connection by --setup-ms to stand in for the DNS, TCP and TLS round trips
+a real connection to discord.com costs; pass --tls to add a real TLS
+handshake as well (needs the openssl CLI for a throwaway certificate).
+
+Usage:
+    python benchmarks/bench_webhook_delivery.py [--count 200] [--setup-ms 30] [--tls]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from discord_webhook import RateLimitedDiscordWebhook, close_webhook_session, warm_up_webhooks
+
+PAYLOAD = {"username": "Monitor", "embeds": [{"title": "Nike Dunk Low 'Panda'", "fields": []}]}
+
+
+def make_server(setup_delay: float) -> web.Application:
+    seen_connections = set()
+
+    async def webhook(request):
+        await request.read()
+        connection = id(request.transport)
+        if connection not in seen_connections:
+            seen_connections.add(connection)
+            await asyncio.sleep(setup_delay)
+        return web.Response(status=204)  # No rate-limit headers: measure delivery, not pacing
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", webhook)
+    return app
+
+
+def self_signed_context(directory: str):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-keyout", key, "-out", cert],
+        check=True, capture_output=True
+    )
+    server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_context.load_cert_chain(cert, key)
+    return server_context
+
+
+async def legacy_send(url: str) -> bool:
+    """What each notification did before: a new connector and session per send"""
+    conn = aiohttp.TCPConnector(ssl=False, force_close=True, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=30, connect=10)
+    async with aiohttp.ClientSession(connector=conn, timeout=timeout) as session:
+        async with session.post(url, json=PAYLOAD, headers={"Content-Type": "application/json"}) as response:
+            await response.text()
+            return {} if response.status == 204 else None
+
+
+def pooled_sender(url: str):
+    webhook = RateLimitedDiscordWebhook("https://discord.com/api/webhooks/0/bench")
+    webhook.webhook_url = url
+    return lambda: webhook._send_webhook_with_backoff(PAYLOAD)
+
+
+async def measure(send, count: int):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        if await send() is None:
+            raise RuntimeError("delivery failed")
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--setup-ms", type=float, default=30.0)
+    parser.add_argument("--tls", action="store_true")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as directory:
+        server_context = self_signed_context(directory) if args.tls else None
+        runner = web.AppRunner(make_server(args.setup_ms / 1000))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0, ssl_context=server_context)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"{'https' if args.tls else 'http'}://127.0.0.1:{port}/api/webhooks/0/bench"
+
+        if args.tls:
+            # The throwaway certificate is not trusted; the old path never verified either
+            import discord_webhook
+            discord_webhook._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(ssl=False, keepalive_timeout=60),
+                headers={"Content-Type": "application/json"}
+            )
+
+        print(f"{args.count} deliveries, {args.setup_ms:.0f} ms simulated connection setup"
+              f"{', TLS' if args.tls else ''}")
+        p50, p99 = await measure(lambda: legacy_send(url), args.count)
+        print(f"  session per send   p50 {p50 * 1000:7.2f} ms   p99 {p99 * 1000:7.2f} ms")
+
+        await warm_up_webhooks([url])
+        p50, p99 = await measure(pooled_sender(url), args.count)
+        print(f"  shared session     p50 {p50 * 1000:7.2f} ms   p99 {p99 * 1000:7.2f} ms")
+
+        await close_webhook_session()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
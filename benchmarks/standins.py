@@ -0,0 +1,374 @@
+"""
+Local aiohttp stand-ins for Shopify stores and Discord webhooks.
+
+ShopifyStandIn serves synthetic products.json catalogs, one store per
+loopback address (127.0.0.2, 127.0.0.3, ...) so each gets its own per-host
+rate limit, with ETag/304 support, configurable catalog size, churn
+(products appearing and restocking), response latency and injected 429s
+and 5xxs. Products it creates record when they appeared.
+
+DiscordStandIn emulates webhook execution and message edits with Discord's
+rate-limit headers (per-webhook or shared buckets, optional global 429) and
+records when each embed arrived, so appearance-to-webhook latency can be
+measured end to end.
+
+Run standalone to get both servers for manual testing:
+    python benchmarks/standins.py [--stores 10] [--catalog-size 500] [--churn 2]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+VOCABULARY = ("Classic", "Runner", "Low", "High", "Mid", "Retro", "Premium", "Trail", "Court", "Canvas",
+              "Suede", "Leather", "Knit", "Slide", "Boot", "Tee", "Hoodie", "Cap", "Crew", "Jacket")
+SIZES = ("7", "7.5", "8", "8.5", "9", "9.5", "10", "10.5", "11", "12", "13")
+
+
+def make_keywords(count: int) -> List[str]:
+    """Keywords that never collide with the vocabulary of unmatched products"""
+    return [f"drop{index:04d}" for index in range(count)]
+
+
+class StandInStore:
+    """One synthetic catalog, newest-updated first like a live products.json"""
+
+    def __init__(self, index: int, size: int, rng: random.Random):
+        self.index = index
+        self.rng = rng
+        self.clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.next_id = index * 10_000_000 + 1
+        self.products: List[Dict] = []
+        for _ in range(size):
+            self.products.append(self._product(" ".join(rng.sample(VOCABULARY, 3)), available=rng.random() < 0.7))
+        self.products.reverse()
+        self.pages: Dict[tuple, tuple] = {}
+
+    def _tick(self) -> str:
+        self.clock += timedelta(seconds=1)
+        return self.clock.isoformat()
+
+    def _product(self, title: str, available: bool = True) -> Dict:
+        product_id = self.next_id
+        self.next_id += 1
+        return {
+            "id": product_id,
+            "title": title,
+            "handle": f"s{self.index}-{product_id}",
+            "vendor": "Stand-in",
+            "product_type": "Footwear",
+            "tags": ["sneakers"],
+            "updated_at": self._tick(),
+            "variants": [
+                {"id": product_id * 100 + offset, "title": size, "available": available and self.rng.random() < 0.8,
+                 "price": "120.00", "inventory_quantity": self.rng.randint(1, 10)}
+                for offset, size in enumerate(SIZES)
+            ],
+            "images": [{"src": f"https://cdn.example.com/{product_id}.jpg"}],
+        }
+
+    def add(self, title: str) -> Dict:
+        product = self._product(title)
+        self.products.insert(0, product)
+        self.pages.clear()
+        return product
+
+    def restock(self) -> Optional[Dict]:
+        if not self.products:
+            return None
+        product = self.products.pop(self.rng.randrange(len(self.products)))
+        for variant in product["variants"]:
+            variant["available"] = not variant["available"] if self.rng.random() < 0.5 else variant["available"]
+        product["updated_at"] = self._tick()
+        self.products.insert(0, product)
+        self.pages.clear()
+        return product
+
+    def page(self, limit: int, page: int) -> tuple:
+        """(body, etag) for one page, cached until the catalog changes"""
+        key = (limit, page)
+        cached = self.pages.get(key)
+        if cached is None:
+            start = (page - 1) * limit
+            body = json.dumps({"products": self.products[start:start + limit]}).encode()
+            cached = self.pages[key] = (body, f'"{hashlib.md5(body).hexdigest()}"')
+        return cached
+
+
+class ShopifyStandIn:
+    """Synthetic Shopify stores with churn, latency and error injection"""
+
+    def __init__(self, stores: int = 10, catalog_size: int = 500, churn: float = 2.0, restock_ratio: float = 0.5,
+                 keywords: Optional[List[str]] = None, match_ratio: float = 0.5, latency: float = 0.0,
+                 rate_429: float = 0.0, rate_5xx: float = 0.0, seed: int = 1):
+        self.rng = random.Random(seed)
+        self.stores = [StandInStore(index, catalog_size, self.rng) for index in range(stores)]
+        self.churn = churn  # Catalog changes per second across all stores
+        self.restock_ratio = restock_ratio
+        self.keywords = keywords or make_keywords(1)
+        self.match_ratio = match_ratio
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.hosts: Dict[str, StandInStore] = {}
+        self.urls: List[str] = []
+        self.appeared: Dict[str, float] = {}  # handle -> wall-clock time a matching product appeared
+        self.requests = 0
+        self.polls = 0
+        self.not_modified = 0
+        self.injected_429 = 0
+        self.injected_5xx = 0
+        self._churn_task: Optional[asyncio.Task] = None
+
+    async def products_json(self, request: web.Request) -> web.Response:
+        store = self.hosts[request.host]
+        self.requests += 1
+        page = int(request.query.get("page", 1))
+        limit = min(250, int(request.query.get("limit", 50)))
+        if page == 1:
+            self.polls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        if self.rng.random() < self.rate_429:
+            self.injected_429 += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        if self.rng.random() < self.rate_5xx:
+            self.injected_5xx += 1
+            return web.Response(status=self.rng.choice((500, 502, 503)))
+
+        body, etag = store.page(limit, page)
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+
+    def change(self):
+        """Apply one catalog change: a new product (matching a keyword at match_ratio) or a restock"""
+        store = self.rng.choice(self.stores)
+        if self.rng.random() < self.restock_ratio:
+            store.restock()
+            return
+        words = self.rng.sample(VOCABULARY, 2)
+        if self.rng.random() < self.match_ratio:
+            words.append(self.rng.choice(self.keywords))
+        product = store.add(" ".join(words))
+        if len(words) == 3:
+            self.appeared[product["handle"]] = time.time()
+
+    async def _run_churn(self):
+        while True:
+            await asyncio.sleep(self.rng.expovariate(self.churn))
+            self.change()
+
+    def start_churn(self):
+        if self.churn > 0 and self._churn_task is None:
+            self._churn_task = asyncio.create_task(self._run_churn())
+
+    async def start(self, runner: web.AppRunner):
+        """Bind one site per store on its own loopback address"""
+        for store in self.stores:
+            address = f"127.0.{store.index // 250}.{store.index % 250 + 2}"
+            site = web.TCPSite(runner, address, 0)
+            await site.start()
+            host = f"{address}:{site._server.sockets[0].getsockname()[1]}"
+            self.hosts[host] = store
+            self.urls.append(f"http://{host}")
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/products.json", self.products_json)
+        return app
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "polls": self.polls,
+            "not_modified": self.not_modified,
+            "injected_429": self.injected_429,
+            "injected_5xx": self.injected_5xx,
+            "matching_products_added": len(self.appeared),
+        }
+
+
+class DiscordStandIn:
+    """Discord webhook execute/edit endpoints with fixed-window buckets and Discord's headers"""
+
+    def __init__(self, limit: int = 5, reset: float = 2.0, shared_bucket: bool = False, global_after: int = 0):
+        self.limit = limit
+        self.reset = reset
+        self.shared_bucket = shared_bucket
+        self.global_after = global_after
+        self.global_until = 0.0
+        self.windows = {}
+        self.next_message_id = 1
+        self.requests = 0
+        self.messages = 0
+        self.edits = 0
+        self.bucket_429s = 0
+        self.global_violations = 0
+        self.received: Dict[str, float] = {}  # embed url -> wall-clock time first received
+
+    def _limit(self, bucket: str, now: float):
+        """Rate-limit headers for a request on ``bucket``, plus the 429 response if it is over"""
+        started, count = self.windows.get(bucket, (now, 0))
+        if now - started >= self.reset:
+            started, count = now, 0
+        reset_after = self.reset - (now - started)
+        headers = {
+            "X-RateLimit-Bucket": f"bucket-{bucket}",
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+        }
+        if count >= self.limit:
+            self.bucket_429s += 1
+            headers.update({"X-RateLimit-Remaining": "0", "X-RateLimit-Scope": "user"})
+            body = {"message": "You are being rate limited.", "retry_after": round(reset_after, 3), "global": False}
+            return headers, web.Response(status=429, text=json.dumps(body), headers=headers,
+                                         content_type="application/json")
+        self.windows[bucket] = (started, count + 1)
+        headers["X-RateLimit-Remaining"] = str(self.limit - count - 1)
+        return headers, None
+
+    async def _handle(self, request: web.Request, route: str):
+        payload = await request.json()
+        now = time.monotonic()
+        self.requests += 1
+        # Requests already in flight when a global 429 went out get a short grace period
+        if self.global_until - 0.95 < now < self.global_until:
+            self.global_violations += 1
+        if self.requests == self.global_after:
+            self.global_until = now + 1.0
+            return None, web.json_response(
+                {"message": "You are being rate limited.", "retry_after": 1.0, "global": True},
+                status=429, headers={"X-RateLimit-Global": "true", "X-RateLimit-Scope": "global", "Retry-After": "1"}
+            )
+
+        bucket = "shared" if self.shared_bucket else f"{request.match_info['webhook_id']}-{route}"
+        headers, limited = self._limit(bucket, now)
+        if limited is not None:
+            return None, limited
+
+        received_at = time.time()
+        for embed in payload.get("embeds", ()):
+            self.received.setdefault(embed.get("url", ""), received_at)
+        return payload, headers
+
+    async def execute(self, request: web.Request) -> web.Response:
+        payload, result = await self._handle(request, "execute")
+        if payload is None:
+            return result
+        self.messages += 1
+        message_id = str(self.next_message_id)
+        self.next_message_id += 1
+        if request.query.get("wait") == "true":
+            return web.json_response({"id": message_id, "embeds": payload.get("embeds", [])}, headers=result)
+        return web.Response(status=204, headers=result)
+
+    async def edit(self, request: web.Request) -> web.Response:
+        payload, result = await self._handle(request, "edit")
+        if payload is None:
+            return result
+        self.edits += 1
+        return web.json_response({"id": request.match_info["message_id"], "embeds": payload.get("embeds", [])},
+                                 headers=result)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/webhooks/{webhook_id}/{token}", self.execute)
+        app.router.add_patch("/api/webhooks/{webhook_id}/{token}/messages/{message_id}", self.edit)
+        return app
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "messages": self.messages,
+            "edits": self.edits,
+            "bucket_429s": self.bucket_429s,
+            "global_violations": self.global_violations,
+            "embeds_received": len(self.received),
+        }
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def notification_latencies(shopify: ShopifyStandIn, discord: DiscordStandIn) -> List[float]:
+    """Seconds from a matching product appearing in a catalog to its embed reaching the webhook"""
+    latencies = []
+    for url, received_at in discord.received.items():
+        appeared_at = shopify.appeared.get(url.rsplit("/", 1)[-1])
+        if appeared_at is not None:
+            latencies.append(received_at - appeared_at)
+    return latencies
+
+
+async def serve(args) -> None:
+    shopify = ShopifyStandIn(args.stores, args.catalog_size, args.churn, keywords=make_keywords(args.keywords),
+                             latency=args.latency, rate_429=args.rate_429, rate_5xx=args.rate_5xx)
+    discord = DiscordStandIn(args.discord_limit, args.discord_reset)
+
+    shopify_runner = web.AppRunner(shopify.app(), access_log=None)
+    await shopify_runner.setup()
+    await shopify.start(shopify_runner)
+
+    async def report(request):
+        latencies = notification_latencies(shopify, discord)
+        return web.json_response({
+            "shopify": shopify.stats(),
+            "discord": discord.stats(),
+            "notified": len(latencies),
+            "latency_p50": percentile(latencies, 0.5) if latencies else None,
+            "latency_p99": percentile(latencies, 0.99) if latencies else None,
+        })
+
+    async def start_churn(request):
+        shopify.start_churn()
+        return web.json_response({"churn": shopify.churn})
+
+    discord_app = discord.app()
+    discord_app.router.add_get("/_stats", report)
+    discord_app.router.add_post("/_churn", start_churn)
+    discord_runner = web.AppRunner(discord_app, access_log=None)
+    await discord_runner.setup()
+    site = web.TCPSite(discord_runner, "127.0.0.1", args.discord_port)
+    await site.start()
+    discord_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    # One line of JSON so a parent process can find the servers
+    print(json.dumps({"stores": shopify.urls, "webhook": f"{discord_url}/api/webhooks/1/standin",
+                      "control": discord_url}), flush=True)
+    if not args.no_churn:
+        shopify.start_churn()
+    await asyncio.Event().wait()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stores", type=int, default=10)
+    parser.add_argument("--catalog-size", type=int, default=500)
+    parser.add_argument("--churn", type=float, default=2.0, help="catalog changes per second, all stores")
+    parser.add_argument("--keywords", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean products.json latency in seconds")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--discord-limit", type=int, default=5)
+    parser.add_argument("--discord-reset", type=float, default=2.0)
+    parser.add_argument("--discord-port", type=int, default=0)
+    parser.add_argument("--no-churn", action="store_true", help="wait for POST /_churn before changing catalogs")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
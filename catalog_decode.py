@@ -0,0 +1,88 @@
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import msgspec
+
+logger = logging.getLogger('CatalogDecode')
+
+# Only the fields the diff engine, matcher and _process_product read are kept;
+# body_html, options and image metadata beyond src are never materialized.
+
+
+class CatalogVariant(msgspec.Struct, gc=False):
+    id: int = 0
+    title: str = ""
+    available: bool = False
+    price: Optional[str] = None
+    inventory_quantity: Optional[int] = None
+
+
+class CatalogImage(msgspec.Struct, gc=False):
+    src: str = ""
+
+
+class CatalogProduct(msgspec.Struct, gc=False):
+    id: int = 0
+    title: str = ""
+    handle: str = ""
+    vendor: Optional[str] = None
+    product_type: Optional[str] = None
+    tags: List[str] = []
+    updated_at: str = ""
+    variants: Tuple[CatalogVariant, ...] = ()
+    images: Tuple[CatalogImage, ...] = ()
+
+    @property
+    def image_url(self) -> str:
+        return self.images[0].src if self.images else ""
+
+
+class _CatalogPayload(msgspec.Struct, gc=False):
+    products: List[CatalogProduct] = []
+
+
+_typed_decoder = msgspec.json.Decoder(_CatalogPayload)
+
+
+def product_from_dict(product: Dict) -> CatalogProduct:
+    """Build a CatalogProduct from an already decoded products.json entry"""
+    tags = product.get("tags") or []
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+
+    images = product.get("images") or []
+    first_image = images[0].get("src") if images and isinstance(images[0], dict) else None
+
+    return CatalogProduct(
+        id=product.get("id") or 0,
+        title=product.get("title") or "",
+        handle=product.get("handle") or "",
+        vendor=product.get("vendor"),
+        product_type=product.get("product_type"),
+        tags=list(tags),
+        updated_at=product.get("updated_at") or "",
+        variants=tuple(
+            CatalogVariant(
+                id=variant.get("id") or 0,
+                title=str(variant.get("title") or ""),
+                available=bool(variant.get("available")),
+                price=None if variant.get("price") is None else str(variant.get("price")),
+                inventory_quantity=variant.get("inventory_quantity")
+            )
+            for variant in product.get("variants") or []
+        ),
+        images=(CatalogImage(src=first_image),) if first_image else ()
+    )
+
+
+def decode_products(body: bytes) -> List[CatalogProduct]:
+    """Decode a raw products.json body straight into compact CatalogProduct records"""
+    try:
+        return _typed_decoder.decode(body).products
+    except msgspec.ValidationError as e:
+        # A store with unusual field types; take the tolerant path for this page
+        logger.warning(f"Typed catalog decode failed, falling back to generic JSON: {e}")
+
+    data = json.loads(body) or {}
+    return [product_from_dict(product) for product in data.get("products") or []]
@@ -0,0 +1,204 @@
+from typing import Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+from catalog_decode import CatalogProduct
+
+# Event types produced by a catalog diff
+NEW = 'new'
+RESTOCKED = 'restocked'
+PRICE_CHANGED = 'price_changed'
+SOLD_OUT = 'sold_out'
+
+EVENT_LABELS = {
+    NEW: 'New Product',
+    RESTOCKED: 'Restock',
+    PRICE_CHANGED: 'Price Change',
+    SOLD_OUT: 'Sold Out',
+}
+
+# (event, product, recipients); recipients is None unless the event is a redelivery
+ScanEvent = Tuple[str, CatalogProduct, Optional[FrozenSet[int]]]
+
+# Force a full scan every N cycles to prune removed products and re-check ordering
+FULL_SCAN_INTERVAL = 20
+
+
+class ProductSnapshot:
+    """What we remember about a product between cycles"""
+
+    __slots__ = ('updated_at', 'available_variants', 'price')
+
+    def __init__(self, updated_at: str, available_variants: FrozenSet, price):
+        self.updated_at = updated_at
+        self.available_variants = available_variants
+        self.price = price
+
+
+class StoreSnapshot:
+    """Per-store index of product id -> ProductSnapshot"""
+
+    def __init__(self, match_key: Hashable):
+        self.match_key = match_key
+        self.products: Dict[int, ProductSnapshot] = {}
+        self.watermark: Optional[str] = None  # Newest updated_at seen so far
+        self.sorted_by_updated = False  # Learned from full scans
+        self.scans = 0
+        self.retries: Dict[int, Dict[int, str]] = {}  # product id -> user id -> event that failed to deliver
+
+
+class CatalogScan:
+    """Diff state for one fetch of one store's catalog"""
+
+    def __init__(self, snapshot: StoreSnapshot):
+        self.snapshot = snapshot
+        self.previous_watermark = snapshot.watermark
+        self.allow_early_stop = (
+            snapshot.sorted_by_updated
+            and snapshot.watermark is not None
+            and snapshot.scans % FULL_SCAN_INTERVAL != 0
+        )
+        self.newest = snapshot.watermark
+        self.last_updated = None
+        self.in_order = True
+        self.seen_ids = set()
+        self.partial = False  # Some products were never looked at
+        self.stopped_early = False
+        self.compared = 0
+        self.changes = 0  # Genuine changes, not counting redelivered events
+        self.baseline = snapshot.scans == 0  # Everything is new on the first scan of a snapshot
+
+    @staticmethod
+    def _snapshot(product: CatalogProduct) -> ProductSnapshot:
+        variants = product.variants
+        available = frozenset(v.id for v in variants if v.available)
+        price = variants[0].price if variants else None
+        return ProductSnapshot(product.updated_at, available, price)
+
+    @staticmethod
+    def _classify(known: Optional[ProductSnapshot], current: ProductSnapshot) -> Optional[str]:
+        if known is None:
+            return NEW
+        if current.available_variants and not known.available_variants:
+            return RESTOCKED
+        if known.available_variants and not current.available_variants:
+            return SOLD_OUT
+        if current.available_variants - known.available_variants:
+            return RESTOCKED  # New sizes came back in stock
+        if current.price != known.price:
+            return PRICE_CHANGED
+        return None
+
+    @staticmethod
+    def _redeliver(owed: Dict[int, str], product: CatalogProduct, events: List[ScanEvent]):
+        by_event: Dict[str, set] = {}
+        for user_id, event in owed.items():
+            by_event.setdefault(event, set()).add(user_id)
+        for event, user_ids in by_event.items():
+            events.append((event, product, frozenset(user_ids)))
+
+    def diff_page(self, products: List[CatalogProduct]) -> List[ScanEvent]:
+        """Return (event, product, recipients) for the products that changed on this page.
+
+        Unchanged products cost a dict lookup and a string comparison. When the
+        store is known to list products newest-updated first, the scan stops at
+        the first unchanged product at or below the previous watermark.
+        ``recipients`` is None for a genuine change; for an event re-emitted
+        after a failed delivery it holds the users still owed it.
+        """
+        index = self.snapshot.products
+        retries = self.snapshot.retries
+        events = []
+        changes = 0
+        for product in products:
+            product_id = product.id
+            updated_at = product.updated_at
+            self.compared += 1
+
+            if self.last_updated is not None and updated_at > self.last_updated:
+                self.in_order = False
+            self.last_updated = updated_at
+            if self.newest is None or updated_at > self.newest:
+                self.newest = updated_at
+            self.seen_ids.add(product_id)
+
+            owed = retries.pop(product_id, None) if retries else None
+            known = index.get(product_id)
+            if known is not None and known.updated_at == updated_at:
+                if owed:
+                    self._redeliver(owed, product, events)
+                    continue
+                if self.allow_early_stop and updated_at <= self.previous_watermark:
+                    self.stopped_early = True
+                    break
+                continue
+
+            current = self._snapshot(product)
+            index[product_id] = current
+            event = self._classify(known, current)
+            if event:
+                # A newer event supersedes the one that failed
+                events.append((event, product, None))
+                changes += 1
+            if owed and (event is None or known is None):
+                # A fresh snapshot calls everything new, which users already told would never see
+                self._redeliver(owed, product, events)
+        self.changes += changes
+        return events
+
+    def skip_page(self):
+        """Record a page that was not inspected (e.g. served from cache)"""
+        self.partial = True
+
+    def finish(self, complete: bool):
+        """Commit the scan; ``complete`` is False when fetching aborted midway"""
+        snapshot = self.snapshot
+        snapshot.scans += 1
+        if self.newest is not None:
+            snapshot.watermark = self.newest
+
+        if complete and not self.partial and not self.stopped_early:
+            snapshot.sorted_by_updated = self.in_order
+            # Drop products that have disappeared from the catalog
+            for product_id in set(snapshot.products) - self.seen_ids:
+                del snapshot.products[product_id]
+            for product_id in set(snapshot.retries) - self.seen_ids:
+                del snapshot.retries[product_id]
+
+
+class CatalogDiffer:
+    """Turns successive catalog fetches into typed change events"""
+
+    def __init__(self):
+        self.stores: Dict[str, StoreSnapshot] = {}
+        self.pending_retries: Dict[str, Dict[int, Dict[int, str]]] = {}  # For stores with no snapshot yet
+
+    def begin(self, store_url: str, match_key: Hashable) -> CatalogScan:
+        """Start diffing a new fetch of ``store_url``.
+
+        The snapshot is reset whenever the keyword set changes so that products
+        which only now match are reported as new. Events still owed to users
+        survive the reset.
+        """
+        snapshot = self.stores.get(store_url)
+        if snapshot is None or snapshot.match_key != match_key:
+            retries = snapshot.retries if snapshot is not None else {}
+            snapshot = StoreSnapshot(match_key)
+            snapshot.retries = retries
+            self.stores[store_url] = snapshot
+        for product_id, owed in self.pending_retries.pop(store_url, {}).items():
+            snapshot.retries.setdefault(product_id, {}).update(owed)
+        return CatalogScan(snapshot)
+
+    def retry_event(self, store_url: str, product_id: int, event: str, user_id: int):
+        """Re-emit ``event`` for one product to one user on the next scan, e.g. after a failed webhook"""
+        snapshot = self.stores.get(store_url)
+        if snapshot is None:
+            # Not scanned yet (e.g. an event replayed from the journal); held until it is
+            self.pending_retries.setdefault(store_url, {}).setdefault(product_id, {})[user_id] = event
+            return
+        snapshot.retries.setdefault(product_id, {})[user_id] = event
+        snapshot.watermark = None  # Make sure the next scan reaches it
+
+    def forget(self, store_url: str):
+        """Drop the snapshot for a store"""
+        self.stores.pop(store_url, None)
+        self.pending_retries.pop(store_url, None)
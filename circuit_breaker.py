@@ -0,0 +1,156 @@
+import random
+import time
+from typing import Dict, Optional
+
+# Circuit states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Failure kinds, each with its own policy below
+DNS_ERROR = 'dns_error'
+CONNECT_ERROR = 'connect_error'
+TIMEOUT = 'timeout'
+RATE_LIMITED = 'rate_limited'
+SERVER_ERROR = 'server_error'
+CLIENT_ERROR = 'client_error'
+
+# kind -> (consecutive failures before opening, base backoff in seconds)
+FAILURE_POLICIES = {
+    DNS_ERROR: (1, 60.0),      # Resolution failures rarely fix themselves within seconds
+    CONNECT_ERROR: (2, 10.0),
+    TIMEOUT: (3, 10.0),
+    RATE_LIMITED: (1, 5.0),    # Retry-After, when present, overrides the backoff
+    SERVER_ERROR: (3, 5.0),
+    CLIENT_ERROR: (3, 30.0),   # 403/404: blocked or not a Shopify store
+}
+
+
+class StoreFetchError(Exception):
+    """A classified failure while fetching a store"""
+
+    def __init__(self, kind: str, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message or kind)
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+class StoreCircuit:
+    """Breaker state for one store"""
+
+    __slots__ = ('state', 'failures', 'opens', 'open_until', 'trial_started', 'last_failure', 'last_error')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0       # Consecutive failures while closed
+        self.opens = 0          # Consecutive times the circuit opened, drives the backoff exponent
+        self.open_until = 0.0
+        self.trial_started = 0.0
+        self.last_failure: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+
+class CircuitBreaker:
+    """Per-store closed/open/half-open circuit breaker with exponential backoff and jitter.
+
+    ``allow`` is called right before a fetch and may move an open circuit to
+    half-open, letting exactly one trial request through. ``is_available`` and
+    ``next_attempt_at`` are side-effect free, so a scheduler can skip dead
+    stores without spending a request slot on them.
+    """
+
+    def __init__(self, max_backoff: float = 300.0, jitter: float = 0.2, trial_timeout: float = 60.0):
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.trial_timeout = trial_timeout
+        self.circuits: Dict[str, StoreCircuit] = {}
+
+    def _circuit(self, store_url: str) -> StoreCircuit:
+        circuit = self.circuits.get(store_url)
+        if circuit is None:
+            circuit = self.circuits[store_url] = StoreCircuit()
+        return circuit
+
+    def state(self, store_url: str) -> str:
+        circuit = self.circuits.get(store_url)
+        return circuit.state if circuit else CLOSED
+
+    def is_available(self, store_url: str) -> bool:
+        """Whether a fetch would be allowed right now, without changing any state"""
+        circuit = self.circuits.get(store_url)
+        if circuit is None or circuit.state == CLOSED:
+            return True
+        now = time.time()
+        if circuit.state == OPEN:
+            return now >= circuit.open_until
+        return now - circuit.trial_started >= self.trial_timeout
+
+    def next_attempt_at(self, store_url: str) -> float:
+        """Earliest wall-clock time a fetch will be allowed"""
+        circuit = self.circuits.get(store_url)
+        if circuit is None or circuit.state == CLOSED:
+            return time.time()
+        if circuit.state == OPEN:
+            return circuit.open_until
+        return circuit.trial_started + self.trial_timeout
+
+    def allow(self, store_url: str) -> bool:
+        """Gate a fetch; an expired open circuit lets one half-open trial through"""
+        circuit = self.circuits.get(store_url)
+        if circuit is None or circuit.state == CLOSED:
+            return True
+
+        now = time.time()
+        if circuit.state == OPEN:
+            if now < circuit.open_until:
+                return False
+            circuit.state = HALF_OPEN
+            circuit.trial_started = now
+            return True
+
+        # Half-open: a trial is already running unless it was lost
+        if now - circuit.trial_started >= self.trial_timeout:
+            circuit.trial_started = now
+            return True
+        return False
+
+    def record_success(self, store_url: str):
+        """Close the circuit and forget its failure history"""
+        self.circuits.pop(store_url, None)
+
+    def record_failure(self, store_url: str, kind: str, error: str = None,
+                       retry_after: Optional[float] = None) -> float:
+        """Count a failure; returns the seconds the circuit stays open (0 if still closed)"""
+        circuit = self._circuit(store_url)
+        circuit.last_failure = kind
+        circuit.last_error = error
+        threshold, base_backoff = FAILURE_POLICIES.get(kind, (3, 10.0))
+
+        if circuit.state == CLOSED:
+            circuit.failures += 1
+            if circuit.failures < threshold:
+                return 0.0
+
+        backoff = min(self.max_backoff, base_backoff * (2 ** circuit.opens))
+        backoff *= 1 + random.uniform(-self.jitter, self.jitter)
+        if retry_after is not None:
+            backoff = max(retry_after, backoff if circuit.opens else 0.0)
+
+        circuit.state = OPEN
+        circuit.opens += 1
+        circuit.failures = 0
+        circuit.open_until = time.time() + backoff
+        return backoff
+
+    def stats(self) -> Dict[str, Dict]:
+        """Non-closed circuits for health reporting"""
+        now = time.time()
+        return {
+            store_url: {
+                'state': circuit.state,
+                'last_failure': circuit.last_failure,
+                'retry_in': round(max(0.0, circuit.open_until - now), 1),
+            }
+            for store_url, circuit in self.circuits.items()
+            if circuit.state != CLOSED
+        }
@@ -5,12 +5,35 @@ DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL", "")
 
 # Shopify API Configuration
 SHOPIFY_RATE_LIMIT = 1  # requests per second per store
+SHOPIFY_RATE_BURST = 2  # requests a store may receive back to back before throttling
 MONITOR_DELAY = 30  # seconds between full store checks
+MAX_POLL_INTERVAL = int(os.getenv("MAX_POLL_INTERVAL", 900))  # ceiling for quiet stores' adaptive interval
 
 # Product Monitor Configuration
 MAX_PRODUCTS = 250  # increased to handle multiple stores
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 
+# Notification dedupe store (SQLite, WAL mode), kept across monitor restarts
+SEEN_PRODUCTS_DB = os.getenv("SEEN_PRODUCTS_DB", "seen_products.db")
+
+# Journal of queued notifications (SQLite, WAL mode), replayed after a crash or restart
+OUTBOX_DB = os.getenv("OUTBOX_DB", "notification_outbox.db")
+
+# Monitor supervisor: owns every per-user monitor process, controlled over a local Unix socket
+SUPERVISOR_SOCKET = os.getenv(
+    "SUPERVISOR_SOCKET", os.path.join(os.path.dirname(os.path.abspath(__file__)), "monitor_supervisor.sock")
+)
+SUPERVISOR_MAX_BACKOFF = 300  # ceiling in seconds between restarts of a crashing monitor
+SUPERVISOR_STABLE_AFTER = 60  # seconds a monitor must stay up before its restart backoff resets
+EXIT_CONFIG_ERROR = 78  # monitor exit code for configuration it cannot run with (sysexits EX_CONFIG); never restarted
+
+# Discord webhook batching
+WEBHOOK_BATCH_WINDOW = 0.25  # seconds to collect notifications into one message
+DISCORD_MAX_EMBEDS = 10  # embeds per message
+DISCORD_EMBED_CHAR_LIMIT = 6000  # total characters across a message's embeds
+WEBHOOK_EDIT_WINDOW = 3600  # seconds during which a product's changes edit its original message
+WEBHOOK_TRACKED_MESSAGES = 1000  # sent messages remembered per webhook for editing
+
 # Webhook Embed Colors
 SUCCESS_COLOR = 0x00ff00
 ERROR_COLOR = 0xff0000
@@ -0,0 +1,100 @@
+import logging
+from typing import Dict, Set
+
+logger = logging.getLogger('ConfigWatch')
+
+# Tables whose rows belong to a user, and the column naming that user
+CONFIG_TABLES = {
+    'store': 'user_id',
+    'keyword': 'user_id',
+    'monitor_config': 'user_id',
+    'user': 'id',
+}
+
+_POSTGRES_FUNCTION = """
+CREATE OR REPLACE FUNCTION bump_config_version() RETURNS trigger AS $$
+DECLARE
+    changed_user integer;
+BEGIN
+    -- Separate assignments: plpgsql resolves a record field only when its statement runs
+    IF TG_TABLE_NAME = 'user' THEN
+        IF TG_OP = 'DELETE' THEN changed_user := OLD.id; ELSE changed_user := NEW.id; END IF;
+    ELSE
+        IF TG_OP = 'DELETE' THEN changed_user := OLD.user_id; ELSE changed_user := NEW.user_id; END IF;
+    END IF;
+    INSERT INTO config_version (user_id, version) VALUES (changed_user, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = config_version.version + 1;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+async def _install_postgres(conn):
+    # Monitors starting together would otherwise race each other's catalog updates
+    await conn.exec_driver_sql("SELECT pg_advisory_xact_lock(hashtext('bump_config_version'))")
+    await conn.exec_driver_sql(_POSTGRES_FUNCTION)
+    triggers = {table: f"{table}_config_version" for table in CONFIG_TABLES}
+    names = ", ".join(f"'{trigger}'" for trigger in triggers.values())
+    result = await conn.exec_driver_sql(
+        f"SELECT tgname FROM pg_trigger WHERE NOT tgisinternal AND tgname IN ({names})"
+    )
+    existing = {row[0] for row in result}
+    # Existing triggers are left alone, so config writes are never missed mid-install
+    for table, trigger in triggers.items():
+        if trigger not in existing:
+            await conn.exec_driver_sql(
+                f'CREATE TRIGGER {trigger} AFTER INSERT OR UPDATE OR DELETE ON "{table}" '
+                f'FOR EACH ROW EXECUTE FUNCTION bump_config_version()'
+            )
+
+
+async def _install_sqlite(conn):
+    for table, column in CONFIG_TABLES.items():
+        for operation, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            await conn.exec_driver_sql(
+                f'CREATE TRIGGER IF NOT EXISTS {table}_config_version_{operation.lower()} '
+                f'AFTER {operation} ON "{table}" BEGIN '
+                f'INSERT OR IGNORE INTO config_version (user_id, version) VALUES ({row}.{column}, 0); '
+                f'UPDATE config_version SET version = version + 1 WHERE user_id = {row}.{column}; '
+                f'END'
+            )
+
+
+async def install_version_triggers(engine) -> bool:
+    """Create the triggers that bump config_version on every config write; safe to call repeatedly.
+
+    Triggers catch every writer (the bot's raw SQL, the dashboard's ORM
+    sessions, manual edits) without each one having to remember to bump.
+    Only missing triggers are created, so installed ones keep firing while
+    another monitor starts.
+    """
+    if engine.dialect.name == 'postgresql':
+        install = _install_postgres
+    elif engine.dialect.name == 'sqlite':
+        install = _install_sqlite
+    else:
+        logger.warning(f"No config version triggers for {engine.dialect.name}, relying on periodic reloads")
+        return False
+
+    try:
+        async with engine.begin() as conn:
+            await install(conn)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to install config version triggers: {e}")
+        return False
+
+
+class ConfigVersionWatcher:
+    """Detects which users' configuration changed with one small query per poll"""
+
+    def __init__(self):
+        self.versions: Dict[int, int] = {}
+
+    async def poll(self, repository) -> Set[int]:
+        """Users whose version moved since the previous poll (every known user on the first poll)"""
+        versions = await repository.config_versions()
+        changed = {user_id for user_id, version in versions.items() if self.versions.get(user_id) != version}
+        self.versions = versions
+        return changed
@@ -5,6 +5,7 @@ from discord.ext import commands
 import logging
 import psutil
 import time
+from db_pool import create_pool
 
 # Configure logging with more detailed format
 logging.basicConfig(
@@ -60,9 +61,12 @@ class MonitorBot(commands.Bot):
             intents=intents,
             description="Monitor Bot - Track product restocks and updates"
         )
+        self.db = None
 
     async def setup_hook(self):
-        """Initialize bot extensions"""
+        """Open the shared database pool, then initialize bot extensions"""
+        self.db = await create_pool(os.environ.get('DATABASE_URL'))
+
         logger.info("Setting up bot extensions...")
         try:
             cogs_dir = os.path.join(os.path.dirname(__file__), 'cogs')
@@ -77,6 +81,13 @@ class MonitorBot(commands.Bot):
         except Exception as e:
             logger.error(f"Error loading extensions: {str(e)}", exc_info=True)
 
+    async def close(self):
+        """Close the database pool once discord.py has shut down"""
+        await super().close()
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+
     async def on_ready(self):
         """Log when the bot is ready"""
         logger.info(f"Bot is ready and logged in as {self.user}")
@@ -1,24 +1,28 @@
 import os
-import json
 import asyncio
 import logging
-import psutil
 import sys
-import psycopg2
 import time
+from collections import deque
 from discord.ext import commands
 import discord
-from datetime import datetime, timedelta
-import subprocess
 from werkzeug.security import generate_password_hash
 import secrets
 
+# Monitor processes are owned by the supervisor at the project root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from monitor_supervisor import SupervisorClient, SupervisorError
+
 logger = logging.getLogger('MonitorBot')
 
 class MonitorCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self._command_cooldowns = {}
+        self.supervisor = SupervisorClient()
 
     async def _check_cooldown(self, ctx):
         """Check command cooldown"""
@@ -32,134 +36,27 @@ class MonitorCommands(commands.Cog):
         return True
 
     async def _handle_db_operation(self, operation):
-        """Execute database operations with proper connection handling"""
-        conn = None
-        cur = None
+        """Run a database operation on a connection borrowed from the bot's shared pool"""
         try:
-            conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
-            cur = conn.cursor()
-            return await operation(conn, cur)
+            async with self.bot.db.acquire() as conn:
+                return await operation(conn)
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(f"Database error: {e}")
             return None
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                conn.close()
 
-    def _is_monitor_running(self, user_id):
+    async def _is_monitor_running(self, user_id):
         """Check if monitor is running for user"""
-        try:
-            tracking_file = f"monitor_process_{user_id}.json"
-
-            # First check tracking file
-            if os.path.exists(tracking_file):
-                try:
-                    with open(tracking_file) as f:
-                        data = json.load(f)
-                        pid = data.get('pid')
-                        child_pid = data.get('child_pid')
-
-                        # Check both parent and child processes
-                        for check_pid in [pid, child_pid]:
-                            if check_pid:
-                                try:
-                                    process = psutil.Process(check_pid)
-                                    if process.is_running():
-                                        # More strict process verification
-                                        cmdline = ' '.join(process.cmdline())
-                                        env = process.environ()
-
-                                        is_python = 'python' in process.name().lower()
-                                        has_monitor_script = any(s in cmdline for s in ['start_monitor.py', 'main.py'])
-                                        correct_user = str(user_id) == env.get('MONITOR_USER_ID')
-
-                                        if is_python and has_monitor_script and correct_user:
-                                            logger.info(f"Found running monitor process: PID {check_pid}")
-                                            return True
-                                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                                    continue
-
-                    # If we get here, no valid process found
-                    logger.info(f"No valid monitor process found in tracking file for user {user_id}")
-                    os.remove(tracking_file)
-                except (json.JSONDecodeError, OSError) as e:
-                    logger.error(f"Error reading tracking file: {e}")
-                    if os.path.exists(tracking_file):
-                        os.remove(tracking_file)
-
-            # Double check running processes even if tracking file wasn't found
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'environ']):
-                try:
-                    cmdline = ' '.join(proc.info['cmdline'] or [])
-                    env = proc.info.get('environ', {})
-
-                    is_python = 'python' in proc.info['name'].lower()
-                    has_monitor_script = any(s in cmdline for s in ['start_monitor.py', 'main.py'])
-                    correct_user = str(user_id) == env.get('MONITOR_USER_ID')
-
-                    if is_python and has_monitor_script and correct_user:
-                        logger.info(f"Found orphaned monitor process: PID {proc.info['pid']}")
-                        # Create tracking file if it doesn't exist
-                        if not os.path.exists(tracking_file):
-                            with open(tracking_file, 'w') as f:
-                                json.dump({
-                                    'pid': proc.info['pid'],
-                                    'start_time': datetime.now().isoformat(),
-                                    'log_file': f"monitor_log_{user_id}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt"
-                                }, f)
-                        return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-                    logger.warning(f"Error checking process: {e}")
-                    continue
-
-            logger.info(f"No monitor process found for user {user_id}")
-            return False
-        except Exception as e:
-            logger.error(f"Error checking monitor status: {e}", exc_info=True)
-            return False
+        return await self.supervisor.is_running(user_id)
 
-    async def _cleanup_old_monitor(self, user_id):
-        """Cleanup any existing monitor process"""
+    @staticmethod
+    def _log_tail(log_file, lines=15):
+        """Last lines a monitor wrote, for reporting why it failed to start"""
         try:
-            tracking_file = f"monitor_process_{user_id}.json"
-            if os.path.exists(tracking_file):
-                try:
-                    with open(tracking_file) as f:
-                        data = json.load(f)
-                        processes_to_check = [data.get('pid'), data.get('child_pid')]
-
-                        for pid in processes_to_check:
-                            if pid:
-                                try:
-                                    process = psutil.Process(pid)
-                                    if ('python' in process.name().lower() and
-                                        str(user_id) == process.environ().get('MONITOR_USER_ID')):
-                                        logger.info(f"Terminating monitor process: PID {pid}")
-                                        process.terminate()
-                                        try:
-                                            process.wait(timeout=3)
-                                        except psutil.TimeoutExpired:
-                                            logger.warning(f"Process {pid} did not terminate, killing it")
-                                            process.kill()
-                                except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-                                    logger.warning(f"Error terminating process {pid}: {e}")
-                except (json.JSONDecodeError, OSError) as e:
-                    logger.error(f"Error reading tracking file: {e}")
-
-            # Clean up any stale tracking file
-            if os.path.exists(tracking_file):
-                try:
-                    os.remove(tracking_file)
-                    logger.info(f"Removed tracking file for user {user_id}")
-                except OSError as e:
-                    logger.error(f"Could not remove tracking file: {e}")
-
-        except Exception as e:
-            logger.error(f"Error in cleanup process: {e}", exc_info=True)
+            with open(log_file, errors='replace') as f:
+                output = ''.join(deque(f, lines)).strip()
+        except OSError:
+            output = ''
+        return output[-1500:] or "No output available"
 
     @commands.command(name='verify', help="Verify yourself to use the monitor")
     async def verify_user(self, ctx):
@@ -168,10 +65,9 @@ class MonitorCommands(commands.Cog):
 
         logger.info(f"Starting verification for user {ctx.author.name} (ID: {ctx.author.id})")
 
-        async def db_verify(conn, cur):
+        async def db_verify(conn):
             # Check if user already exists
-            cur.execute('SELECT username FROM "user" WHERE discord_user_id = %s', (str(ctx.author.id),))
-            if cur.fetchone():
+            if await conn.fetchrow('SELECT username FROM "user" WHERE discord_user_id = $1', str(ctx.author.id)):
                 logger.info(f"User {ctx.author.name} already verified")
                 return "✅ Your account is already verified!"
 
@@ -182,20 +78,18 @@ class MonitorCommands(commands.Cog):
 
             logger.info(f"Creating new user: {username}")
 
-            cur.execute(
-                'INSERT INTO "user" (username, discord_user_id, enabled, password_hash) VALUES (%s, %s, true, %s) RETURNING id',
-                (username, str(ctx.author.id), password_hash)
-            )
-            user_id = cur.fetchone()[0]
-
-            cur.execute(
-                '''INSERT INTO monitor_config (
-                    user_id, rate_limit, monitor_delay, max_products,
-                    min_cycle_delay, success_delay_multiplier, batch_size, initial_product_limit
-                ) VALUES (%s, 1.0, 30, 250, 0.05, 0.25, 20, 150)''',
-                (user_id,)
-            )
-            conn.commit()
+            async with conn.transaction():
+                user_id = await conn.fetchval(
+                    'INSERT INTO "user" (username, discord_user_id, enabled, password_hash) VALUES ($1, $2, true, $3) RETURNING id',
+                    username, str(ctx.author.id), password_hash
+                )
+                await conn.execute(
+                    '''INSERT INTO monitor_config (
+                        user_id, rate_limit, monitor_delay, max_products,
+                        min_cycle_delay, success_delay_multiplier, batch_size, initial_product_limit
+                    ) VALUES ($1, 1.0, 30, 250, 0.05, 0.25, 20, 150)''',
+                    user_id
+                )
             logger.info(f"Successfully created user {username} with ID {user_id}")
             return "✅ Verification successful! You can now use monitor commands."
 
@@ -213,20 +107,23 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_status(conn, cur):
-            cur.execute('SELECT id FROM "user" WHERE discord_user_id = %s', (str(ctx.author.id),))
-            result = cur.fetchone()
-            if not result:
-                return None
-            return result[0]
+        async def db_status(conn):
+            return await conn.fetchval('SELECT id FROM "user" WHERE discord_user_id = $1', str(ctx.author.id))
 
         user_id = await self._handle_db_operation(db_status)
         if not user_id:
             await ctx.send("❌ You need to verify first. Use `!verify`")
             return
 
-        running = self._is_monitor_running(user_id)
-        status_msg = f"Monitor Status: {'✅ Running' if running else '❌ Stopped'}"
+        status = await self.supervisor.status(user_id)
+        if status['state'] == 'running':
+            status_msg = "Monitor Status: ✅ Running"
+        elif status['state'] == 'backoff':
+            status_msg = f"Monitor Status: 🔄 Restarting after a crash (restart #{status['restarts'] + 1})"
+        elif status['state'] == 'misconfigured':
+            status_msg = "Monitor Status: ⚠️ Stopped, your account or monitor settings need attention"
+        else:
+            status_msg = "Monitor Status: ❌ Stopped"
 
         try:
             await ctx.send(status_msg)
@@ -243,26 +140,24 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_start(conn, cur):
-            cur.execute(
-                'SELECT id, discord_webhook_url FROM "user" WHERE discord_user_id = %s;',
-                (str(ctx.author.id),)
+        async def db_start(conn):
+            result = await conn.fetchrow(
+                'SELECT id, discord_webhook_url FROM "user" WHERE discord_user_id = $1;',
+                str(ctx.author.id)
             )
-            result = cur.fetchone()
             if not result:
                 return None
             user_id, webhook_url = result
 
             # Check if stores are configured
-            cur.execute(
-                'SELECT COUNT(*) FROM store WHERE user_id = %s AND enabled = true;',
-                (user_id,)
+            store_count = await conn.fetchval(
+                'SELECT COUNT(*) FROM store WHERE user_id = $1 AND enabled = true;',
+                user_id
             )
-            store_count = cur.fetchone()[0]
             if store_count == 0:
                 return "❌ You need to add some stores first!"
 
-            if self._is_monitor_running(user_id):
+            if await self._is_monitor_running(user_id):
                 return "Monitor is already running!"
 
             # Use webhook_url from database or fallback to environment
@@ -271,11 +166,10 @@ class MonitorCommands(commands.Cog):
                 return "❌ Invalid webhook URL configuration"
 
             # Update user status
-            cur.execute(
-                'UPDATE "user" SET enabled = true WHERE id = %s;',
-                (user_id,)
+            await conn.execute(
+                'UPDATE "user" SET enabled = true WHERE id = $1;',
+                user_id
             )
-            conn.commit()
             return (user_id, webhook_url)
 
         result = await self._handle_db_operation(db_start)
@@ -289,99 +183,49 @@ class MonitorCommands(commands.Cog):
         user_id, webhook_url = result
         status_message = await ctx.send("⌛ Starting monitor, please wait...")
 
-        # Cleanup any existing monitor process first
-        await self._cleanup_old_monitor(user_id)
+        env = {
+            'DISCORD_WEBHOOK_URL': webhook_url,
+            'DATABASE_URL': os.environ.get('DATABASE_URL', ''),
+            'MONITOR_API_KEY': os.environ.get('MONITOR_API_KEY', '')  # Ensure API key is passed
+        }
+        logger.info(f"Asking supervisor to start monitor for user {user_id}")
 
-        # Get absolute paths
-        bot_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        start_script = os.path.join(bot_dir, 'start_monitor.py')
+        try:
+            response = await self.supervisor.start(user_id, env)
+        except SupervisorError as e:
+            logger.error(f"Failed to start monitor for user {user_id}: {e}")
+            await status_message.edit(content=f"❌ Failed to start monitor: {e}")
+            return
 
-        if not os.path.exists(start_script):
-            logger.error(f"Cannot find start_monitor.py at {start_script}")
-            await status_message.edit(content="❌ Error: start_monitor.py not found")
+        if response['already_running']:
+            await status_message.edit(content="Monitor is already running!")
+            return
+        worker = response['worker']
+        logger.info(f"Started monitor for user {user_id} with PID {worker['pid']}, logging to {worker['log_file']}")
+
+        # Give the process a moment to start and check it is still up
+        await asyncio.sleep(2)
+        status = await self.supervisor.status(user_id)
+        if status['state'] == 'running':
+            await status_message.edit(content="✅ Monitor started successfully!")
             return
 
+        # Don't leave a monitor that cannot start in a restart loop
         try:
-            # Setup environment with all required variables
-            process_env = os.environ.copy()
-            process_env.update({
-                'DISCORD_WEBHOOK_URL': webhook_url,
-                'MONITOR_USER_ID': str(user_id),
-                'PYTHONUNBUFFERED': '1',
-                'DATABASE_URL': os.environ.get('DATABASE_URL', ''),
-                'PYTHONPATH': bot_dir,  # Set PYTHONPATH to project root
-                'MONITOR_API_KEY': os.environ.get('MONITOR_API_KEY', '')  # Ensure API key is passed
-            })
-
-            logger.info(f"Starting monitor process for user {user_id}")
-            logger.info(f"Working directory: {bot_dir}")
-            logger.info(f"Start script: {start_script}")
-            logger.info(f"Environment: PYTHONPATH={bot_dir}")
-            logger.info(f"Monitor User ID: {user_id}")
-            logger.info(f"Webhook URL configured: {'Set' if webhook_url else 'Not set'}")
-
-            # Start the monitor process with proper error handling
-            try:
-                process = subprocess.Popen(
-                    [sys.executable, start_script, str(user_id)],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    bufsize=1,
-                    env=process_env,
-                    start_new_session=True,
-                    cwd=bot_dir
-                )
-            except Exception as e:
-                logger.error(f"Failed to start monitor process: {e}", exc_info=True)
-                await status_message.edit(content=f"❌ Failed to start monitor: {str(e)}")
-                return
-
-            logger.info(f"Started monitor process with PID {process.pid}")
-
-            # Give the process a moment to start and check its status
-            await asyncio.sleep(2)
-
-            # Check process status and capture output
-            poll_result = process.poll()
-            if poll_result is not None:
-                stdout, stderr = process.communicate()
-                error_output = stderr.strip() if stderr else stdout.strip() if stdout else "No error output available"
-                logger.error(f"Process failed with exit code {poll_result}")
-                logger.error(f"Process output: {error_output}")
-                await status_message.edit(content=f"❌ Monitor failed to start:\n```\n{error_output}\n```")
-                return
-
-            # Verify monitor is actually running with retries
-            max_retries = 3
-            for attempt in range(max_retries):
-                if self._is_monitor_running(user_id):
-                    await status_message.edit(content="✅ Monitor started successfully!")
-                    return
-                logger.info(f"Waiting for monitor to start (attempt {attempt + 1}/{max_retries})")
-                await asyncio.sleep(1)
-
-            # If we get here, the monitor didn't start properly
-            stdout, stderr = process.communicate(timeout=2)
-            error_output = stderr.strip() if stderr else stdout.strip() if stdout else "No error output available"
-            logger.error(f"Monitor failed to initialize properly. Output: {error_output}")
-            await status_message.edit(content=f"❌ Monitor failed to initialize:\n```\n{error_output}\n```")
-
-        except Exception as e:
-            logger.error(f"Error starting monitor: {str(e)}", exc_info=True)
-            await status_message.edit(content=f"❌ Error starting monitor: {str(e)}")
+            await self.supervisor.stop(user_id)
+        except SupervisorError as e:
+            logger.warning(f"Could not stop failed monitor for user {user_id}: {e}")
+        error_output = await asyncio.to_thread(self._log_tail, worker['log_file'])
+        logger.error(f"Monitor for user {user_id} failed to start (exit code {status.get('last_exit')})")
+        await status_message.edit(content=f"❌ Monitor failed to start:\n```\n{error_output}\n```")
 
     @commands.command(name='stop', help="Stop your monitor")
     async def stop_monitor(self, ctx):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_stop(conn, cur):
-            cur.execute('SELECT id FROM "user" WHERE discord_user_id = %s;', (str(ctx.author.id),))
-            result = cur.fetchone()
-            if not result:
-                return None
-            return result[0]
+        async def db_stop(conn):
+            return await conn.fetchval('SELECT id FROM "user" WHERE discord_user_id = $1;', str(ctx.author.id))
 
         user_id = await self._handle_db_operation(db_stop)
         if not user_id:
@@ -391,21 +235,16 @@ class MonitorCommands(commands.Cog):
         status_message = await ctx.send("⌛ Stopping monitor...")
 
         try:
-            if not self._is_monitor_running(user_id):
-                await status_message.edit(content="Monitor is not running.")
-                return
-
-            await self._cleanup_old_monitor(user_id)
-            await asyncio.sleep(1)
-
-            if self._is_monitor_running(user_id):
-                await status_message.edit(content="❌ Failed to stop monitor.")
-            else:
-                await status_message.edit(content="✅ Monitor stopped successfully!")
-
-        except Exception as e:
+            response = await self.supervisor.stop(user_id)
+        except SupervisorError as e:
             logger.error(f"Error stopping monitor: {e}")
             await status_message.edit(content="❌ Error stopping monitor.")
+            return
+
+        if response['was_running']:
+            await status_message.edit(content="✅ Monitor stopped successfully!")
+        else:
+            await status_message.edit(content="Monitor is not running.")
 
     @commands.command(name='keywords', help="List your keywords")
     async def list_keywords(self, ctx):
@@ -413,15 +252,14 @@ class MonitorCommands(commands.Cog):
             return
 
         try:
-            async def db_keywords(conn, cur):
-                cur.execute(
+            async def db_keywords(conn):
+                return await conn.fetch(
                     '''SELECT k.word, k.enabled 
                     FROM keyword k 
                     JOIN "user" u ON k.user_id = u.id 
-                    WHERE u.discord_user_id = %s;''',
-                    (str(ctx.author.id),)
+                    WHERE u.discord_user_id = $1;''',
+                    str(ctx.author.id)
                 )
-                return cur.fetchall()
 
             keywords = await self._handle_db_operation(db_keywords)
             if not keywords:
@@ -449,19 +287,15 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_add_keyword(conn, cur):
-            cur.execute('SELECT id FROM "user" WHERE discord_user_id = %s;', (str(ctx.author.id),))
-            result = cur.fetchone()
-            if not result:
+        async def db_add_keyword(conn):
+            user_id = await conn.fetchval('SELECT id FROM "user" WHERE discord_user_id = $1;', str(ctx.author.id))
+            if not user_id:
                 return None
-            user_id = result[0]
 
-            cur.execute('SELECT 1 FROM keyword WHERE user_id = %s AND word = %s;', (user_id, keyword))
-            if cur.fetchone():
+            if await conn.fetchrow('SELECT 1 FROM keyword WHERE user_id = $1 AND word = $2;', user_id, keyword):
                 return "⚠️ Keyword already exists."
 
-            cur.execute('INSERT INTO keyword (user_id, word, enabled) VALUES (%s, %s, true);', (user_id, keyword))
-            conn.commit()
+            await conn.execute('INSERT INTO keyword (user_id, word, enabled) VALUES ($1, $2, true);', user_id, keyword)
             return f"✅ Added keyword: `{keyword}`"
 
         result = await self._handle_db_operation(db_add_keyword)
@@ -472,17 +306,13 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_remove_keyword(conn, cur):
-            cur.execute('SELECT id FROM "user" WHERE discord_user_id = %s;', (str(ctx.author.id),))
-            result = cur.fetchone()
-            if not result:
+        async def db_remove_keyword(conn):
+            user_id = await conn.fetchval('SELECT id FROM "user" WHERE discord_user_id = $1;', str(ctx.author.id))
+            if not user_id:
                 return None
-            user_id = result[0]
 
-            cur.execute('DELETE FROM keyword WHERE user_id = %s AND word = %s RETURNING word;', (user_id, keyword))
-            deleted = cur.fetchone()
+            deleted = await conn.fetchrow('DELETE FROM keyword WHERE user_id = $1 AND word = $2 RETURNING word;', user_id, keyword)
             if deleted:
-                conn.commit()
                 return f"✅ Removed keyword: `{keyword}`"
             else:
                 return "⚠️ Keyword not found."
@@ -495,12 +325,10 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_preset_stores(conn, cur):
-            cur.execute('SELECT id FROM "user" WHERE discord_user_id = %s;', (str(ctx.author.id),))
-            result = cur.fetchone()
-            if not result:
+        async def db_preset_stores(conn):
+            user_id = await conn.fetchval('SELECT id FROM "user" WHERE discord_user_id = $1;', str(ctx.author.id))
+            if not user_id:
                 return None
-            user_id = result[0]
 
             preset_stores = [
                 "https://www.deadstock.ca",
@@ -516,12 +344,11 @@ class MonitorCommands(commands.Cog):
             ]
 
             stores_added = 0
-            for store_url in preset_stores:
-                cur.execute('SELECT 1 FROM store WHERE user_id = %s AND url = %s;', (user_id, store_url))
-                if not cur.fetchone():
-                    cur.execute('INSERT INTO store (user_id, url, enabled) VALUES (%s, %s, true);', (user_id, store_url))
-                    stores_added += 1
-            conn.commit()
+            async with conn.transaction():
+                for store_url in preset_stores:
+                    if not await conn.fetchrow('SELECT 1 FROM store WHERE user_id = $1 AND url = $2;', user_id, store_url):
+                        await conn.execute('INSERT INTO store (user_id, url, enabled) VALUES ($1, $2, true);', user_id, store_url)
+                        stores_added += 1
             return stores_added
 
         stores_added = await self._handle_db_operation(db_preset_stores)
@@ -551,10 +378,9 @@ class MonitorCommands(commands.Cog):
                 await ctx.send("❌ Invalid webhook URL.")
                 return
 
-            async def db_set_webhook(conn, cur):
-                cur.execute('UPDATE "user" SET discord_webhook_url = %s WHERE discord_user_id = %s;',
-                          (webhook_url, str(ctx.author.id)))
-                conn.commit()
+            async def db_set_webhook(conn):
+                await conn.execute('UPDATE "user" SET discord_webhook_url = $1 WHERE discord_user_id = $2;',
+                                   webhook_url, str(ctx.author.id))
                 return "✅ Webhook URL set!"
 
             result = await self._handle_db_operation(db_set_webhook)
@@ -1,24 +1,26 @@
 import os
-import json
 import asyncio
 import logging
-import psutil
 import sys
-import psycopg2
 import time
 from discord.ext import commands
 import discord 
-from datetime import datetime, timedelta
-import subprocess
 from werkzeug.security import generate_password_hash
 import secrets
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from monitor_supervisor import SupervisorClient, SupervisorError
+
 logger = logging.getLogger('MonitorBot')
 
 class MonitorCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self._command_cooldowns = {}
+        self.supervisor = SupervisorClient()
 
     async def _check_cooldown(self, ctx):
         """Check command cooldown"""
@@ -32,95 +34,17 @@ class MonitorCommands(commands.Cog):
         return True
 
     async def _handle_db_operation(self, operation):
-        """Execute database operations with proper connection handling"""
-        conn = None
-        cur = None
+        """Run a database operation on a connection borrowed from the bot's shared pool"""
         try:
-            conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
-            cur = conn.cursor()
-            return await operation(conn, cur)
+            async with self.bot.db.acquire() as conn:
+                return await operation(conn)
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(f"Database error: {e}")
             return None
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                conn.close()
 
-    def _is_monitor_running(self, user_id):
+    async def _is_monitor_running(self, user_id):
         """Check if monitor is running for user"""
-        try:
-            tracking_file = f"monitor_process_{user_id}.json"
-            if os.path.exists(tracking_file):
-                try:
-                    with open(tracking_file) as f:
-                        data = json.load(f)
-                        pid = data.get('pid')
-                        if pid:
-                            try:
-                                process = psutil.Process(pid)
-                                if process.is_running():
-                                    cmdline = ' '.join(process.cmdline())
-                                    env = process.environ()
-                                    if ('python' in process.name().lower() and
-                                        str(user_id) == env.get('MONITOR_USER_ID')):
-                                        return True
-                            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                                pass
-                    os.remove(tracking_file)
-                except (json.JSONDecodeError, OSError):
-                    if os.path.exists(tracking_file):
-                        os.remove(tracking_file)
-
-            # Check running processes
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'environ']):
-                try:
-                    if ('python' in proc.name().lower() and
-                        str(user_id) == proc.environ().get('MONITOR_USER_ID')):
-                        return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-            return False
-        except Exception as e:
-            logger.error(f"Error checking monitor status: {e}")
-            return False
-
-    async def _cleanup_old_monitor(self, user_id):
-        """Cleanup any existing monitor process"""
-        try:
-            tracking_file = f"monitor_process_{user_id}.json"
-            if os.path.exists(tracking_file):
-                try:
-                    with open(tracking_file) as f:
-                        data = json.load(f)
-                        pid = data.get('pid')
-                        if pid:
-                            try:
-                                process = psutil.Process(pid)
-                                if ('python' in process.name().lower() and
-                                    str(user_id) == process.environ().get('MONITOR_USER_ID')):
-                                    process.terminate()
-                                    try:
-                                        process.wait(timeout=3)
-                                    except psutil.TimeoutExpired:
-                                        process.kill()
-                            except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-                                logger.warning(f"Error terminating process {pid}: {e}")
-                except (json.JSONDecodeError, OSError) as e:
-                    logger.error(f"Error reading tracking file: {e}")
-
-            # Clean up any stale tracking file
-            if os.path.exists(tracking_file):
-                try:
-                    os.remove(tracking_file)
-                except OSError as e:
-                    logger.error(f"Could not remove tracking file: {e}")
-
-        except Exception as e:
-            logger.error(f"Error in cleanup process: {e}")
+        return await self.supervisor.is_running(user_id)
 
     @commands.command(name='verify', help="Verify yourself to use the monitor")
     async def verify_user(self, ctx):
@@ -129,10 +53,9 @@ class MonitorCommands(commands.Cog):
 
         logger.info(f"Starting verification for user {ctx.author.name} (ID: {ctx.author.id})")
 
-        async def db_verify(conn, cur):
+        async def db_verify(conn):
             # Check if user already exists
-            cur.execute('SELECT username FROM "user" WHERE discord_user_id = %s', (str(ctx.author.id),))
-            if cur.fetchone():
+            if await conn.fetchrow('SELECT username FROM "user" WHERE discord_user_id = $1', str(ctx.author.id)):
                 logger.info(f"User {ctx.author.name} already verified")
                 return "✅ Your account is already verified!"
 
@@ -143,20 +66,18 @@ class MonitorCommands(commands.Cog):
 
             logger.info(f"Creating new user: {username}")
 
-            cur.execute(
-                'INSERT INTO "user" (username, discord_user_id, enabled, password_hash) VALUES (%s, %s, true, %s) RETURNING id',
-                (username, str(ctx.author.id), password_hash)
-            )
-            user_id = cur.fetchone()[0]
-
-            cur.execute(
-                '''INSERT INTO monitor_config (
-                    user_id, rate_limit, monitor_delay, max_products,
-                    min_cycle_delay, success_delay_multiplier, batch_size, initial_product_limit
-                ) VALUES (%s, 1.0, 30, 250, 0.05, 0.25, 20, 150)''',
-                (user_id,)
-            )
-            conn.commit()
+            async with conn.transaction():
+                user_id = await conn.fetchval(
+                    'INSERT INTO "user" (username, discord_user_id, enabled, password_hash) VALUES ($1, $2, true, $3) RETURNING id',
+                    username, str(ctx.author.id), password_hash
+                )
+                await conn.execute(
+                    '''INSERT INTO monitor_config (
+                        user_id, rate_limit, monitor_delay, max_products,
+                        min_cycle_delay, success_delay_multiplier, batch_size, initial_product_limit
+                    ) VALUES ($1, 1.0, 30, 250, 0.05, 0.25, 20, 150)''',
+                    user_id
+                )
             logger.info(f"Successfully created user {username} with ID {user_id}")
             return "✅ Verification successful! You can now use monitor commands."
 
@@ -174,19 +95,15 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_status(conn, cur):
-            cur.execute('SELECT id FROM "user" WHERE discord_user_id = %s', (str(ctx.author.id),))
-            result = cur.fetchone()
-            if not result:
-                return None
-            return result[0]
+        async def db_status(conn):
+            return await conn.fetchval('SELECT id FROM "user" WHERE discord_user_id = $1', str(ctx.author.id))
 
         user_id = await self._handle_db_operation(db_status)
         if not user_id:
             await ctx.send("❌ You need to verify first. Use `!verify`")
             return
 
-        running = self._is_monitor_running(user_id)
+        running = await self._is_monitor_running(user_id)
         try:
             status_msg = f"Monitor Status: {'✅ Running' if running else '❌ Stopped'}"
             await ctx.send(status_msg)
@@ -203,36 +120,33 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_start(conn, cur):
-            cur.execute(
-                'SELECT id, discord_webhook_url FROM "user" WHERE discord_user_id = %s;',
-                (str(ctx.author.id),)
+        async def db_start(conn):
+            result = await conn.fetchrow(
+                'SELECT id, discord_webhook_url FROM "user" WHERE discord_user_id = $1;',
+                str(ctx.author.id)
             )
-            result = cur.fetchone()
             if not result:
                 return None
             user_id, webhook_url = result
 
-            cur.execute(
-                'SELECT COUNT(*) FROM store WHERE user_id = %s AND enabled = true;',
-                (user_id,)
+            store_count = await conn.fetchval(
+                'SELECT COUNT(*) FROM store WHERE user_id = $1 AND enabled = true;',
+                user_id
             )
-            store_count = cur.fetchone()[0]
             if store_count == 0:
                 return "❌ You need to add some stores first!"
 
-            if self._is_monitor_running(user_id):
+            if await self._is_monitor_running(user_id):
                 return "Monitor is already running!"
 
             # Set webhook_url if not set
             webhook_url = webhook_url if webhook_url else os.environ.get('DISCORD_WEBHOOK_URL')
 
             # Update user status
-            cur.execute(
-                'UPDATE "user" SET enabled = true WHERE id = %s;',
-                (user_id,)
+            await conn.execute(
+                'UPDATE "user" SET enabled = true WHERE id = $1;',
+                user_id
             )
-            conn.commit()
             return (user_id, webhook_url)
 
         result = await self._handle_db_operation(db_start)
@@ -246,57 +160,25 @@ class MonitorCommands(commands.Cog):
         user_id, webhook_url = result
         status_message = await ctx.send("⌛ Starting monitor, please wait...")
 
-        # Cleanup any existing monitor process first
-        await self._cleanup_old_monitor(user_id)
-
-        # Get the absolute path to start_monitor.py
-        start_script = os.path.abspath(os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            'start_monitor.py'
-        ))
-
-        # Verify files exist
-        if not os.path.exists(start_script):
-            logger.error(f"Cannot find start_monitor.py at {start_script}")
-            await status_message.edit(content="❌ Error: start_monitor.py not found")
-            return
-
         logger.info(f"Starting monitor for user {user_id}")
-        logger.info(f"start_monitor.py path: {start_script}")
-
-        # Setup environment
-        process_env = os.environ.copy()
-        process_env.update({
-            'DISCORD_WEBHOOK_URL': webhook_url,
-            'MONITOR_USER_ID': str(user_id),
-            'PYTHONUNBUFFERED': '1',
-            'PYTHONPATH': os.getcwd()
-        })
 
         try:
-            # Start the monitor process
-            process = subprocess.Popen(
-                [sys.executable, start_script, str(user_id)],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                env=process_env,
-                start_new_session=True,
-                cwd=os.path.dirname(start_script)
-            )
-
-            await asyncio.sleep(2)
-            if process.poll() is not None:
-                await status_message.edit(content="❌ Monitor failed to start.")
+            response = await self.supervisor.start(user_id, {
+                'DISCORD_WEBHOOK_URL': webhook_url,
+                'DATABASE_URL': os.environ.get('DATABASE_URL', '')
+            })
+            if response['already_running']:
+                await status_message.edit(content="Monitor is already running!")
                 return
 
-            if self._is_monitor_running(user_id):
+            await asyncio.sleep(2)
+            if await self._is_monitor_running(user_id):
                 await status_message.edit(content="✅ Monitor started successfully!")
             else:
-                await status_message.edit(content="❌ Monitor failed to initialize.")
+                await self.supervisor.stop(user_id)
+                await status_message.edit(content="❌ Monitor failed to start.")
 
-        except Exception as e:
+        except SupervisorError as e:
             logger.error(f"Error starting monitor: {e}")
             await status_message.edit(content=f"❌ Error starting monitor: {str(e)}")
 
@@ -305,10 +187,8 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_stop(conn, cur):
-            cur.execute('SELECT id FROM "user" WHERE discord_user_id = %s;', (str(ctx.author.id),))
-            result = cur.fetchone()
-            return result[0] if result else None
+        async def db_stop(conn):
+            return await conn.fetchval('SELECT id FROM "user" WHERE discord_user_id = $1;', str(ctx.author.id))
 
         user_id = await self._handle_db_operation(db_stop)
         if not user_id:
@@ -318,19 +198,13 @@ class MonitorCommands(commands.Cog):
         status_message = await ctx.send("⌛ Stopping monitor...")
 
         try:
-            if not self._is_monitor_running(user_id):
-                await status_message.edit(content="Monitor is not running.")
-                return
-
-            await self._cleanup_old_monitor(user_id)
-            await asyncio.sleep(1)
-
-            if self._is_monitor_running(user_id):
-                await status_message.edit(content="❌ Failed to stop monitor.")
-            else:
+            response = await self.supervisor.stop(user_id)
+            if response['was_running']:
                 await status_message.edit(content="✅ Monitor stopped successfully!")
+            else:
+                await status_message.edit(content="Monitor is not running.")
 
-        except Exception as e:
+        except SupervisorError as e:
             logger.error(f"Error stopping monitor: {e}")
             await status_message.edit(content="❌ Error stopping monitor.")
 
@@ -340,15 +214,14 @@ class MonitorCommands(commands.Cog):
             return
 
         try:
-            async def db_keywords(conn, cur):
-                cur.execute(
+            async def db_keywords(conn):
+                return await conn.fetch(
                     '''SELECT k.word, k.enabled 
                     FROM keyword k 
                     JOIN "user" u ON k.user_id = u.id 
-                    WHERE u.discord_user_id = %s;''',
-                    (str(ctx.author.id),)
+                    WHERE u.discord_user_id = $1;''',
+                    str(ctx.author.id)
                 )
-                return cur.fetchall()
 
             keywords = await self._handle_db_operation(db_keywords)
             if not keywords:
@@ -376,19 +249,15 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_add_keyword(conn, cur):
-            cur.execute('SELECT id FROM "user" WHERE discord_user_id = %s;', (str(ctx.author.id),))
-            result = cur.fetchone()
-            if not result:
+        async def db_add_keyword(conn):
+            user_id = await conn.fetchval('SELECT id FROM "user" WHERE discord_user_id = $1;', str(ctx.author.id))
+            if not user_id:
                 return None
-            user_id = result[0]
 
-            cur.execute('SELECT 1 FROM keyword WHERE user_id = %s AND word = %s;', (user_id, keyword))
-            if cur.fetchone():
+            if await conn.fetchrow('SELECT 1 FROM keyword WHERE user_id = $1 AND word = $2;', user_id, keyword):
                 return "⚠️ Keyword already exists."
 
-            cur.execute('INSERT INTO keyword (user_id, word, enabled) VALUES (%s, %s, true);', (user_id, keyword))
-            conn.commit()
+            await conn.execute('INSERT INTO keyword (user_id, word, enabled) VALUES ($1, $2, true);', user_id, keyword)
             return f"✅ Added keyword: `{keyword}`"
 
         result = await self._handle_db_operation(db_add_keyword)
@@ -399,17 +268,13 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_remove_keyword(conn, cur):
-            cur.execute('SELECT id FROM "user" WHERE discord_user_id = %s;', (str(ctx.author.id),))
-            result = cur.fetchone()
-            if not result:
+        async def db_remove_keyword(conn):
+            user_id = await conn.fetchval('SELECT id FROM "user" WHERE discord_user_id = $1;', str(ctx.author.id))
+            if not user_id:
                 return None
-            user_id = result[0]
 
-            cur.execute('DELETE FROM keyword WHERE user_id = %s AND word = %s RETURNING word;', (user_id, keyword))
-            deleted = cur.fetchone()
+            deleted = await conn.fetchrow('DELETE FROM keyword WHERE user_id = $1 AND word = $2 RETURNING word;', user_id, keyword)
             if deleted:
-                conn.commit()
                 return f"✅ Removed keyword: `{keyword}`"
             else:
                 return "⚠️ Keyword not found."
@@ -422,12 +287,10 @@ class MonitorCommands(commands.Cog):
         if not await self._check_cooldown(ctx):
             return
 
-        async def db_preset_stores(conn, cur):
-            cur.execute('SELECT id FROM "user" WHERE discord_user_id = %s;', (str(ctx.author.id),))
-            result = cur.fetchone()
-            if not result:
+        async def db_preset_stores(conn):
+            user_id = await conn.fetchval('SELECT id FROM "user" WHERE discord_user_id = $1;', str(ctx.author.id))
+            if not user_id:
                 return None
-            user_id = result[0]
 
             preset_stores = [
                 "https://www.deadstock.ca",
@@ -443,12 +306,11 @@ class MonitorCommands(commands.Cog):
             ]
 
             stores_added = 0
-            for store_url in preset_stores:
-                cur.execute('SELECT 1 FROM store WHERE user_id = %s AND url = %s;', (user_id, store_url))
-                if not cur.fetchone():
-                    cur.execute('INSERT INTO store (user_id, url, enabled) VALUES (%s, %s, true);', (user_id, store_url))
-                    stores_added += 1
-            conn.commit()
+            async with conn.transaction():
+                for store_url in preset_stores:
+                    if not await conn.fetchrow('SELECT 1 FROM store WHERE user_id = $1 AND url = $2;', user_id, store_url):
+                        await conn.execute('INSERT INTO store (user_id, url, enabled) VALUES ($1, $2, true);', user_id, store_url)
+                        stores_added += 1
             return stores_added
 
         stores_added = await self._handle_db_operation(db_preset_stores)
@@ -478,10 +340,9 @@ class MonitorCommands(commands.Cog):
                 await ctx.send("❌ Invalid webhook URL.")
                 return
 
-            async def db_set_webhook(conn, cur):
-                cur.execute('UPDATE "user" SET discord_webhook_url = %s WHERE discord_user_id = %s;',
-                          (webhook_url, str(ctx.author.id)))
-                conn.commit()
+            async def db_set_webhook(conn):
+                await conn.execute('UPDATE "user" SET discord_webhook_url = $1 WHERE discord_user_id = $2;',
+                                   webhook_url, str(ctx.author.id))
                 return "✅ Webhook URL set!"
 
             result = await self._handle_db_operation(db_set_webhook)
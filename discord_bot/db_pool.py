@@ -0,0 +1,113 @@
+"""
+Shared database pool for the bot's cogs.
+
+Postgres goes through one asyncpg pool, created in MonitorBot.setup_hook, so
+commands reuse connections and their queries never block discord.py's event
+loop. A ``sqlite:///`` DATABASE_URL (local runs and tests) gets a SQLitePool
+instead: a few sqlite3 connections in WAL mode whose calls run on worker
+threads. Queries use asyncpg's ``$1`` placeholders with either backend.
+"""
+import asyncio
+import logging
+import re
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+logger = logging.getLogger('MonitorBot')
+
+# asyncpg's $1, $2 ... map onto SQLite's numbered ?1, ?2 ...
+PLACEHOLDER = re.compile(r'\$(\d+)')
+
+
+class SQLiteConnection:
+    """The part of asyncpg.Connection the cogs use, over one sqlite3 connection"""
+
+    def __init__(self, path: str):
+        # Autocommit, like asyncpg outside transaction()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def _run(self, query: str, args: tuple) -> List[sqlite3.Row]:
+        cursor = self._conn.execute(PLACEHOLDER.sub(r'?\1', query), args)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    async def fetch(self, query: str, *args) -> List[sqlite3.Row]:
+        return await asyncio.to_thread(self._run, query, args)
+
+    async def fetchrow(self, query: str, *args) -> Optional[sqlite3.Row]:
+        rows = await self.fetch(query, *args)
+        return rows[0] if rows else None
+
+    async def fetchval(self, query: str, *args):
+        row = await self.fetchrow(query, *args)
+        return row[0] if row is not None else None
+
+    async def execute(self, query: str, *args):
+        await self.fetch(query, *args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        # Take the write lock up front so two transactions never deadlock upgrading to it
+        await asyncio.to_thread(self._conn.execute, "BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            await asyncio.to_thread(self._conn.execute, "ROLLBACK")
+            raise
+        await asyncio.to_thread(self._conn.execute, "COMMIT")
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLitePool:
+    """Fixed set of SQLiteConnections handed out one command at a time"""
+
+    def __init__(self, path: str, size: int = 4):
+        self.path = path
+        self.size = size
+        self._connections: List[SQLiteConnection] = []
+        self._idle: asyncio.Queue = asyncio.Queue()
+
+    async def connect(self):
+        for _ in range(self.size):
+            connection = await asyncio.to_thread(SQLiteConnection, self.path)
+            self._connections.append(connection)
+            self._idle.put_nowait(connection)
+
+    @asynccontextmanager
+    async def acquire(self):
+        connection = await self._idle.get()
+        try:
+            yield connection
+        finally:
+            self._idle.put_nowait(connection)
+
+    async def close(self):
+        for connection in self._connections:
+            await asyncio.to_thread(connection.close)
+        self._connections.clear()
+
+
+async def create_pool(database_url: Optional[str], max_size: int = 10):
+    """asyncpg pool for Postgres URLs, SQLitePool for sqlite:/// ones"""
+    if not database_url:
+        raise ValueError("DATABASE_URL not set")
+
+    if database_url.startswith('sqlite:'):
+        path = database_url.split('://', 1)[-1][1:] or ':memory:'
+        # Every connection to :memory: would be a separate, empty database
+        pool = SQLitePool(path, size=1 if path == ':memory:' else min(max_size, 4))
+        await pool.connect()
+        logger.info(f"Using SQLite database at {path} ({pool.size} connections)")
+        return pool
+
+    import asyncpg
+    pool = await asyncpg.create_pool(database_url, min_size=1, max_size=max_size, command_timeout=30)
+    logger.info(f"Connected database pool (up to {max_size} connections)")
+    return pool
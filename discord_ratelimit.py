@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Mapping, Optional
+
+logger = logging.getLogger('DiscordRateLimit')
+
+
+class DiscordBucket:
+    """Rate-limit state for one Discord bucket, as reported by its response headers"""
+
+    __slots__ = ('key', 'limit', 'remaining', 'reset_at', 'window', 'known', 'in_flight', 'changed')
+
+    def __init__(self, key: str):
+        self.key = key
+        self.limit: Optional[int] = None  # None: no rate-limit headers seen, nothing to enforce
+        self.remaining = 0
+        self.reset_at = 0.0
+        self.window = 0.0  # Longest Reset-After seen, i.e. the bucket's window length
+        self.known = False  # Until the first response, one request at a time
+        self.in_flight = 0
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        """Wake everything waiting on this bucket"""
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class DiscordRateLimiter:
+    """Process-wide Discord rate limiter keyed by the X-RateLimit-Bucket id.
+
+    Routes (webhook URLs) start on a provisional bucket of their own and are
+    moved onto Discord's bucket id once a response names it, so webhooks that
+    share a bucket share its budget. Requests go out as fast as ``remaining``
+    allows and wait for ``reset_after`` only when a bucket is exhausted. A
+    global 429 pauses every sender in the process until it expires.
+    """
+
+    def __init__(self):
+        self.route_buckets: Dict[str, str] = {}
+        self.buckets: Dict[str, DiscordBucket] = {}
+        self.global_until = 0.0
+        self.global_changed = asyncio.Event()
+        self.queued = 0
+        self.global_limits = 0
+        self.bucket_limits = 0
+
+    def _bucket(self, route: str) -> DiscordBucket:
+        key = self.route_buckets.get(route, route)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = DiscordBucket(key)
+        return bucket
+
+    @staticmethod
+    async def _wait(event: asyncio.Event, timeout: Optional[float]):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def acquire(self, route: str) -> DiscordBucket:
+        """Wait until a request on ``route`` may be sent; pass the result to ``release``"""
+        self.queued += 1
+        try:
+            while True:
+                now = time.time()
+                if now < self.global_until:
+                    await self._wait(self.global_changed, self.global_until - now)
+                    continue
+
+                bucket = self._bucket(route)
+                if not bucket.known:
+                    if bucket.in_flight == 0:
+                        bucket.in_flight += 1
+                        return bucket
+                    await self._wait(bucket.changed, None)
+                    continue
+
+                if bucket.limit is None:
+                    bucket.in_flight += 1
+                    return bucket
+                if bucket.remaining <= 0 and now >= bucket.reset_at:
+                    # Start the next window ourselves; responses correct it when they arrive
+                    bucket.remaining = bucket.limit
+                    bucket.reset_at = now + bucket.window
+                if bucket.remaining > 0:
+                    bucket.remaining -= 1
+                    bucket.in_flight += 1
+                    return bucket
+                await self._wait(bucket.changed, bucket.reset_at - now)
+        finally:
+            self.queued -= 1
+
+    def release(self, route: str, bucket: DiscordBucket, status: Optional[int] = None,
+                headers: Optional[Mapping[str, str]] = None, body: Optional[str] = None) -> float:
+        """Record a response (or a failed request when ``status`` is None).
+
+        Returns the seconds to wait before retrying after a 429, else 0.
+        """
+        bucket.in_flight -= 1
+        if status is None or headers is None:
+            bucket.notify()
+            return 0.0
+
+        now = time.time()
+        bucket_id = headers.get('X-RateLimit-Bucket')
+        if bucket_id and self.route_buckets.get(route) != bucket_id:
+            # Move the route onto Discord's bucket, merging with routes that already share it
+            self.route_buckets[route] = bucket_id
+            shared = self.buckets.get(bucket_id)
+            if shared is None:
+                shared = self.buckets[bucket_id] = DiscordBucket(bucket_id)
+            if self.buckets.get(route) is bucket:
+                del self.buckets[route]
+            bucket.notify()
+            bucket = shared
+
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is not None:
+            bucket.limit = int(headers.get('X-RateLimit-Limit', remaining) or 1)
+            # Requests still in flight were sent after this one was counted
+            bucket.remaining = max(0, int(remaining) - bucket.in_flight)
+            reset_after = float(headers.get('X-RateLimit-Reset-After', 0) or 0)
+            bucket.reset_at = now + reset_after
+            bucket.window = max(bucket.window, reset_after)
+        bucket.known = True
+
+        retry_after = 0.0
+        if status == 429:
+            is_global = headers.get('X-RateLimit-Global', '').lower() == 'true'
+            retry_after = float(headers.get('Retry-After', 1) or 1)
+            try:
+                data = json.loads(body) if body else {}
+                retry_after = float(data.get('retry_after', retry_after))
+                is_global = is_global or bool(data.get('global'))
+            except (ValueError, TypeError, AttributeError):
+                pass
+
+            if is_global:
+                self.global_limits += 1
+                self.global_until = max(self.global_until, now + retry_after)
+                logger.warning(f"Global Discord rate limit, pausing all webhooks for {retry_after:.2f}s")
+                self.global_changed.set()
+                self.global_changed = asyncio.Event()
+            else:
+                self.bucket_limits += 1
+                bucket.remaining = 0
+                bucket.reset_at = max(bucket.reset_at, now + retry_after)
+                logger.warning(f"Discord bucket {bucket.key} rate limited for {retry_after:.2f}s")
+
+        bucket.notify()
+        return retry_after
+
+    def stats(self) -> Dict:
+        return {
+            'queued': self.queued,
+            'buckets': len(self.buckets),
+            'global_paused_for': round(max(0.0, self.global_until - time.time()), 2),
+            'global_limits': self.global_limits,
+            'bucket_limits': self.bucket_limits,
+        }
+
+
+# Shared by every webhook in the process
+rate_limiter = DiscordRateLimiter()
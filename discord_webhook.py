@@ -1,169 +1,383 @@
 import json
 import aiohttp
 import asyncio
-import time
 from datetime import datetime
-from config import INFO_COLOR
+from collections import OrderedDict, deque
+from config import (DISCORD_EMBED_CHAR_LIMIT, DISCORD_MAX_EMBEDS, INFO_COLOR, WEBHOOK_BATCH_WINDOW,
+                    WEBHOOK_EDIT_WINDOW, WEBHOOK_TRACKED_MESSAGES)
+from catalog_diff import EVENT_LABELS, NEW
+from discord_ratelimit import rate_limiter
+from products import Product
 import random
 import logging
+import time
+from typing import Deque, Dict, Hashable, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+from yarl import URL
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('DiscordWebhook')
 
+# One keep-alive session for every webhook in the process, so notifications
+# reuse warm connections instead of paying DNS, TCP and TLS setup each time
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_webhook_session() -> aiohttp.ClientSession:
+    """Return the shared webhook session, creating it on first use"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=50, ttl_dns_cache=300, keepalive_timeout=60)
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=30, connect=10),
+            headers={"Content-Type": "application/json"}
+        )
+    return _session
+
+
+async def warm_up_webhooks(webhook_urls: Iterable[str]):
+    """Open a pooled connection to each webhook host before the first notification needs it"""
+    session = get_webhook_session()
+    for origin in {f"{urlparse(url).scheme}://{urlparse(url).netloc}" for url in webhook_urls if url}:
+        try:
+            async with session.head(origin) as response:
+                await response.read()
+            logger.info(f"Warmed up webhook connection to {origin}")
+        except Exception as e:
+            logger.warning(f"Webhook warm-up to {origin} failed: {e}")
+
+
+async def close_webhook_session():
+    """Close the shared session and its pooled connections"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def embed_length(embed: Dict) -> int:
+    """Characters Discord counts towards the 6000-character total of a message's embeds"""
+    length = len(embed.get("title", "")) + len(embed.get("description", ""))
+    length += len(embed.get("footer", {}).get("text", "")) + len(embed.get("author", {}).get("name", ""))
+    for field in embed.get("fields", ()):
+        length += len(field.get("name", "")) + len(field.get("value", ""))
+    return length
+
+
+def product_key(product) -> Hashable:
+    """Identifies a product across notifications, whether a Product or a legacy dict"""
+    if isinstance(product, Product):
+        return (product.store_url, product.id)
+    return (product.get("retailer") or product.get("url"), product.get("id"))
+
+
+class SentMessage:
+    """A delivered webhook message and the products whose embeds it carries"""
+
+    __slots__ = ('id', 'embeds', 'products', 'sent_at')
+
+    def __init__(self, message_id: str, embeds: List[Dict], products: List[Hashable]):
+        self.id = message_id
+        self.embeds = embeds
+        self.products = products
+        self.sent_at = time.monotonic()
+
+
 class RateLimitedDiscordWebhook:
-    def __init__(self, webhook_url):
+    def __init__(self, webhook_url, batch_window=WEBHOOK_BATCH_WINDOW, edit_window=WEBHOOK_EDIT_WINDOW,
+                 tracked_messages=WEBHOOK_TRACKED_MESSAGES):
         if not webhook_url or not webhook_url.startswith('https://discord.com/api/webhooks/'):
             raise ValueError("Invalid Discord webhook URL")
         self.webhook_url = webhook_url
-        self.last_request_time = 0
-        self.rate_limit_window = 2  # Increased from 1.25 to 2 seconds between requests
         self.max_retries = 3
-        self.rate_limit_remaining = 5
-        self.rate_limit_reset = 0
-        self._lock = asyncio.Lock()
+        self.batch_window = batch_window  # Seconds to collect notifications into one message
+        self._pending: Deque[Tuple[Hashable, Dict, asyncio.Future]] = deque()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Announced products, so later stock changes edit the original message in place
+        self.edit_window = edit_window
+        self.tracked_messages = tracked_messages
+        self.messages: OrderedDict = OrderedDict()  # message id -> SentMessage, oldest first
+        self.product_messages: Dict[Hashable, str] = {}
+        self._edits: Dict[str, Dict[Hashable, List[asyncio.Future]]] = {}  # message id -> product -> waiters
+        self._edit_task: Optional[asyncio.Task] = None
+        self.edits_sent = 0
+        self.edits_coalesced = 0
+
+    async def _send_webhook_with_backoff(self, payload, attempt=0, backoff=True, message_id=None) -> Optional[Dict]:
+        """Send webhook with exponential backoff on errors, paced by the shared Discord rate limiter.
 
-    async def _send_webhook_with_backoff(self, payload, attempt=0):
-        """Send webhook with exponential backoff and adaptive rate limiting"""
+        Posts a new message, or edits ``message_id`` in place. Returns the
+        message Discord sent back (empty if it sent none), or None on failure.
+        """
         try:
-            # Calculate backoff time with jitter
-            backoff = (min(300, (2 ** attempt) * 0.5) if attempt > 0 else 0)
-            if backoff > 0:
-                backoff += random.uniform(0, backoff * 0.1)
-                logger.info(f"Backing off for {backoff:.2f}s (attempt {attempt + 1})")
-                await asyncio.sleep(backoff)
-
-            # Ensure we respect the rate limit
-            current_time = time.time()
-            async with self._lock:
-                if self.rate_limit_remaining <= 1 and current_time < self.rate_limit_reset:
-                    wait_time = self.rate_limit_reset - current_time + 0.1
-                    logger.info(f"Rate limit approaching, waiting {wait_time:.2f}s")
-                    await asyncio.sleep(wait_time)
-                elif current_time - self.last_request_time < self.rate_limit_window:
-                    sleep_time = self.rate_limit_window - (current_time - self.last_request_time)
-                    sleep_time += random.uniform(0.1, 0.3)  # Add jitter
-                    await asyncio.sleep(sleep_time)
-
-            logger.info(f"Sending webhook for {payload.get('embeds', [{}])[0].get('title', 'Unknown product')}")
-
-            # Use connection pooling for better performance
-            conn = aiohttp.TCPConnector(ssl=False, force_close=True, ttl_dns_cache=300)
-            timeout = aiohttp.ClientTimeout(total=30, connect=10)
-
-            async with aiohttp.ClientSession(connector=conn, timeout=timeout) as session:
-                async with session.post(
-                    self.webhook_url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
-                ) as response:
-                    # Update rate limit tracking
-                    self.last_request_time = time.time()
-                    self.rate_limit_remaining = int(response.headers.get('X-RateLimit-Remaining', 5))
-
-                    if 'X-RateLimit-Reset-After' in response.headers:
-                        reset_after = float(response.headers.get('X-RateLimit-Reset-After', 0))
-                        self.rate_limit_reset = time.time() + reset_after
+            # Calculate backoff time with jitter; 429s are paced by the limiter instead
+            delay = (min(300, (2 ** attempt) * 0.5) if attempt > 0 and backoff else 0)
+            if delay > 0:
+                delay += random.uniform(0, delay * 0.1)
+                logger.info(f"Backing off for {delay:.2f}s (attempt {attempt + 1})")
+                await asyncio.sleep(delay)
+
+            # Keeps any query the webhook URL already carries, e.g. thread_id
+            webhook = URL(self.webhook_url)
+            if message_id is None:
+                # wait=true makes Discord return the message, whose id later edits need
+                method, url, route = 'POST', webhook.update_query(wait='true'), self.webhook_url
+            else:
+                url = (webhook / 'messages' / message_id).with_query(webhook.query)
+                method, route = 'PATCH', f"{self.webhook_url}/messages"
 
+            bucket = await rate_limiter.acquire(route)
+            logger.info(f"{'Sending' if message_id is None else 'Editing'} webhook for "
+                        f"{payload.get('embeds', [{}])[0].get('title', 'Unknown product')}")
+
+            try:
+                session = get_webhook_session()
+                async with session.request(method, url, json=payload) as response:
                     response_text = await response.text()
-                    logger.info(f"Webhook response: Status {response.status}, Headers: {dict(response.headers)}")
+            except BaseException:
+                rate_limiter.release(route, bucket)
+                raise
+            retry_after = rate_limiter.release(route, bucket, response.status, response.headers, response_text)
+            logger.info(f"Webhook response: Status {response.status}, Headers: {dict(response.headers)}")
 
-                    if response.status == 429:  # Rate limited
-                        retry_after = float(response.headers.get('Retry-After', 5))
-                        logger.warning(f"Rate limited by Discord. Retrying after {retry_after}s")
-                        await asyncio.sleep(retry_after)
-                        if attempt < self.max_retries:
-                            return await self._send_webhook_with_backoff(payload, attempt + 1)
-                        return False
+            if response.status == 429:  # Rate limited
+                logger.warning(f"Rate limited by Discord. Retrying after {retry_after}s")
+                if attempt < self.max_retries:
+                    # No backoff of our own: the limiter holds the retry until the bucket or global limit resets
+                    return await self._send_webhook_with_backoff(payload, attempt + 1, backoff=False, message_id=message_id)
+                return None
 
-                    if response.status == 204:  # Success
-                        logger.info("Webhook sent successfully")
-                        return True
+            if response.status in (200, 204):  # Success
+                logger.info("Webhook sent successfully")
+                try:
+                    return json.loads(response_text) if response_text else {}
+                except ValueError:
+                    return {}
 
-                    logger.error(f"Discord webhook error: Status {response.status}, Response: {response_text}")
-                    if attempt < self.max_retries:
-                        return await self._send_webhook_with_backoff(payload, attempt + 1)
-                    return False
+            logger.error(f"Discord webhook error: Status {response.status}, Response: {response_text}")
+            if response.status == 404 and message_id is not None:
+                return None  # Message deleted; retrying the edit cannot succeed
+            if attempt < self.max_retries:
+                return await self._send_webhook_with_backoff(payload, attempt + 1, message_id=message_id)
+            return None
 
         except Exception as e:
             logger.error(f"Webhook delivery error: {str(e)}", exc_info=True)
             if attempt < self.max_retries:
-                return await self._send_webhook_with_backoff(payload, attempt + 1)
-            return False
+                return await self._send_webhook_with_backoff(payload, attempt + 1, message_id=message_id)
+            return None
 
-    async def send_product_notification(self, product):
-        """Send product notification with adaptive rate limiting and retry logic"""
-        try:
-            # Validate product data
-            required_fields = ['title', 'url', 'price']
-            missing_fields = [field for field in required_fields if not product.get(field)]
-            if missing_fields:
-                logger.error(f"Missing required product fields: {missing_fields}")
-                return False
-
-            # Create webhook content with validation
-            embed = {
-                "title": str(product["title"])[:256],  # Discord limit
-                "url": str(product["url"])[:512],  # Discord limit
-                "color": INFO_COLOR,
-                "timestamp": datetime.utcnow().isoformat(),
-            }
+    @staticmethod
+    def build_embed(product) -> Optional[Dict]:
+        """Build the Discord embed for a product, or None if required fields are missing"""
+        # Compact Product records become plain dicts only here, at the webhook boundary
+        if isinstance(product, Product):
+            product = product.to_dict()
 
-            if product.get("image_url"):
-                embed["thumbnail"] = {"url": str(product["image_url"])[:512]}
-
-            embed["fields"] = [
-                {
-                    "name": "Price",
-                    "value": f"${product['price']}" if isinstance(product['price'], (int, float)) else str(product['price'])[:1024],
-                    "inline": True
-                }
-            ]
-
-            # Add retailer if available
-            if "retailer" in product:
-                embed["fields"].append({
-                    "name": "Retailer",
-                    "value": str(product["retailer"])[:1024],
-                    "inline": True
-                })
+        # Validate product data
+        required_fields = ['title', 'url', 'price']
+        missing_fields = [field for field in required_fields if not product.get(field)]
+        if missing_fields:
+            logger.error(f"Missing required product fields: {missing_fields}")
+            return None
 
-            # Add sizes with cart links if available
-            if product.get("sizes"):
-                sizes_text = []
-                for size, qty in product["sizes"].items():
-                    base_url = product["url"]
-                    variant_id = product["variants"].get(size, "")
-                    size_text = f"• {size} | QT [{qty}]"
-                    if variant_id:
-                        cart_url = f"{base_url}?variant={variant_id}"
-                        size_text = f"[{size_text}]({cart_url})"
-                    sizes_text.append(size_text)
-
-                # Ensure size text doesn't exceed Discord's limit
-                sizes_value = "\n".join(sizes_text)[:1024]
-                embed["fields"].append({
-                    "name": "Sizes / Stock",
-                    "value": sizes_value,
-                    "inline": False
-                })
+        # Create webhook content with validation
+        embed = {
+            "title": str(product["title"])[:256],  # Discord limit
+            "url": str(product["url"])[:512],  # Discord limit
+            "color": INFO_COLOR,
+            "timestamp": datetime.utcnow().isoformat(),
+        }
 
-            payload = {
-                "username": "SoleAddictionsLLC Monitor",
-                "embeds": [embed]
+        if product.get("image_url"):
+            embed["thumbnail"] = {"url": str(product["image_url"])[:512]}
+
+        embed["fields"] = [
+            {
+                "name": "Price",
+                "value": f"${product['price']}" if isinstance(product['price'], (int, float)) else str(product['price'])[:1024],
+                "inline": True
             }
+        ]
+
+        # Label restocks, price changes and sell-outs so they stand apart from new drops
+        event = product.get("event")
+        if event and event != NEW:
+            embed["fields"].append({
+                "name": "Event",
+                "value": EVENT_LABELS.get(event, str(event)),
+                "inline": True
+            })
+
+        # Add retailer if available
+        if "retailer" in product:
+            embed["fields"].append({
+                "name": "Retailer",
+                "value": str(product["retailer"])[:1024],
+                "inline": True
+            })
 
-            # Validate payload size (Discord limit is 8MB)
-            payload_size = len(json.dumps(payload).encode('utf-8'))
-            if payload_size > 8_000_000:  # 8MB limit
-                logger.error(f"Payload too large ({payload_size} bytes), truncating content")
-                # Truncate fields if necessary
-                while payload_size > 8_000_000 and embed["fields"]:
-                    embed["fields"].pop()
-                    payload_size = len(json.dumps(payload).encode('utf-8'))
+        # Add sizes with cart links if available
+        if product.get("sizes"):
+            sizes_text = []
+            for size, qty in product["sizes"].items():
+                base_url = product["url"]
+                variant_id = product["variants"].get(size, "")
+                size_text = f"• {size} | QT [{qty}]"
+                if variant_id:
+                    cart_url = f"{base_url}?variant={variant_id}"
+                    size_text = f"[{size_text}]({cart_url})"
+                sizes_text.append(size_text)
 
-            logger.info(f"Sending notification for product: {product['title']}")
-            return await self._send_webhook_with_backoff(payload)
+            # Ensure size text doesn't exceed Discord's limit
+            sizes_value = "\n".join(sizes_text)[:1024]
+            embed["fields"].append({
+                "name": "Sizes / Stock",
+                "value": sizes_value,
+                "inline": False
+            })
 
+        return embed
+
+    async def send_product_notification(self, product) -> bool:
+        """Queue a product's embed for the next batch; resolves once its message was delivered.
+
+        Changes to a product announced within ``edit_window`` edit its
+        original message instead of posting a new one.
+        """
+        try:
+            embed = self.build_embed(product)
+            key = product_key(product)
+            event = product.event if isinstance(product, Product) else product.get("event")
         except Exception as e:
             logger.error(f"Error preparing webhook notification: {e}", exc_info=True)
-            return False
\ No newline at end of file
+            return False
+        if embed is None:
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        message = self._message_for(key)
+        if message is not None and event not in (None, NEW):
+            logger.info(f"Queueing edit for product: {embed['title']}")
+            self._queue_edit(message, key, embed, future)
+        else:
+            logger.info(f"Queueing notification for product: {embed['title']}")
+            self._queue_post(key, embed, future)
+        return await future
+
+    def _queue_post(self, key: Hashable, embed: Dict, future: asyncio.Future):
+        self._pending.append((key, embed, future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_batches())
+
+    def _message_for(self, key: Hashable) -> Optional[SentMessage]:
+        """The message announcing a product, if it is recent enough to edit"""
+        message_id = self.product_messages.get(key)
+        if message_id is None:
+            return None
+        message = self.messages[message_id]
+        if time.monotonic() - message.sent_at > self.edit_window:
+            self._forget_message(message_id)
+            return None
+        return message
+
+    def _remember_message(self, message_id: str, embeds: List[Dict], products: List[Hashable]):
+        for key in products:
+            # A newer announcement becomes the product's message
+            self.product_messages[key] = message_id
+        self.messages[message_id] = SentMessage(message_id, embeds, products)
+        while len(self.messages) > self.tracked_messages:
+            self._forget_message(next(iter(self.messages)))
+
+    def _forget_message(self, message_id: str):
+        """Stop tracking a message; changes still waiting to edit it are posted as new messages"""
+        message = self.messages.pop(message_id, None)
+        if message is None:
+            return
+        for key in message.products:
+            if self.product_messages.get(key) == message_id:
+                del self.product_messages[key]
+        self._repost(message, self._edits.pop(message_id, {}))
+
+    def _repost(self, message: SentMessage, edits: Dict[Hashable, List[asyncio.Future]]):
+        for key, futures in edits.items():
+            post = asyncio.get_running_loop().create_future()
+            post.add_done_callback(lambda done, futures=futures: [
+                future.set_result(done.result()) for future in futures if not future.done()
+            ])
+            self._queue_post(key, message.embeds[message.products.index(key)], post)
+
+    def _queue_edit(self, message: SentMessage, key: Hashable, embed: Dict, future: asyncio.Future):
+        # The latest embed wins; every change within the window goes out as one edit
+        message.embeds[message.products.index(key)] = embed
+        edits = self._edits.setdefault(message.id, {})
+        if edits:
+            self.edits_coalesced += 1
+        edits.setdefault(key, []).append(future)
+        if self._edit_task is None or self._edit_task.done():
+            self._edit_task = asyncio.create_task(self._flush_edits())
+
+    async def _flush_edits(self):
+        """Collect changes for one window, then send one edit per changed message"""
+        await asyncio.sleep(self.batch_window)
+        while self._edits:
+            # Changes arriving while this edit is in flight wait for the next one
+            message_id, edits = self._edits.popitem()
+            message = self.messages[message_id]
+            try:
+                edited = await self._send_webhook_with_backoff({"embeds": list(message.embeds)}, message_id=message_id)
+            except Exception as e:
+                logger.error(f"Webhook edit error: {e}", exc_info=True)
+                edited = None
+
+            if edited is None:
+                # Deleted or uneditable: announce the changed products afresh
+                self._forget_message(message_id)
+                self._repost(message, edits)
+                continue
+            self.edits_sent += 1
+            for futures in edits.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(True)
+
+    def _take_batch(self) -> List[Tuple[Hashable, Dict, asyncio.Future]]:
+        """Pop the longest run of pending embeds that fits in one message"""
+        batch = []
+        total = 0
+        while self._pending and len(batch) < DISCORD_MAX_EMBEDS:
+            size = embed_length(self._pending[0][1])
+            if batch and total + size > DISCORD_EMBED_CHAR_LIMIT:
+                break
+            batch.append(self._pending.popleft())
+            total += size
+        return batch
+
+    async def _flush_batches(self):
+        """Collect notifications for one window, then send them packed into multi-embed messages"""
+        await asyncio.sleep(self.batch_window)
+        while self._pending:
+            batch = self._take_batch()
+            embeds = [embed for _, embed, _ in batch]
+            try:
+                message = await self._send_webhook_with_backoff({
+                    "username": "SoleAddictionsLLC Monitor",
+                    "embeds": embeds
+                })
+            except Exception as e:
+                logger.error(f"Webhook batch delivery error: {e}", exc_info=True)
+                message = None
+            if message and message.get("id"):
+                self._remember_message(message["id"], embeds, [key for key, _, _ in batch])
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(message is not None)
+
+    def stats(self) -> Dict:
+        return {
+            'tracked_messages': len(self.messages),
+            'tracked_products': len(self.product_messages),
+            'edits_sent': self.edits_sent,
+            'edits_coalesced': self.edits_coalesced,
+        }
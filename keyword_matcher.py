@@ -0,0 +1,172 @@
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+from catalog_decode import CatalogProduct
+
+
+def searchable_text(product: CatalogProduct) -> str:
+    """Lowercased title, vendor, type and tags of a product, as matched against keywords"""
+    return " ".join((
+        product.title,
+        product.vendor or "",
+        product.product_type or "",
+        *product.tags
+    )).lower()
+
+
+class KeywordMatcher:
+    """All of a keyword set compiled into a single regular expression.
+
+    Single-word keywords match on word boundaries; multi-word keywords match
+    when their words appear in order anywhere in the text. Both kinds share
+    one alternation, so each product costs one regex search regardless of
+    how many keywords are configured.
+    """
+
+    def __init__(self, keywords: Tuple[str, ...]):
+        self.keywords = keywords
+
+        single_words = []
+        multi_words = []
+        for keyword in keywords:
+            parts = keyword.split()
+            if len(parts) > 1:
+                multi_words.append(".*?".join(re.escape(part) for part in parts))
+            elif parts:
+                single_words.append(re.escape(parts[0]))
+
+        alternatives = []
+        if single_words:
+            # Longest first so a shorter keyword never shadows a longer one at the same position
+            single_words.sort(key=len, reverse=True)
+            alternatives.append(f"\\b(?:{'|'.join(single_words)})\\b")
+        alternatives.extend(f"(?:{pattern})" for pattern in multi_words)
+
+        # '.' does not cross newlines, which keeps batched products apart
+        self.pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    def matches(self, product: CatalogProduct) -> bool:
+        """Check a single product"""
+        if not product or self.pattern is None:
+            return False
+        return self.pattern.search(searchable_text(product).replace("\n", " ")) is not None
+
+    def match_batch(self, products: List[CatalogProduct]) -> List[bool]:
+        """Score a whole catalog page in one pass, returning a flag per product"""
+        results = [False] * len(products)
+        if self.pattern is None or not products:
+            return results
+
+        texts = [searchable_text(product).replace("\n", " ") if product else "" for product in products]
+        offsets = []
+        position = 0
+        for text in texts:
+            offsets.append(position)
+            position += len(text) + 1
+        page_text = "\n".join(texts)
+
+        search = self.pattern.search
+        position = 0
+        while True:
+            match = search(page_text, position)
+            if match is None:
+                break
+            index = bisect_right(offsets, match.start()) - 1
+            results[index] = True
+            # Skip the rest of this product, it already matched
+            if index + 1 >= len(offsets):
+                break
+            position = offsets[index + 1]
+        return results
+
+    def filter(self, products: Iterable[CatalogProduct]) -> List[CatalogProduct]:
+        """Return only the products that match"""
+        products = list(products)
+        return [product for product, matched in zip(products, self.match_batch(products)) if matched]
+
+
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize_keyword(keyword: str) -> str:
+    return keyword.strip().lower() if keyword else ""
+
+
+class KeywordIndex:
+    """Inverted index from keyword to the subscribers that watch it.
+
+    Single-word keywords are looked up by token, so tokenizing a product once
+    finds every interested subscriber regardless of how many there are; a
+    token lookup gives the same result as the matcher's word-boundary regex.
+    Multi-word and punctuated keywords keep KeywordMatcher's semantics and
+    are searched once per distinct keyword, not once per subscriber.
+    Subscriptions are added and removed incrementally.
+    """
+
+    def __init__(self):
+        self.words: Dict[str, Set[Hashable]] = {}
+        self.phrases: Dict[str, Set[Hashable]] = {}
+        self._phrase_patterns: Dict[str, re.Pattern] = {}
+
+    def add(self, subscriber: Hashable, keyword: str):
+        keyword = normalize_keyword(keyword)
+        if not keyword:
+            return
+        if WORD_RE.fullmatch(keyword):
+            self.words.setdefault(keyword, set()).add(subscriber)
+        else:
+            if keyword not in self.phrases:
+                self._phrase_patterns[keyword] = _compiled_matcher((keyword,)).pattern
+            self.phrases.setdefault(keyword, set()).add(subscriber)
+
+    def remove(self, subscriber: Hashable, keyword: str):
+        keyword = normalize_keyword(keyword)
+        for table in (self.words, self.phrases):
+            subscribers = table.get(keyword)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del table[keyword]
+                self._phrase_patterns.pop(keyword, None)
+
+    def update(self, subscriber: Hashable, old_keywords: Iterable[str], new_keywords: Iterable[str]):
+        """Apply only the difference between a subscriber's old and new keyword sets"""
+        old = {normalize_keyword(kw) for kw in old_keywords} - {""}
+        new = {normalize_keyword(kw) for kw in new_keywords} - {""}
+        for keyword in old - new:
+            self.remove(subscriber, keyword)
+        for keyword in new - old:
+            self.add(subscriber, keyword)
+
+    def match(self, product: CatalogProduct) -> Set[Hashable]:
+        """Every subscriber with at least one keyword matching the product"""
+        text = searchable_text(product)
+        matched = set()
+        words = self.words
+        for token in set(WORD_RE.findall(text)):
+            subscribers = words.get(token)
+            if subscribers:
+                matched |= subscribers
+        if self.phrases:
+            text = text.replace("\n", " ")
+            for keyword, subscribers in self.phrases.items():
+                if not subscribers <= matched and self._phrase_patterns[keyword].search(text):
+                    matched |= subscribers
+        return matched
+
+    def __len__(self) -> int:
+        return len(self.words) + len(self.phrases)
+
+
+@lru_cache(maxsize=256)
+def _compiled_matcher(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
+
+
+def get_matcher(keywords: Iterable[str]) -> KeywordMatcher:
+    """Return the cached matcher for a keyword set, compiling it on first use"""
+    normalized = tuple(sorted({normalize_keyword(kw) for kw in keywords} - {""}))
+    return _compiled_matcher(normalized)
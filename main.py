@@ -7,11 +7,8 @@ import time
 import traceback
 from datetime import datetime
 from pathlib import Path
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text
 import json
-from typing import Dict, Set, List
+from typing import List, Optional
 
 # Configure logging
 log_dir = Path('logs')
@@ -42,39 +39,51 @@ logger.info(f"Current working directory: {os.getcwd()}")
 logger.info(f"Python path: {sys.path}")
 logger.info("=====================")
 
-# Create Flask app
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
 # Import required modules
 try:
     logger.info("Importing required modules...")
     from shopify_monitor import ShopifyMonitor
-    from discord_webhook import RateLimitedDiscordWebhook
-    from models import db, User, Store, Keyword, MonitorConfig
+    from store_scheduler import StoreScheduler
+    from config import EXIT_CONFIG_ERROR, MAX_POLL_INTERVAL, OUTBOX_DB, SEEN_PRODUCTS_DB
+    from seen_store import SeenProductStore
+    from monitor_engine import CONFIG_POLL_INTERVAL, MonitorEngine
+    from notification_outbox import NotificationOutbox
+    from outbox_journal import OutboxJournal
+    from config_watch import ConfigVersionWatcher
+    from monitor_repository import MonitorRepository
+    from discord_webhook import RateLimitedDiscordWebhook, close_webhook_session, warm_up_webhooks
+    from discord_ratelimit import rate_limiter
     from sqlalchemy.exc import OperationalError
     logger.info("All modules imported successfully")
 except ImportError as e:
     logger.error(f"Failed to import required modules: {e}", exc_info=True)
     sys.exit(1)
 
-# Initialize SQLAlchemy with app
-db.init_app(app)
+# Notification dedupe state, persisted so restarts don't re-announce everything
+seen_products = SeenProductStore(SEEN_PRODUCTS_DB)
+
+# Notifications queued but not yet delivered, so a killed monitor resumes them
+outbox_journal = OutboxJournal(OUTBOX_DB)
 
-# Global state to track seen products
-seen_products: Dict[str, Set[str]] = {}
+# Detects store/keyword/config edits made by the bot or dashboard while running
+config_watcher = ConfigVersionWatcher()
 
 class MonitorManager:
-    def __init__(self, user_id: int, webhook_url: str, config: MonitorConfig):
+    def __init__(self, user_id: int, webhook_url: str, config, repository: MonitorRepository):
         self.user_id = user_id
+        self.repository = repository
         self.webhook = RateLimitedDiscordWebhook(webhook_url=webhook_url)
+        self.outbox = NotificationOutbox(seen_products, outbox_journal)
         self.monitor = ShopifyMonitor(rate_limit=config.rate_limit)
         self.config = config
+        self.keywords: List[str] = []
+        self.last_config_poll = time.monotonic()
+        self.scheduler = StoreScheduler(
+            self.poll_store,
+            self.store_interval,
+            concurrency=config.batch_size or 20,
+            circuit_breaker=self.monitor.circuit_breaker
+        )
         self.running = True
         self.last_health_check = time.time()
         self.stores_status = {}
@@ -90,9 +99,6 @@ class MonitorManager:
 
     async def monitor_store(self, store_url: str, keywords: List[str]) -> int:
         """Monitor a single store with improved error handling and retry logic"""
-        if store_url not in seen_products:
-            seen_products[store_url] = set()
-
         store_key = f"{store_url}-{self.user_id}"
 
         try:
@@ -104,26 +110,21 @@ class MonitorManager:
                 'status': 'checking'
             }
 
-            products = await self.monitor.async_fetch_products(store_url, keywords)
+            products = await self.monitor.async_fetch_products(
+                store_url,
+                keywords,
+                max_products=self.config.max_products or 250,
+                page_size=self.config.initial_product_limit or 250
+            )
 
             if not products:
                 self.stores_status[store_key]['status'] = 'no_products'
                 return 0
 
-            new_products = 0
-            for product in products:
-                product_id = f"{store_url}-{product['title']}-{self.user_id}"
-                if product_id not in seen_products[store_url]:
-                    try:
-                        webhook_success = await self.webhook.send_product_notification(product)
-                        if webhook_success:
-                            seen_products[store_url].add(product_id)
-                            new_products += 1
-                            logger.info(f"New product found and notified: {product['title']}")
-                        else:
-                            logger.error(f"Failed to send webhook for {product['title']}")
-                    except Exception as webhook_error:
-                        logger.error(f"Webhook error for {product['title']}: {webhook_error}", exc_info=True)
+            # Queued for delivery; the poll doesn't wait on Discord
+            new_products = await self.outbox.submit(
+                self.webhook, store_url, products, self.user_id, self.monitor.retry_product
+            )
 
             self.stores_status[store_key]['status'] = 'success'
             return new_products
@@ -134,43 +135,68 @@ class MonitorManager:
             self.stores_status[store_key]['last_error'] = str(e)
             return 0
 
-    async def monitor_stores(self, stores: List[Store], keywords: List[str]):
-        """Monitor multiple stores concurrently"""
-        while self.running:
-            try:
-                # Create monitoring tasks for all stores
-                tasks = [
-                    self.monitor_store(store.url, keywords)
-                    for store in stores
-                    if store.enabled
-                ]
-
-                if not tasks:
-                    logger.info("No active stores to monitor")
-                    await asyncio.sleep(self.config.monitor_delay)
-                    continue
-
-                # Execute all monitoring tasks concurrently
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # Process results and handle any exceptions
-                total_new = 0
-                for i, result in enumerate(results):
-                    if isinstance(result, Exception):
-                        logger.error(f"Error monitoring store {stores[i].url}: {result}")
-                    elif isinstance(result, int):
-                        total_new += result
-
-                # Adaptive delay based on results
-                delay = self.config.monitor_delay * (0.25 if total_new > 0 else 1.0)
-                await asyncio.sleep(max(0.05, delay))
-
-                # Perform health check
+    def store_interval(self, store_url: str, new_products: Optional[int]) -> float:
+        """Delay before a store's next poll, learned from how often its catalog changes"""
+        # Activity never polls faster than the configured post-drop cadence
+        fastest = max(self.config.min_cycle_delay or 0.05,
+                      self.config.monitor_delay * (self.config.success_delay_multiplier or 0.25))
+        delay = self.monitor.store_activity.interval(
+            store_url, self.config.monitor_delay, fastest, MAX_POLL_INTERVAL
+        )
+        if new_products:
+            # Something just dropped here; stay close while the release is live
+            delay = min(delay, fastest)
+        return delay
+
+    async def poll_store(self, store_url: str) -> int:
+        return await self.monitor_store(store_url, self.keywords)
+
+    async def monitor_stores(self, store_urls: List[str], keywords: List[str]):
+        """Monitor stores independently, each rescheduled as soon as its own poll completes"""
+        self.keywords = keywords
+        self.scheduler.set_stores(store_urls)
+        if not self.scheduler.stores:
+            logger.info("No active stores to monitor")
+            await asyncio.sleep(self.config.monitor_delay)
+            return
+
+        runner = asyncio.create_task(self.scheduler.run())
+        try:
+            while self.running and not runner.done():
+                await asyncio.sleep(1)
+                if time.monotonic() - self.last_config_poll >= CONFIG_POLL_INTERVAL:
+                    await self.refresh_config()
+                await seen_products.flush_if_due()
+                await self.outbox.flush_if_due()
                 await self.health_check()
-
-            except Exception as e:
-                logger.error(f"Error in monitor loop: {e}", exc_info=True)
-                await asyncio.sleep(5)
+        finally:
+            await self.scheduler.stop()
+            await asyncio.gather(runner, return_exceptions=True)
+            await self.outbox.close()
+            seen_products.flush()
+
+    async def refresh_config(self):
+        """Apply store, keyword and config changes made through the bot or dashboard while running"""
+        self.last_config_poll = time.monotonic()
+        try:
+            if self.user_id not in await config_watcher.poll(self.repository):
+                return
+
+            user = await self.repository.get_user(self.user_id)
+            if not user or not user.enabled:
+                logger.warning(f"User {self.user_id} disabled, stopping")
+                self.running = False
+                return
+
+            self.config = await self.repository.get_monitor_config(self.user_id) or self.config
+            self.monitor.rate_limiter.set_rate(self.config.rate_limit)
+            self.scheduler.set_concurrency(self.config.batch_size or 20)
+            store_urls = await self.repository.get_store_urls(self.user_id)
+            self.keywords = await self.repository.get_keywords(self.user_id)
+            self.scheduler.set_stores(store_urls)
+            logger.info(f"Configuration changed, now monitoring {len(store_urls)} stores with {len(self.keywords)} keywords")
+        except Exception as e:
+            logger.error(f"Failed to apply configuration changes: {e}", exc_info=True)
 
     async def health_check(self):
         """Perform periodic health checks"""
@@ -180,121 +206,169 @@ class MonitorManager:
 
             # Log monitoring statistics
             logger.info(f"Stores status: {json.dumps(self.stores_status, indent=2)}")
+            logger.info(f"Catalog cache: {json.dumps(self.monitor.response_cache.stats())}")
+            logger.info(f"Store reachability: {json.dumps(self.monitor.store_health.stats())}")
+            logger.info(f"Circuit breakers: {json.dumps(self.monitor.circuit_breaker.stats())}")
+            logger.info(f"Scheduler: {json.dumps(self.scheduler.stats())}")
+            logger.info(f"Store activity: {json.dumps(self.monitor.store_activity.stats())}")
+            logger.info(f"Seen products: {json.dumps(seen_products.stats())}")
+            logger.info(f"Notification outbox: {json.dumps(self.outbox.stats())}")
+            logger.info(f"Discord rate limiter: {json.dumps(rate_limiter.stats())}")
+            logger.info(f"Webhook messages: {json.dumps(self.webhook.stats())}")
 
             # Check database connection
-            try:
-                with app.app_context():
-                    db.session.execute(text('SELECT 1'))
-                    logger.info("Database connection healthy")
-            except Exception as e:
-                logger.error(f"Database health check failed: {e}")
+            if await self.repository.ping():
+                logger.info("Database connection healthy")
 
             self.last_health_check = current_time
 
+async def run_engine():
+    """Multi-tenant mode: one process fetches each unique store once for all users"""
+    if not os.environ.get('DATABASE_URL'):
+        logger.error("Missing required environment variables: DATABASE_URL")
+        return 1
+
+    seen_products.load()
+    repository = MonitorRepository(os.environ['DATABASE_URL'])
+    try:
+        await repository.connect()
+        logger.info("Database connection test successful")
+    except Exception as e:
+        logger.error(f"Database initialization error: {e}", exc_info=True)
+        await repository.close()
+        return 1
+
+    default_webhook_url = os.environ.get('DISCORD_WEBHOOK_URL')
+    engine = MonitorEngine(
+        seen_products,
+        lambda user_ids: repository.load_subscriptions(user_ids, default_webhook_url),
+        lambda: config_watcher.poll(repository),
+        outbox_journal=outbox_journal
+    )
+    signal.signal(signal.SIGTERM, engine.handle_shutdown)
+    signal.signal(signal.SIGINT, engine.handle_shutdown)
+    try:
+        await engine.run()
+    finally:
+        await repository.close()
+    return 0
+
 async def main():
     # Early validation of required environment variables
     required_vars = ['MONITOR_USER_ID', 'DISCORD_WEBHOOK_URL', 'DATABASE_URL']
     missing_vars = [var for var in required_vars if not os.environ.get(var)]
     if missing_vars:
         logger.error(f"Missing required environment variables: {', '.join(missing_vars)}")
-        return 1
+        return EXIT_CONFIG_ERROR
 
     webhook_url = os.environ.get('DISCORD_WEBHOOK_URL')
     if not webhook_url or not webhook_url.startswith('https://discord.com/api/webhooks/'):
         logger.error("Invalid Discord webhook URL")
-        return 1
+        return EXIT_CONFIG_ERROR
 
     try:
         user_id = int(os.environ.get('MONITOR_USER_ID'))
     except ValueError:
         logger.error(f"Invalid MONITOR_USER_ID: {os.environ.get('MONITOR_USER_ID')}")
-        return 1
+        return EXIT_CONFIG_ERROR
 
-    # Initialize tracking file and monitoring state
-    seen_products.clear()
+    # Warm restart: reload what was already notified
+    seen_products.load()
 
+    repository = MonitorRepository(os.environ['DATABASE_URL'])
     try:
-        with app.app_context():
-            # Initialize database and verify connection
-            try:
-                db.create_all()
-                logger.info("Database initialized successfully")
-                db.session.execute(text('SELECT 1'))
-                logger.info("Database connection test successful")
-            except Exception as e:
-                logger.error(f"Database initialization error: {e}", exc_info=True)
+        # Initialize database and verify connection
+        try:
+            await repository.connect()
+            logger.info("Database initialized successfully")
+            if not await repository.ping():
                 return 1
+            logger.info("Database connection test successful")
+            # Baseline versions; later polls report only what changes while running
+            await config_watcher.poll(repository)
+        except Exception as e:
+            logger.error(f"Database initialization error: {e}", exc_info=True)
+            return 1
 
-            logger.info("Starting main monitoring loop...")
-
-            while True:
-                try:
-                    # Get user configuration
-                    user = db.session.get(User, user_id)
-                    if not user or not user.enabled:
-                        logger.error(f"User {user_id} not found or disabled")
-                        return 1
-
-                    config = MonitorConfig.query.filter_by(user_id=user_id).first()
-                    if not config:
-                        logger.error(f"No configuration found for user {user_id}")
-                        return 1
-
-                    logger.info(f"Loaded configuration for user {user_id}")
-                    logger.info(f"Rate limit: {config.rate_limit} req/s")
-                    logger.info(f"Monitor delay: {config.monitor_delay}s")
-
-                    # Create monitor manager
-                    manager = MonitorManager(user_id, webhook_url, config)
+        await warm_up_webhooks([webhook_url])
+        logger.info("Starting main monitoring loop...")
 
-                    while True:
-                        try:
-                            # Refresh user and get stores/keywords
-                            db.session.remove()
-                            user = db.session.get(User, user_id)
-                            if not user or not user.enabled:
-                                logger.warning(f"User {user_id} disabled, exiting")
-                                return 0
+        while True:
+            try:
+                # Get user configuration
+                user = await repository.get_user(user_id)
+                if not user or not user.enabled:
+                    logger.error(f"User {user_id} not found or disabled")
+                    return EXIT_CONFIG_ERROR
+
+                config = await repository.get_monitor_config(user_id)
+                if not config:
+                    logger.error(f"No configuration found for user {user_id}")
+                    return EXIT_CONFIG_ERROR
+
+                logger.info(f"Loaded configuration for user {user_id}")
+                logger.info(f"Rate limit: {config.rate_limit} req/s")
+                logger.info(f"Monitor delay: {config.monitor_delay}s")
+
+                # Create monitor manager
+                manager = MonitorManager(user_id, webhook_url, config, repository)
+                await manager.outbox.replay({webhook_url: manager.webhook}, manager.monitor.retry_product, user_id)
+
+                while True:
+                    try:
+                        # Refresh user and get stores/keywords
+                        user = await repository.get_user(user_id)
+                        if not user or not user.enabled:
+                            logger.warning(f"User {user_id} disabled, exiting")
+                            return 0
 
-                            stores = Store.query.filter_by(user_id=user_id, enabled=True).all()
-                            keywords = [kw.word for kw in Keyword.query.filter_by(user_id=user_id, enabled=True).all()]
+                        store_urls = await repository.get_store_urls(user_id)
+                        keywords = await repository.get_keywords(user_id)
 
-                            if not stores or not keywords:
-                                logger.info("No stores or keywords configured, waiting...")
-                                await asyncio.sleep(config.monitor_delay)
-                                continue
+                        if not store_urls or not keywords:
+                            logger.info("No stores or keywords configured, waiting...")
+                            await asyncio.sleep(config.monitor_delay)
+                            continue
 
-                            logger.info(f"Monitoring {len(stores)} stores with {len(keywords)} keywords")
+                        logger.info(f"Monitoring {len(store_urls)} stores with {len(keywords)} keywords")
 
-                            # Start concurrent monitoring
-                            await manager.monitor_stores(stores, keywords)
+                        # Start concurrent monitoring
+                        await manager.monitor_stores(store_urls, keywords)
+                        if not manager.running:
+                            return 0
 
-                        except OperationalError as e:
-                            logger.error(f"Database connection error: {e}", exc_info=True)
-                            await asyncio.sleep(5)
-                            break
+                    except OperationalError as e:
+                        logger.error(f"Database connection error: {e}", exc_info=True)
+                        await asyncio.sleep(5)
+                        break
 
-                        except Exception as e:
-                            logger.error(f"Error in monitor loop: {e}", exc_info=True)
-                            traceback.print_exc()
-                            await asyncio.sleep(2)
+                    except Exception as e:
+                        logger.error(f"Error in monitor loop: {e}", exc_info=True)
+                        traceback.print_exc()
+                        await asyncio.sleep(2)
 
-                except Exception as e:
-                    logger.error(f"Fatal error: {e}", exc_info=True)
-                    await asyncio.sleep(5)
+            except Exception as e:
+                logger.error(f"Fatal error: {e}", exc_info=True)
+                await asyncio.sleep(5)
 
     except Exception as e:
         logger.error(f"Unhandled exception: {e}", exc_info=True)
         return 1
+    finally:
+        await close_webhook_session()
+        await repository.close()
 
 if __name__ == "__main__":
     try:
         logger.info("Starting monitor main process")
-        exit_code = asyncio.run(main())
+        exit_code = asyncio.run(run_engine() if '--all-users' in sys.argv else main())
         logger.info(f"Monitor exiting with code {exit_code}")
         sys.exit(exit_code)
     except KeyboardInterrupt:
         logger.info("Monitor stopped by user")
     except Exception as e:
         logger.error(f"Unhandled exception: {e}", exc_info=True)
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        seen_products.close()
+        outbox_journal.close()
\ No newline at end of file
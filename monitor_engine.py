@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from config import MAX_POLL_INTERVAL, SHOPIFY_RATE_LIMIT
+from discord_ratelimit import rate_limiter
+from discord_webhook import RateLimitedDiscordWebhook, close_webhook_session, warm_up_webhooks
+from keyword_matcher import KeywordIndex
+from notification_outbox import NotificationOutbox
+from outbox_journal import OutboxJournal
+from products import Product
+from seen_store import SeenProductStore
+from shopify_monitor import ShopifyMonitor
+from store_scheduler import StoreScheduler
+
+logger = logging.getLogger('MonitorEngine')
+
+# How often the per-user config versions are checked for changes
+CONFIG_POLL_INTERVAL = 2.0
+# Full reload as a safety net, e.g. where version triggers could not be installed
+SUBSCRIPTION_REFRESH = 600.0
+
+
+class UserSubscription:
+    """One enabled user's stores, keywords, webhook and monitor settings"""
+
+    __slots__ = ('user_id', 'webhook_url', 'store_urls', 'keywords', 'config')
+
+    def __init__(self, user_id: int, webhook_url: str, store_urls: List[str], keywords: List[str], config):
+        self.user_id = user_id
+        self.webhook_url = webhook_url
+        self.store_urls = store_urls
+        self.keywords = keywords
+        self.config = config
+
+
+class Subscriber:
+    """A user's interest in one store"""
+
+    __slots__ = ('user_id', 'webhook', 'keywords', 'config')
+
+    def __init__(self, user_id: int, webhook: RateLimitedDiscordWebhook, keywords: List[str], config):
+        self.user_id = user_id
+        self.webhook = webhook
+        self.keywords = keywords
+        self.config = config
+
+
+class MonitorEngine:
+    """Monitors every enabled user's stores from a single process.
+
+    Each unique store URL is fetched and diffed once per interval against
+    the union of its subscribers' keywords; the shared keyword index then
+    maps each changed product to the users it matches and fans it out to
+    their webhooks. Users sharing a store therefore share one download,
+    one decoded catalog and one rate-limit budget.
+    """
+
+    def __init__(self, seen_products: SeenProductStore,
+                 load_subscriptions: Callable[[Optional[Set[int]]], Awaitable[List[UserSubscription]]],
+                 poll_changes: Callable[[], Awaitable[Set[int]]], concurrency: int = 20,
+                 outbox_journal: Optional[OutboxJournal] = None):
+        self.seen_products = seen_products
+        self.outbox = NotificationOutbox(seen_products, outbox_journal)
+        self.load_subscriptions = load_subscriptions  # All users when passed None
+        self.poll_changes = poll_changes
+        self.monitor = ShopifyMonitor(rate_limit=SHOPIFY_RATE_LIMIT)
+        self.scheduler = StoreScheduler(
+            self.poll_store,
+            self.store_interval,
+            concurrency=concurrency,
+            circuit_breaker=self.monitor.circuit_breaker
+        )
+        self.subscribers: Dict[str, List[Subscriber]] = {}
+        self.keyword_index = KeywordIndex()
+        self.user_keywords: Dict[int, List[str]] = {}
+        self.user_stores: Dict[int, Set[str]] = {}
+        self.webhooks: Dict[str, RateLimitedDiscordWebhook] = {}
+        self.running = True
+        self.last_refresh = 0.0
+        self.last_change_poll = 0.0
+        self.last_health_check = time.time()
+
+    def _webhook(self, webhook_url: str) -> Optional[RateLimitedDiscordWebhook]:
+        """Reuse one webhook client per URL so users sharing a channel share its rate limit"""
+        webhook = self.webhooks.get(webhook_url)
+        if webhook is None:
+            try:
+                webhook = self.webhooks[webhook_url] = RateLimitedDiscordWebhook(webhook_url=webhook_url)
+            except ValueError:
+                return None
+        return webhook
+
+    def apply_changes(self, subscriptions: List[UserSubscription], user_ids: Iterable[int]):
+        """Replace the subscriptions of ``user_ids`` in place.
+
+        Users listed but missing from ``subscriptions`` (deleted or disabled)
+        are dropped. Only their stores and keywords are touched, so the
+        scheduler and keyword index see add/remove diffs rather than a rebuild.
+        """
+        by_user = {subscription.user_id: subscription for subscription in subscriptions}
+        for user_id in user_ids:
+            subscription = by_user.get(user_id)
+            webhook = None
+            if subscription is not None and subscription.keywords:
+                webhook = self._webhook(subscription.webhook_url)
+                if webhook is None:
+                    logger.warning(f"User {user_id} has no valid webhook URL, skipping")
+
+            # Drop the user's previous store subscriptions
+            for store_url in self.user_stores.pop(user_id, ()):
+                remaining = [s for s in self.subscribers.get(store_url, ()) if s.user_id != user_id]
+                if remaining:
+                    self.subscribers[store_url] = remaining
+                else:
+                    self.subscribers.pop(store_url, None)
+
+            keywords = subscription.keywords if webhook is not None else []
+            self.keyword_index.update(user_id, self.user_keywords.pop(user_id, ()), keywords)
+            if webhook is None:
+                continue
+
+            self.user_keywords[user_id] = keywords
+            self.user_stores[user_id] = set(subscription.store_urls)
+            for store_url in self.user_stores[user_id]:
+                self.subscribers.setdefault(store_url, []).append(
+                    Subscriber(user_id, webhook, keywords, subscription.config)
+                )
+
+        self.scheduler.set_stores(self.subscribers)
+        logger.info(f"Monitoring {len(self.subscribers)} unique stores for {len(self.user_stores)} users")
+
+    def update_subscriptions(self, subscriptions: List[UserSubscription]):
+        """Replace every subscription, e.g. from a full reload"""
+        user_ids = self.user_keywords.keys() | {subscription.user_id for subscription in subscriptions}
+        self.apply_changes(subscriptions, user_ids)
+
+    async def refresh(self):
+        """Full reload, keeping the current subscriptions if the database is unavailable"""
+        self.last_refresh = time.monotonic()
+        try:
+            self.update_subscriptions(await self.load_subscriptions(None))
+        except Exception as e:
+            logger.error(f"Failed to reload subscriptions: {e}", exc_info=True)
+
+    async def apply_config_changes(self):
+        """Reload only the users whose config version moved"""
+        self.last_change_poll = time.monotonic()
+        try:
+            changed = await self.poll_changes()
+            if changed:
+                logger.info(f"Configuration changed for users {sorted(changed)}")
+                self.apply_changes(await self.load_subscriptions(changed), changed)
+        except Exception as e:
+            logger.error(f"Failed to apply configuration changes: {e}", exc_info=True)
+
+    def store_interval(self, store_url: str, new_products: Optional[int]) -> float:
+        """The most demanding subscriber's cadence, adapted to the store's change rate"""
+        subscribers = self.subscribers.get(store_url)
+        if not subscribers:
+            return MAX_POLL_INTERVAL
+        base_delay = min(subscriber.config.monitor_delay for subscriber in subscribers)
+        min_delay = min(subscriber.config.min_cycle_delay or 0.05 for subscriber in subscribers)
+        multiplier = min(subscriber.config.success_delay_multiplier or 0.25 for subscriber in subscribers)
+        # Activity never polls faster than the configured post-drop cadence
+        fastest = max(min_delay, base_delay * multiplier)
+        delay = self.monitor.store_activity.interval(store_url, base_delay, fastest, MAX_POLL_INTERVAL)
+        if new_products:
+            delay = min(delay, fastest)
+        return delay
+
+    async def poll_store(self, store_url: str) -> int:
+        """Fetch a store once and fan its changed products out to every subscriber"""
+        subscribers = self.subscribers.get(store_url)
+        if not subscribers:
+            return 0
+
+        keywords = sorted({keyword for subscriber in subscribers for keyword in subscriber.keywords})
+        products = await self.monitor.async_fetch_products(
+            store_url,
+            keywords,
+            max_products=max(subscriber.config.max_products or 250 for subscriber in subscribers),
+            page_size=max(subscriber.config.initial_product_limit or 250 for subscriber in subscribers)
+        )
+        if not products:
+            return 0
+
+        # One index lookup per product finds every interested user at once
+        matched: Dict[int, List[Product]] = {}
+        for product in products:
+            for user_id in self.keyword_index.match(product):
+                # A redelivered event only goes to the users whose delivery failed
+                if product.recipients is None or user_id in product.recipients:
+                    matched.setdefault(user_id, []).append(product)
+
+        # Hand off to the outbox; delivery happens without holding up this store's poll
+        queued = 0
+        for subscriber in subscribers:
+            if subscriber.user_id in matched:
+                queued += await self.outbox.submit(subscriber.webhook, store_url, matched[subscriber.user_id],
+                                                   subscriber.user_id, self.monitor.retry_product)
+        return queued
+
+    def handle_shutdown(self, signum, frame):
+        logger.info(f"Received shutdown signal {signum}")
+        self.running = False
+
+    async def health_check(self):
+        current_time = time.time()
+        if current_time - self.last_health_check >= 300:
+            logger.info(f"Scheduler: {json.dumps(self.scheduler.stats())}")
+            logger.info(f"Catalog cache: {json.dumps(self.monitor.response_cache.stats())}")
+            logger.info(f"Circuit breakers: {json.dumps(self.monitor.circuit_breaker.stats())}")
+            logger.info(f"Seen products: {json.dumps(self.seen_products.stats())}")
+            logger.info(f"Notification outbox: {json.dumps(self.outbox.stats())}")
+            logger.info(f"Discord rate limiter: {json.dumps(rate_limiter.stats())}")
+            webhook_stats: Dict[str, int] = {}
+            for webhook in self.webhooks.values():
+                for name, value in webhook.stats().items():
+                    webhook_stats[name] = webhook_stats.get(name, 0) + value
+            logger.info(f"Webhook messages: {json.dumps(webhook_stats)}")
+            self.last_health_check = current_time
+
+    async def run(self):
+        """Poll until a shutdown signal, applying configuration changes as they land"""
+        # Record the current versions first so changes made during the full load are not missed
+        await self.poll_changes()
+        await self.refresh()
+        await warm_up_webhooks(self.webhooks)
+        await self.outbox.replay(self.webhooks, self.monitor.retry_product)
+        runner = asyncio.create_task(self.scheduler.run())
+        try:
+            while self.running and not runner.done():
+                await asyncio.sleep(1)
+                now = time.monotonic()
+                if now - self.last_change_poll >= CONFIG_POLL_INTERVAL:
+                    await self.apply_config_changes()
+                if now - self.last_refresh >= SUBSCRIPTION_REFRESH:
+                    await self.refresh()
+                await self.seen_products.flush_if_due()
+                await self.outbox.flush_if_due()
+                await self.health_check()
+        finally:
+            await self.scheduler.stop()
+            await asyncio.gather(runner, return_exceptions=True)
+            await self.monitor.cleanup()
+            await self.outbox.close()
+            await close_webhook_session()
+            self.seen_products.flush()
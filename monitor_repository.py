@@ -0,0 +1,151 @@
+import logging
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import MetaData, inspect, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from config_watch import install_version_triggers
+from monitor_engine import UserSubscription
+
+logger = logging.getLogger('MonitorRepository')
+
+# Tables the monitor reads; their schema is defined in models.py
+MONITOR_TABLES = ('user', 'store', 'keyword', 'monitor_config', 'config_version')
+
+
+def async_database_url(database_url: str):
+    """Map a sync DATABASE_URL onto its async driver; returns (url, connect_args)"""
+    url = make_url(database_url.replace('postgres://', 'postgresql://', 1))
+    connect_args = {}
+    if url.get_backend_name() == 'postgresql':
+        # asyncpg takes the libpq sslmode as its ssl argument
+        sslmode = url.query.get('sslmode')
+        if sslmode:
+            url = url.difference_update_query(['sslmode'])
+            connect_args['ssl'] = sslmode
+        url = url.set(drivername='postgresql+asyncpg')
+    elif url.get_backend_name() == 'sqlite':
+        url = url.set(drivername='sqlite+aiosqlite')
+    return url, connect_args
+
+
+class MonitorRepository:
+    """Async, Flask-free access to the tables the monitor reads.
+
+    Table definitions are reflected from the database rather than declared a
+    second time, so models.py stays the only schema. Tables missing on a
+    fresh database are created from models.py, the one case that imports
+    Flask-SQLAlchemy.
+    """
+
+    def __init__(self, database_url: str, pool_size: int = 5):
+        url, connect_args = async_database_url(database_url)
+        options = {}
+        if url.get_backend_name() == 'postgresql':
+            options = {'pool_size': pool_size, 'max_overflow': pool_size, 'pool_recycle': 300, 'pool_pre_ping': True}
+        self.engine: AsyncEngine = create_async_engine(url, connect_args=connect_args, **options)
+        self.metadata = MetaData()
+        self.tables = {}
+
+    @staticmethod
+    def _missing_tables(sync_conn) -> Set[str]:
+        return set(MONITOR_TABLES) - set(inspect(sync_conn).get_table_names())
+
+    @staticmethod
+    def _create_from_models(sync_conn):
+        from models import db
+        db.metadata.create_all(sync_conn)
+
+    async def connect(self):
+        """Reflect the monitor's tables and install the config version triggers"""
+        async with self.engine.begin() as conn:
+            missing = await conn.run_sync(self._missing_tables)
+            if missing:
+                logger.info(f"Creating missing tables from models.py: {', '.join(sorted(missing))}")
+                await conn.run_sync(self._create_from_models)
+            await conn.run_sync(lambda sync_conn: self.metadata.reflect(sync_conn, only=MONITOR_TABLES))
+        self.tables = self.metadata.tables
+        await install_version_triggers(self.engine)
+
+    async def close(self):
+        await self.engine.dispose()
+
+    async def ping(self) -> bool:
+        try:
+            async with self.engine.connect() as conn:
+                await conn.execute(text('SELECT 1'))
+            return True
+        except Exception as e:
+            logger.error(f"Database health check failed: {e}")
+            return False
+
+    async def _fetch(self, statement):
+        async with self.engine.connect() as conn:
+            return (await conn.execute(statement)).all()
+
+    async def get_user(self, user_id: int):
+        user = self.tables['user']
+        rows = await self._fetch(select(user).where(user.c.id == user_id))
+        return rows[0] if rows else None
+
+    async def get_monitor_config(self, user_id: int):
+        monitor_config = self.tables['monitor_config']
+        rows = await self._fetch(select(monitor_config).where(monitor_config.c.user_id == user_id).limit(1))
+        return rows[0] if rows else None
+
+    async def get_store_urls(self, user_id: int) -> List[str]:
+        store = self.tables['store']
+        rows = await self._fetch(select(store.c.url).where(store.c.user_id == user_id, store.c.enabled.is_(True)))
+        return [row.url for row in rows]
+
+    async def get_keywords(self, user_id: int) -> List[str]:
+        keyword = self.tables['keyword']
+        rows = await self._fetch(select(keyword.c.word).where(keyword.c.user_id == user_id, keyword.c.enabled.is_(True)))
+        return [row.word for row in rows]
+
+    async def config_versions(self) -> Dict[int, int]:
+        config_version = self.tables['config_version']
+        rows = await self._fetch(select(config_version.c.user_id, config_version.c.version))
+        return {row.user_id: row.version for row in rows}
+
+    async def load_subscriptions(self, user_ids: Optional[Set[int]] = None,
+                                 default_webhook_url: Optional[str] = None) -> List[UserSubscription]:
+        """Enabled users' stores, keywords and config; all users when ``user_ids`` is None"""
+        user, store, keyword, monitor_config = (
+            self.tables[name] for name in ('user', 'store', 'keyword', 'monitor_config')
+        )
+        user_query = select(user.c.id, user.c.discord_webhook_url).where(user.c.enabled.is_(True))
+        if user_ids is not None:
+            user_query = user_query.where(user.c.id.in_(user_ids))
+
+        async with self.engine.connect() as conn:
+            users = {row.id: row for row in (await conn.execute(user_query)).all()}
+            if not users:
+                return []
+            configs = {
+                row.user_id: row
+                for row in (await conn.execute(select(monitor_config).where(monitor_config.c.user_id.in_(users)))).all()
+            }
+            store_urls: Dict[int, List[str]] = {}
+            for row in (await conn.execute(select(store.c.user_id, store.c.url).where(
+                    store.c.user_id.in_(users), store.c.enabled.is_(True)))).all():
+                store_urls.setdefault(row.user_id, []).append(row.url)
+            keywords: Dict[int, List[str]] = {}
+            for row in (await conn.execute(select(keyword.c.user_id, keyword.c.word).where(
+                    keyword.c.user_id.in_(users), keyword.c.enabled.is_(True)))).all():
+                keywords.setdefault(row.user_id, []).append(row.word)
+
+        subscriptions = []
+        for user_id, row in users.items():
+            if user_id not in configs:
+                logger.warning(f"No configuration found for user {user_id}, skipping")
+                continue
+            subscriptions.append(UserSubscription(
+                user_id,
+                row.discord_webhook_url or default_webhook_url,
+                store_urls.get(user_id, []),
+                keywords.get(user_id, []),
+                configs[user_id]
+            ))
+        return subscriptions
@@ -0,0 +1,506 @@
+"""
+Supervisor daemon that owns every per-user monitor process.
+
+Workers are ``main.py`` children keyed by user id, so start/stop/status are
+dictionary lookups instead of scans over every process on the machine. A
+worker that crashes is restarted with exponential backoff; one that exits
+cleanly (user disabled, shut down on request) or with EXIT_CONFIG_ERROR
+(user missing or without a config) is left stopped. Each worker
+writes straight into its own log file, the supervisor never reads its output.
+
+Workers run in their own session so a supervisor restart doesn't signal
+them. Each is tagged with the supervisor's socket path; a supervisor
+starting on that socket stops whatever monitors its predecessor left
+behind and starts them again under its own control.
+
+Control is line-delimited JSON over a local Unix socket (mode 0600):
+
+    {"command": "start", "user_id": 12, "env": {"DISCORD_WEBHOOK_URL": "..."}}
+    {"command": "stop" | "restart" | "status", "user_id": 12}
+    {"command": "status"}
+
+Usage:
+    python monitor_supervisor.py                 run the daemon
+    python monitor_supervisor.py status [user_id]
+    python monitor_supervisor.py stop <user_id>
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import psutil
+
+from config import EXIT_CONFIG_ERROR, SUPERVISOR_MAX_BACKOFF, SUPERVISOR_SOCKET, SUPERVISOR_STABLE_AFTER
+
+logger = logging.getLogger('MonitorSupervisor')
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+MAIN_SCRIPT = os.path.join(PROJECT_ROOT, 'main.py')
+
+# Worker states
+RUNNING = 'running'
+BACKOFF = 'backoff'
+STOPPED = 'stopped'
+EXITED = 'exited'
+MISCONFIGURED = 'misconfigured'
+
+INITIAL_BACKOFF = 1.0
+
+# Set on every worker to the socket of the supervisor that owns it
+SUPERVISOR_ENV = 'MONITOR_SUPERVISOR'
+
+
+def missing_environment(env: Dict[str, str]) -> Optional[str]:
+    """Why a monitor could not run with this environment, or None"""
+    missing = [var for var in ('DISCORD_WEBHOOK_URL', 'DATABASE_URL') if not env.get(var)]
+    if missing:
+        return f"Missing required environment variables: {', '.join(missing)}"
+    if not env['DISCORD_WEBHOOK_URL'].startswith('https://discord.com/api/webhooks/'):
+        return "Invalid Discord webhook URL format"
+    return None
+
+
+def find_orphans(path: str) -> List[psutil.Process]:
+    """Monitor processes started by a supervisor on ``path`` that is no longer running"""
+    orphans = []
+    for process in psutil.process_iter(['cmdline']):
+        try:
+            if MAIN_SCRIPT in (process.info['cmdline'] or ()) and process.environ().get(SUPERVISOR_ENV) == path:
+                orphans.append(process)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return orphans
+
+
+class Worker:
+    """One user's monitor process and its restart bookkeeping"""
+
+    __slots__ = ('user_id', 'overrides', 'env', 'log_file', 'process', 'task', 'state', 'started_at',
+                 'restarts', 'backoff', 'last_exit', 'stop_requested')
+
+    def __init__(self, user_id: int, overrides: Dict[str, str], env: Dict[str, str], log_file: str):
+        self.user_id = user_id
+        self.overrides = overrides
+        self.env = env
+        self.log_file = log_file
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.task: Optional[asyncio.Task] = None
+        self.state = STOPPED
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = INITIAL_BACKOFF
+        self.last_exit: Optional[int] = None
+        self.stop_requested = asyncio.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.state in (RUNNING, BACKOFF) and not self.stop_requested.is_set()
+
+    def status(self) -> Dict:
+        return {
+            'user_id': self.user_id,
+            'state': self.state,
+            'pid': self.process.pid if self.process is not None else None,
+            'uptime': round(time.monotonic() - self.started_at, 1) if self.state == RUNNING else None,
+            'restarts': self.restarts,
+            'last_exit': self.last_exit,
+            'log_file': self.log_file,
+        }
+
+
+class MonitorSupervisor:
+    def __init__(self, max_backoff: float = SUPERVISOR_MAX_BACKOFF, stable_after: float = SUPERVISOR_STABLE_AFTER):
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.workers: Dict[int, Worker] = {}
+        self.locks: Dict[int, asyncio.Lock] = {}  # Serialises start/stop/restart per user
+        self.socket_path = SUPERVISOR_SOCKET
+
+    async def _spawn(self, worker: Worker):
+        # The child gets the log file itself; our copy of the descriptor closes right after the fork
+        with open(worker.log_file, 'ab') as log:
+            worker.process = await asyncio.create_subprocess_exec(
+                sys.executable, MAIN_SCRIPT,
+                stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                env=worker.env, cwd=PROJECT_ROOT, start_new_session=True
+            )
+        worker.state = RUNNING
+        worker.started_at = time.monotonic()
+        logger.info(f"Started monitor for user {worker.user_id}: PID {worker.process.pid}, log {worker.log_file}")
+
+    async def _wait_for_stop(self, worker: Worker, delay: float) -> bool:
+        try:
+            await asyncio.wait_for(worker.stop_requested.wait(), delay)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _supervise(self, worker: Worker):
+        """Restart the worker with backoff until it exits cleanly, can't run, or is stopped"""
+        while True:
+            if worker.process is not None:
+                code = await worker.process.wait()
+                worker.process = None
+                worker.last_exit = code
+                if worker.stop_requested.is_set():
+                    break
+                if code == 0:
+                    worker.state = EXITED
+                    logger.info(f"Monitor for user {worker.user_id} exited cleanly")
+                    return
+                if code == EXIT_CONFIG_ERROR:
+                    # Restarting can't fix the configuration; start it again once that's done
+                    worker.state = MISCONFIGURED
+                    logger.error(f"Monitor for user {worker.user_id} cannot run with its configuration, "
+                                 f"not restarting (see {worker.log_file})")
+                    return
+                if time.monotonic() - worker.started_at >= self.stable_after:
+                    worker.backoff = INITIAL_BACKOFF
+                logger.warning(f"Monitor for user {worker.user_id} exited with code {code}, "
+                               f"restarting in {worker.backoff:.0f}s")
+
+            worker.state = BACKOFF
+            if await self._wait_for_stop(worker, worker.backoff):
+                break
+            worker.backoff = min(worker.backoff * 2, self.max_backoff)
+            worker.restarts += 1
+            try:
+                await self._spawn(worker)
+            except OSError as e:
+                logger.error(f"Could not restart monitor for user {worker.user_id}: {e}")
+        worker.state = STOPPED
+
+    def _lock(self, user_id: int) -> asyncio.Lock:
+        lock = self.locks.get(user_id)
+        if lock is None:
+            lock = self.locks[user_id] = asyncio.Lock()
+        return lock
+
+    async def start(self, user_id: int, overrides: Dict[str, str]) -> Dict:
+        async with self._lock(user_id):
+            return await self._start(user_id, overrides)
+
+    async def stop(self, user_id: int, timeout: float = 10.0) -> Dict:
+        async with self._lock(user_id):
+            return await self._stop(user_id, timeout)
+
+    async def restart(self, user_id: int, overrides: Optional[Dict[str, str]] = None) -> Dict:
+        """Stop and start again, keeping the previous environment unless a new one is given"""
+        async with self._lock(user_id):
+            worker = self.workers.get(user_id)
+            if overrides is None:
+                overrides = worker.overrides if worker is not None else {}
+            await self._stop(user_id)
+            return await self._start(user_id, overrides)
+
+    async def _start(self, user_id: int, overrides: Dict[str, str]) -> Dict:
+        worker = self.workers.get(user_id)
+        if worker is not None and worker.active:
+            return {'ok': True, 'already_running': True, 'worker': worker.status()}
+
+        env = os.environ.copy()
+        env.update(overrides)
+        env.update({
+            'MONITOR_USER_ID': str(user_id),
+            SUPERVISOR_ENV: self.socket_path,
+            'PYTHONUNBUFFERED': '1',
+            'PYTHONPATH': os.pathsep.join(filter(None, [PROJECT_ROOT, env.get('PYTHONPATH')])),
+        })
+        error = missing_environment(env)
+        if error:
+            return {'ok': False, 'error': error}
+
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        worker = Worker(user_id, overrides, env, os.path.join(PROJECT_ROOT, f"monitor_log_{user_id}_{timestamp}.txt"))
+        try:
+            await self._spawn(worker)
+        except OSError as e:
+            logger.error(f"Could not start monitor for user {user_id}: {e}")
+            return {'ok': False, 'error': f"Could not start monitor: {e}"}
+        self.workers[user_id] = worker
+        worker.task = asyncio.create_task(self._supervise(worker))
+        return {'ok': True, 'already_running': False, 'worker': worker.status()}
+
+    async def _stop(self, user_id: int, timeout: float = 10.0) -> Dict:
+        worker = self.workers.get(user_id)
+        if worker is None or not worker.active:
+            return {'ok': True, 'was_running': False, 'worker': self._status(user_id)}
+
+        worker.stop_requested.set()
+        process = worker.process
+        if process is not None and process.returncode is None:
+            try:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Monitor for user {user_id} did not terminate, killing it")
+                    process.kill()
+            except ProcessLookupError:
+                pass
+        await worker.task
+        logger.info(f"Stopped monitor for user {user_id}")
+        return {'ok': True, 'was_running': True, 'worker': worker.status()}
+
+    def _status(self, user_id: int) -> Dict:
+        worker = self.workers.get(user_id)
+        if worker is None:
+            return {'user_id': user_id, 'state': STOPPED}
+        return worker.status()
+
+    def status(self, user_id: Optional[int] = None) -> Dict:
+        if user_id is None:
+            return {'ok': True, 'workers': [worker.status() for worker in self.workers.values()]}
+        return {'ok': True, 'worker': self._status(user_id)}
+
+    def _stop_orphans(self, timeout: float = 10.0) -> Dict[int, Dict[str, str]]:
+        """Stop monitors a previous supervisor on our socket left running; returns their environments"""
+        orphans = find_orphans(self.socket_path)
+        environments = {}
+        for process in orphans:
+            try:
+                env = process.environ()
+                logger.warning(f"Stopping monitor for user {env.get('MONITOR_USER_ID')} left running by a "
+                               f"previous supervisor: PID {process.pid}")
+                process.terminate()
+                environments[int(env['MONITOR_USER_ID'])] = env
+            except (psutil.NoSuchProcess, psutil.AccessDenied, KeyError, ValueError):
+                continue
+        _, alive = psutil.wait_procs(orphans, timeout)
+        for process in alive:
+            logger.warning(f"Orphaned monitor PID {process.pid} did not terminate, killing it")
+            try:
+                process.kill()
+            except psutil.NoSuchProcess:
+                pass
+        return environments
+
+    async def adopt_orphans(self):
+        """Replace monitors left running by a previous supervisor with supervised ones"""
+        environments = await asyncio.to_thread(self._stop_orphans)
+        for user_id, env in environments.items():
+            overrides = {key: value for key, value in env.items() if os.environ.get(key) != value}
+            result = await self.start(user_id, overrides)
+            if not result['ok']:
+                logger.error(f"Could not restart monitor for user {user_id}: {result['error']}")
+
+    async def stop_all(self):
+        await asyncio.gather(*(self.stop(user_id) for user_id in list(self.workers)))
+
+    async def dispatch(self, request: Dict) -> Dict:
+        command = request.get('command')
+        user_id = request.get('user_id')
+        if command == 'status':
+            return self.status(None if user_id is None else int(user_id))
+        if user_id is None:
+            return {'ok': False, 'error': f"{command!r} needs a user_id"}
+        if command == 'start':
+            return await self.start(int(user_id), request.get('env') or {})
+        if command == 'stop':
+            return await self.stop(int(user_id))
+        if command == 'restart':
+            return await self.restart(int(user_id), request.get('env'))
+        return {'ok': False, 'error': f"Unknown command: {command!r}"}
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.dispatch(json.loads(line))
+                except (ValueError, TypeError, AttributeError) as e:
+                    response = {'ok': False, 'error': f"Bad request: {e}"}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, path: str = SUPERVISOR_SOCKET):
+        if os.path.exists(path):
+            if SupervisorClient(path).reachable():
+                raise SupervisorError(f"Another supervisor is already listening on {path}")
+            os.unlink(path)
+        self.socket_path = path
+        await self.adopt_orphans()
+
+        # Only the owning user may connect
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.handle_client, path)
+        finally:
+            os.umask(umask)
+
+        shutdown = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, shutdown.set)
+
+        logger.info(f"Supervisor listening on {path} (PID {os.getpid()})")
+        try:
+            async with server:
+                await shutdown.wait()
+        finally:
+            logger.info("Supervisor shutting down, stopping all monitors")
+            await self.stop_all()
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+class SupervisorError(Exception):
+    """The supervisor is unreachable or refused a request"""
+
+
+class SupervisorClient:
+    """Talks to the supervisor; async methods for the bot, ``*_sync`` ones for Flask and scripts"""
+
+    def __init__(self, path: str = SUPERVISOR_SOCKET, timeout: float = 15.0):
+        self.path = path
+        self.timeout = timeout
+
+    @staticmethod
+    def _encode(command: str, fields: Dict) -> bytes:
+        return json.dumps({'command': command, **fields}).encode() + b'\n'
+
+    @staticmethod
+    def _decode(line: bytes) -> Dict:
+        if not line:
+            raise SupervisorError("Supervisor closed the connection")
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise SupervisorError(response.get('error') or "Request failed")
+        return response
+
+    async def request(self, command: str, **fields) -> Dict:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.path), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise SupervisorError(f"Supervisor not reachable at {self.path}: {e}") from e
+        try:
+            writer.write(self._encode(command, fields))
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise SupervisorError(f"Supervisor request {command!r} failed: {e}") from e
+        finally:
+            writer.close()
+        return self._decode(line)
+
+    def request_sync(self, command: str, **fields) -> Dict:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.path)
+                sock.sendall(self._encode(command, fields))
+                with sock.makefile('rb') as stream:
+                    line = stream.readline()
+        except OSError as e:
+            raise SupervisorError(f"Supervisor request {command!r} failed: {e}") from e
+        return self._decode(line)
+
+    def reachable(self) -> bool:
+        try:
+            self.request_sync('status')
+            return True
+        except SupervisorError:
+            return False
+
+    def spawn_daemon(self):
+        """Launch a detached supervisor that inherits this process's environment"""
+        logger.info(f"Launching monitor supervisor on {self.path}")
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            env={**os.environ, 'SUPERVISOR_SOCKET': self.path}, cwd=PROJECT_ROOT, start_new_session=True
+        )
+
+    async def ensure_running(self, wait: float = 5.0):
+        try:
+            await self.request('status')
+            return
+        except SupervisorError:
+            self.spawn_daemon()
+        deadline = time.monotonic() + wait
+        while True:
+            await asyncio.sleep(0.1)
+            try:
+                await self.request('status')
+                return
+            except SupervisorError:
+                if time.monotonic() >= deadline:
+                    raise
+
+    def ensure_running_sync(self, wait: float = 5.0):
+        if self.reachable():
+            return
+        self.spawn_daemon()
+        deadline = time.monotonic() + wait
+        while not self.reachable():
+            if time.monotonic() >= deadline:
+                raise SupervisorError(f"Supervisor did not come up on {self.path}")
+            time.sleep(0.1)
+
+    async def status(self, user_id: int) -> Dict:
+        """The user's worker status; reads as stopped when no supervisor is running"""
+        try:
+            return (await self.request('status', user_id=user_id))['worker']
+        except SupervisorError:
+            return {'user_id': user_id, 'state': STOPPED}
+
+    async def is_running(self, user_id: int) -> bool:
+        return (await self.status(user_id))['state'] == RUNNING
+
+    async def start(self, user_id: int, env: Dict[str, str]) -> Dict:
+        await self.ensure_running()
+        return await self.request('start', user_id=user_id, env=env)
+
+    async def stop(self, user_id: int) -> Dict:
+        return await self.request('stop', user_id=user_id)
+
+    async def restart(self, user_id: int, env: Optional[Dict[str, str]] = None) -> Dict:
+        await self.ensure_running()
+        return await self.request('restart', user_id=user_id, env=env)
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) > 1:
+        command = argv[1]
+        fields = {'user_id': int(argv[2])} if len(argv) > 2 else {}
+        try:
+            print(json.dumps(SupervisorClient().request_sync(command, **fields), indent=2))
+            return 0
+        except SupervisorError as e:
+            print(f"Error: {e}")
+            return 1
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(PROJECT_ROOT, 'monitor_supervisor.log')),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    try:
+        asyncio.run(MonitorSupervisor().serve())
+    except SupervisorError as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Set
+
+from catalog_diff import NEW
+from config import DISCORD_MAX_EMBEDS
+from discord_webhook import RateLimitedDiscordWebhook
+from outbox_journal import OutboxJournal
+from products import Product
+from seen_store import SeenProductStore
+
+logger = logging.getLogger('NotificationOutbox')
+
+
+def event_key(store_url: str, product: Product, user_id: int) -> str:
+    """Idempotency key of one product event for one user"""
+    return f"{user_id}:{store_url}:{product.id}:{product.event}:{product.price}:{product.stock}"
+
+
+class Notification:
+    """One product event waiting to be delivered to one user's webhook"""
+
+    __slots__ = ('key', 'seen_key', 'store_url', 'product', 'user_id', 'on_failure')
+
+    def __init__(self, key: str, seen_key: str, store_url: str, product: Product, user_id: int,
+                 on_failure: Callable[[str, int, str, int], None]):
+        self.key = key
+        self.seen_key = seen_key
+        self.store_url = store_url
+        self.product = product
+        self.user_id = user_id
+        self.on_failure = on_failure  # retry_product of the monitor that produced the event
+
+    def fail(self):
+        """Hand the event back so the monitor reports it to this user again"""
+        self.on_failure(self.store_url, self.product.id, self.product.event, self.user_id)
+
+    @property
+    def coalesce_key(self) -> Hashable:
+        return (self.store_url, self.product.id, self.user_id)
+
+
+class WebhookQueue:
+    """Bounded queue and delivery worker for one webhook"""
+
+    def __init__(self, webhook: RateLimitedDiscordWebhook):
+        self.webhook = webhook
+        self.items: Deque[Notification] = deque()
+        self.index: Dict[Hashable, Notification] = {}
+        self.ready = asyncio.Event()
+        self.in_flight = 0
+        self.worker: Optional[asyncio.Task] = None
+
+
+class NotificationOutbox:
+    """Hands product events from polling to per-webhook delivery workers.
+
+    ``submit`` never waits on Discord: it queues and returns, so a store's
+    poll finishes as soon as its catalog is diffed. Each webhook has one
+    worker that drains its queue in batches (which the webhook packs into
+    multi-embed messages) and reports back: delivered events are marked in
+    the seen-products store, failed ones are handed to ``on_failure`` so the
+    monitor reports them again next poll.
+
+    Backpressure: a newer event for a product still in the queue replaces
+    the queued one in place; when a queue holds ``max_pending`` events the
+    oldest is dropped and treated as a failed delivery.
+
+    With a ``journal``, every queued event is also recorded durably until it
+    is delivered or superseded by a newer event for the same product, and
+    ``replay`` re-queues what a killed process left undelivered. Failed and
+    dropped events stay journaled while the monitor retries them.
+    """
+
+    def __init__(self, seen_products: SeenProductStore, journal: Optional[OutboxJournal] = None,
+                 max_pending: int = 500):
+        self.seen_products = seen_products
+        self.journal = journal
+        self.max_pending = max_pending
+        self.queues: Dict[str, WebhookQueue] = {}
+        self.queued_new: Set[str] = set()  # Title keys of NEW events not yet delivered
+        self.failed_keys: Dict[Hashable, str] = {}  # Journal keys of failed events, by coalesce key
+        self.delivered = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.replayed = 0
+
+    def _queue(self, webhook: RateLimitedDiscordWebhook) -> WebhookQueue:
+        queue = self.queues.get(webhook.webhook_url)
+        if queue is None:
+            queue = self.queues[webhook.webhook_url] = WebhookQueue(webhook)
+        if queue.worker is None or queue.worker.done():
+            queue.worker = asyncio.create_task(self._deliver(queue))
+        return queue
+
+    async def submit(self, webhook: RateLimitedDiscordWebhook, store_url: str, products: List[Product],
+                     user_id: int, on_failure: Callable[[str, int, str, int], None]) -> int:
+        """Queue one user's changed products for delivery; returns how many were queued"""
+        queue = self._queue(webhook)
+        queued = 0
+        for product in products:
+            notification = Notification(
+                event_key(store_url, product, user_id), f"{store_url}-{product.title}-{user_id}",
+                store_url, product, user_id, on_failure
+            )
+            queued += await self._enqueue(queue, notification)
+
+        if queue.items:
+            queue.ready.set()
+        return queued
+
+    async def _enqueue(self, queue: WebhookQueue, notification: Notification) -> bool:
+        # Restocks and price changes bypass title dedupe
+        if notification.product.event == NEW:
+            if notification.seen_key in self.queued_new:
+                return False
+            # Claimed before the lookup so a concurrent submit can't queue the same title
+            self.queued_new.add(notification.seen_key)
+            if await self.seen_products.seen(notification.seen_key):
+                self.queued_new.discard(notification.seen_key)
+                return False
+
+        queued_notification = queue.index.get(notification.coalesce_key)
+        if queued_notification is not None:
+            # Still waiting: deliver the newer event instead of both
+            self._release(queued_notification)
+            queued_notification.key = notification.key
+            queued_notification.seen_key = notification.seen_key
+            queued_notification.product = notification.product
+            notification = queued_notification
+            self.coalesced += 1
+        else:
+            self._supersede_failed(notification)
+            if len(queue.items) >= self.max_pending:
+                self._drop_oldest(queue)
+            queue.items.append(notification)
+            queue.index[notification.coalesce_key] = notification
+
+        if self.journal is not None:
+            self.journal.append(notification.key, (
+                queue.webhook.webhook_url, notification.store_url, notification.user_id,
+                notification.seen_key, notification.product, time.time()
+            ))
+        return True
+
+    async def replay(self, webhooks: Dict[str, RateLimitedDiscordWebhook], on_failure: Callable[[str, int, str, int], None],
+               user_id: Optional[int] = None) -> int:
+        """Re-queue journaled notifications for these webhooks that a previous run never delivered"""
+        if self.journal is None:
+            return 0
+        replayed = 0
+        for key, (webhook_url, store_url, entry_user_id, seen_key, product, _) in self.journal.load(webhooks, user_id):
+            queue = self._queue(webhooks[webhook_url])
+            if await self._enqueue(queue, Notification(key, seen_key, store_url, product, entry_user_id, on_failure)):
+                replayed += 1
+                queue.ready.set()
+            else:
+                # Already delivered before the crash
+                self.journal.ack(key)
+        if replayed:
+            logger.info(f"Replaying {replayed} undelivered notifications from the outbox journal")
+        self.replayed += replayed
+        return replayed
+
+    def _release(self, notification: Notification, ack: bool = True):
+        """The notification left the queue: delivered, superseded, dropped or handed back.
+
+        Unless ``ack``, its journal entry is kept until a retry of the event is
+        delivered or a newer event for the product replaces it.
+        """
+        if notification.product.event == NEW:
+            self.queued_new.discard(notification.seen_key)
+        if self.journal is None:
+            return
+        if ack:
+            self.journal.ack(notification.key)
+        else:
+            self.failed_keys[notification.coalesce_key] = notification.key
+
+    def _supersede_failed(self, notification: Notification):
+        """Ack the journal entry of an earlier failed event this one replaces"""
+        failed_key = self.failed_keys.pop(notification.coalesce_key, None)
+        if failed_key is not None and failed_key != notification.key:
+            self.journal.ack(failed_key)
+
+    def _fail(self, notification: Notification):
+        self._release(notification, ack=False)
+        notification.fail()
+
+    def _drop_oldest(self, queue: WebhookQueue):
+        notification = queue.items.popleft()
+        del queue.index[notification.coalesce_key]
+        self.dropped += 1
+        logger.warning(f"Outbox full for webhook, dropping oldest: {notification.product.title}")
+        self._fail(notification)
+
+    async def _deliver(self, queue: WebhookQueue):
+        """Worker: drain the queue a message's worth at a time until it stays empty"""
+        while True:
+            await queue.ready.wait()
+            queue.ready.clear()
+            while queue.items:
+                batch = []
+                while queue.items and len(batch) < DISCORD_MAX_EMBEDS:
+                    notification = queue.items.popleft()
+                    del queue.index[notification.coalesce_key]
+                    batch.append(notification)
+
+                queue.in_flight = len(batch)
+                try:
+                    results = await asyncio.gather(
+                        *(queue.webhook.send_product_notification(n.product) for n in batch),
+                        return_exceptions=True
+                    )
+                finally:
+                    queue.in_flight = 0
+                for notification, result in zip(batch, results):
+                    product = notification.product
+                    if result is True:
+                        self._release(notification)
+                        self.seen_products.add(notification.seen_key)
+                        self.delivered += 1
+                        logger.info(f"Product {product.event} notified to user {notification.user_id}: {product.title}")
+                    else:
+                        self.failed += 1
+                        logger.error(f"Failed to send webhook for {product.title}"
+                                     + (f": {result}" if isinstance(result, Exception) else ""))
+                        self._fail(notification)
+
+    async def flush_if_due(self):
+        """Persist journal appends and acks off the event loop when due"""
+        if self.journal is not None:
+            await self.journal.flush_if_due()
+
+    def pending(self) -> int:
+        """Notifications queued or being sent"""
+        return sum(len(queue.items) + queue.in_flight for queue in self.queues.values())
+
+    async def close(self, timeout: float = 10.0):
+        """Give queued notifications up to ``timeout`` seconds to go out, then stop the workers"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.pending() and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        workers = [queue.worker for queue in self.queues.values() if queue.worker]
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if self.journal is not None:
+            # Whatever did not go out stays journaled for the next run
+            try:
+                self.journal.flush()
+            except Exception as e:
+                logger.error(f"Failed to persist notification outbox: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            'pending': self.pending(),
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'replayed': self.replayed,
+            **(self.journal.stats() if self.journal is not None else {}),
+        }
@@ -0,0 +1,127 @@
+import json
+import logging
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from products import Product, Variant
+from sqlite_writeback import SQLiteWriteBack
+
+logger = logging.getLogger('OutboxJournal')
+
+# (webhook_url, store_url, user_id, seen_key, product, queued_at)
+JournalEntry = Tuple[str, str, int, str, Product, float]
+# (appends by key, acked keys)
+JournalBatch = Tuple[Dict[str, JournalEntry], Set[str]]
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS outbox (key TEXT PRIMARY KEY, webhook_url TEXT NOT NULL, "
+    "store_url TEXT NOT NULL, user_id INTEGER NOT NULL, seen_key TEXT NOT NULL, "
+    "product TEXT NOT NULL, queued_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS outbox_webhook_url ON outbox (webhook_url, queued_at)",
+)
+
+
+def encode_product(product: Product) -> str:
+    """Products are journaled as plain JSON field tuples, readable without unpickling"""
+    return json.dumps((
+        product.id, product.title, product.handle, product.store_url, product.price, product.image_url,
+        product.vendor, product.product_type, product.tags,
+        [(variant.id, variant.size, variant.available, variant.inventory) for variant in product.variants],
+        product.event
+    ))
+
+
+def decode_product(data: str) -> Product:
+    (product_id, title, handle, store_url, price, image_url, vendor, product_type,
+     tags, variants, event) = json.loads(data)
+    return Product(
+        product_id, title, handle, store_url, price, image_url, vendor, product_type, tuple(tags),
+        tuple(Variant(*variant) for variant in variants), event
+    )
+
+
+class OutboxJournal(SQLiteWriteBack):
+    """Write-ahead journal of undelivered notifications in SQLite (WAL).
+
+    Each notification is recorded under its idempotency key when queued and
+    removed once it is delivered or superseded; one that failed or was
+    dropped stays while the monitor retries it, so whatever is left on disk after a crash or kill is exactly what still
+    needs sending. Appends and acks only touch in-memory buffers; they reach
+    disk in one transaction per flush, which bounds what a crash can lose
+    to the last ``flush_interval`` seconds. Replay is at-least-once: a
+    notification delivered just before a crash may be sent again.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, flush_batch: int = 200):
+        super().__init__(path, SCHEMA, logger, 'notification outbox', flush_interval, flush_batch)
+        self.writes: Dict[str, JournalEntry] = {}
+        self.deletes: Set[str] = set()
+
+    def append(self, key: str, entry: JournalEntry):
+        """Record a queued notification; a later append under the same key replaces it"""
+        self.deletes.discard(key)
+        self.writes[key] = entry
+
+    def ack(self, key: str):
+        """Record that a notification no longer needs delivering"""
+        # An earlier version of the entry may already be on disk, so always delete
+        self.writes.pop(key, None)
+        self.deletes.add(key)
+
+    def _pending(self) -> int:
+        return len(self.writes) + len(self.deletes)
+
+    def _take(self) -> JournalBatch:
+        writes, deletes = self.writes, self.deletes
+        self.writes, self.deletes = {}, set()
+        return writes, deletes
+
+    def _write(self, conn: sqlite3.Connection, batch: JournalBatch):
+        writes, deletes = batch
+        if writes:
+            conn.executemany(
+                "INSERT OR REPLACE INTO outbox (key, webhook_url, store_url, user_id, seen_key, product, queued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (key, webhook_url, store_url, user_id, seen_key,
+                     encode_product(product), queued_at)
+                    for key, (webhook_url, store_url, user_id, seen_key, product, queued_at) in writes.items()
+                ]
+            )
+        if deletes:
+            conn.executemany("DELETE FROM outbox WHERE key = ?", ((key,) for key in deletes))
+
+    def _restore(self, batch: JournalBatch):
+        writes, deletes = batch
+        for key, entry in writes.items():
+            if key not in self.writes and key not in self.deletes:
+                self.writes[key] = entry
+        self.deletes |= {key for key in deletes if key not in self.writes}
+
+    def load(self, webhook_urls: Iterable[str], user_id: Optional[int] = None) -> List[Tuple[str, JournalEntry]]:
+        """Undelivered notifications for these webhooks (and user), oldest first"""
+        webhook_urls = list(webhook_urls)
+        if not webhook_urls:
+            return []
+        query = (f"SELECT key, webhook_url, store_url, user_id, seen_key, product, queued_at FROM outbox "
+                 f"WHERE webhook_url IN ({', '.join('?' * len(webhook_urls))})")
+        params = list(webhook_urls)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        rows = self.query(query + " ORDER BY queued_at", params)
+
+        entries = []
+        for key, webhook_url, store_url, row_user_id, seen_key, product, queued_at in rows:
+            try:
+                product = decode_product(product)
+            except Exception as e:
+                # Written by an incompatible version; nothing to replay
+                logger.warning(f"Discarding unreadable outbox entry {key}: {e}")
+                self.ack(key)
+                continue
+            entries.append((key, (webhook_url, store_url, row_user_id, seen_key, product, queued_at)))
+        return entries
+
+    def stats(self) -> Dict:
+        return {'pending_writes': len(self.writes), 'pending_acks': len(self.deletes)}
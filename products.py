@@ -0,0 +1,108 @@
+import sys
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from catalog_decode import CatalogProduct
+from catalog_diff import NEW
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+@dataclass(slots=True)
+class Variant:
+    id: int
+    size: str
+    available: bool
+    inventory: int
+
+
+@dataclass(slots=True)
+class Product:
+    """A matched product on its way to notification.
+
+    Store, vendor, type and size strings are interned so thousands of products
+    share one copy; variants are a tuple. Use ``to_dict`` at the webhook
+    boundary for the legacy notification payload.
+    """
+    id: int
+    title: str
+    handle: str
+    store_url: str
+    price: Optional[str]
+    image_url: str
+    vendor: Optional[str]
+    product_type: Optional[str]
+    tags: Tuple[str, ...]
+    variants: Tuple[Variant, ...]
+    event: str = NEW
+    recipients: Optional[FrozenSet[int]] = None  # Only these users, when redelivering a failed event
+
+    @classmethod
+    def from_catalog(cls, store_url: str, product: CatalogProduct, event: str = NEW,
+                     recipients: Optional[FrozenSet[int]] = None) -> 'Product':
+        variants = tuple(
+            Variant(
+                id=variant.id,
+                size=sys.intern(str(variant.title)),
+                available=variant.available,
+                inventory=variant.inventory_quantity if variant.inventory_quantity is not None else 1
+            )
+            for variant in product.variants
+        )
+        return cls(
+            id=product.id,
+            title=product.title,
+            handle=product.handle,
+            store_url=sys.intern(store_url),
+            price=product.variants[0].price if product.variants else None,
+            image_url=product.image_url,
+            vendor=_intern(product.vendor),
+            product_type=_intern(product.product_type),
+            tags=tuple(sys.intern(tag) for tag in product.tags),
+            variants=variants,
+            event=event,
+            recipients=recipients
+        )
+
+    @property
+    def url(self) -> str:
+        return f"{self.store_url}/products/{self.handle}"
+
+    @property
+    def retailer(self) -> str:
+        return self.store_url.split('/')[2]
+
+    @property
+    def stock(self) -> int:
+        return sum(variant.inventory for variant in self.variants if variant.available)
+
+    @property
+    def sizes(self) -> Dict[str, int]:
+        return {variant.size: variant.inventory for variant in self.variants if variant.available}
+
+    @property
+    def variant_ids(self) -> Dict[str, str]:
+        return {variant.size: str(variant.id or "") for variant in self.variants if variant.available}
+
+    def to_dict(self) -> Dict:
+        """The notification dict previously built by ShopifyMonitor._process_product"""
+        stock = self.stock
+        return {
+            "id": self.id,
+            "title": self.title,
+            "url": self.url,
+            "price": self.price if self.variants else "N/A",
+            "image_url": self.image_url,
+            "stock": stock,
+            "sizes": self.sizes,
+            "variants": self.variant_ids,
+            "full_size_run": "Bot 1 FSR" if stock > 0 else "OOS",
+            "variant_id": self.variants[0].id if self.variants else None,
+            "vendor": self.vendor,
+            "type": self.product_type,
+            "tags": list(self.tags),
+            "retailer": self.retailer,
+            "event": self.event
+        }
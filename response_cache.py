@@ -0,0 +1,112 @@
+import hashlib
+from typing import Dict, Hashable, Optional
+
+
+class CachedPage:
+    """Validators and body hash remembered for one catalog page"""
+
+    __slots__ = ('etag', 'last_modified', 'body_hash', 'product_count', 'match_key', 'processed')
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], body_hash: bytes,
+                 product_count: int, match_key: Hashable):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        self.product_count = product_count
+        self.match_key = match_key
+        self.processed = False  # Set once the page has been diffed and matched
+
+
+class CatalogResponseCache:
+    """Per-page response cache used to skip decoding and matching unchanged catalogs.
+
+    A page is only served from cache when it was fully processed last cycle
+    with the same ``match_key`` (keyword set and product cap), so a keyword
+    change always forces a fresh download.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, CachedPage] = {}
+        self.not_modified_hits = 0
+        self.body_hash_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def hash_body(body: bytes) -> bytes:
+        """Fast, collision-resistant digest of a raw response body"""
+        return hashlib.blake2b(body, digest_size=16).digest()
+
+    def _valid_entry(self, url: str, match_key: Hashable) -> Optional[CachedPage]:
+        entry = self.entries.get(url)
+        if entry is None or not entry.processed or entry.match_key != match_key:
+            return None
+        return entry
+
+    def conditional_headers(self, url: str, match_key: Hashable) -> Dict[str, str]:
+        """Build If-None-Match / If-Modified-Since headers for a page"""
+        entry = self._valid_entry(url, match_key)
+        if entry is None:
+            return {}
+
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def not_modified(self, url: str, match_key: Hashable) -> Optional[CachedPage]:
+        """Record a 304 response, returning the cached page if it is still usable"""
+        entry = self._valid_entry(url, match_key)
+        if entry is not None:
+            self.not_modified_hits += 1
+        return entry
+
+    def lookup_body(self, url: str, match_key: Hashable, body_hash: bytes) -> Optional[CachedPage]:
+        """Return the cached page if the body is byte-identical to the last cycle"""
+        entry = self._valid_entry(url, match_key)
+        if entry is not None and entry.body_hash == body_hash:
+            self.body_hash_hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, url: str, match_key: Hashable, body_hash: bytes, headers, product_count: int) -> CachedPage:
+        """Remember a freshly downloaded page; it becomes usable once processed"""
+        entry = CachedPage(
+            etag=headers.get('ETag'),
+            last_modified=headers.get('Last-Modified'),
+            body_hash=body_hash,
+            product_count=product_count,
+            match_key=match_key
+        )
+        self.entries[url] = entry
+        return entry
+
+    def mark_processed(self, url: str, match_key: Hashable):
+        """Mark a page as fully processed, making it eligible for cache hits"""
+        entry = self.entries.get(url)
+        if entry is not None and entry.match_key == match_key:
+            entry.processed = True
+
+    def invalidate(self, url: str):
+        """Forget a cached page"""
+        self.entries.pop(url, None)
+
+    def invalidate_store(self, store_url: str):
+        """Forget every cached page belonging to a store"""
+        prefix = f"{store_url}/products.json"
+        for url in [url for url in self.entries if url.startswith(prefix)]:
+            del self.entries[url]
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for health reporting"""
+        hits = self.not_modified_hits + self.body_hash_hits
+        total = hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'not_modified_hits': self.not_modified_hits,
+            'body_hash_hits': self.body_hash_hits,
+            'misses': self.misses,
+            'hit_rate': round(hits / total, 3) if total else 0.0
+        }
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict
+
+from sqlite_writeback import SQLiteWriteBack
+
+logger = logging.getLogger('SeenStore')
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS seen_products (key TEXT PRIMARY KEY, seen_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS seen_products_seen_at ON seen_products (seen_at)",
+)
+
+
+class SeenProductStore(SQLiteWriteBack):
+    """Notification dedupe keys persisted to SQLite (WAL) behind an in-memory LRU.
+
+    Checks hit the LRU first. While the LRU still holds every unexpired key
+    (it has not overflowed since ``load``), a miss there is definite and costs
+    no I/O; otherwise ``seen`` falls back to an indexed SQLite lookup on a
+    worker thread. New keys are buffered and written back in batches;
+    ``load`` warms the LRU from disk so a restarted monitor does not
+    re-announce everything it already sent. Keys older than ``ttl`` count as
+    unseen and are purged on write-back.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, front_size: int = 100_000,
+                 flush_interval: float = 5.0, flush_batch: int = 500):
+        super().__init__(path, SCHEMA, logger, 'seen products', flush_interval, flush_batch)
+        self.ttl = ttl
+        self.front_size = front_size
+        self.front: OrderedDict = OrderedDict()  # key -> seen_at, most recent last
+        self.pending: Dict[str, float] = {}
+        self.complete = False  # The LRU holds every unexpired key on disk
+        self.disk_lookups = 0
+
+    def _remember(self, key: str, seen_at: float):
+        self.front[key] = seen_at
+        self.front.move_to_end(key)
+        if len(self.front) > self.front_size:
+            self.front.popitem(last=False)
+            self.complete = False
+
+    def load(self) -> int:
+        """Warm the LRU with the most recent unexpired keys; returns how many were loaded"""
+        rows = self.query(
+            "SELECT key, seen_at FROM seen_products WHERE seen_at >= ? ORDER BY seen_at DESC LIMIT ?",
+            (time.time() - self.ttl, self.front_size + 1)
+        )
+        # One row more than fits tells us whether anything stays on disk only
+        self.complete = len(rows) <= self.front_size
+        rows = rows[:self.front_size]
+        self.front.clear()
+        for key, seen_at in reversed(rows):
+            self.front[key] = seen_at
+        logger.info(f"Loaded {len(rows)} seen products from {self.path}")
+        return len(rows)
+
+    async def seen(self, key: str) -> bool:
+        """Whether ``key`` was notified within ``ttl``"""
+        cutoff = time.time() - self.ttl
+        seen_at = self.front.get(key)
+        if seen_at is None:
+            seen_at = self.pending.get(key)
+        if seen_at is None:
+            if self.complete:
+                return False
+            self.disk_lookups += 1
+            rows = await asyncio.to_thread(
+                self.query, "SELECT seen_at FROM seen_products WHERE key = ?", (key,)
+            )
+            if not rows:
+                return False
+            seen_at = rows[0][0]
+        if seen_at < cutoff:
+            return False
+        self._remember(key, seen_at)
+        return True
+
+    def add(self, key: str):
+        """Mark a key as notified; persisted on the next write-back"""
+        now = time.time()
+        self._remember(key, now)
+        self.pending[key] = now
+
+    def _pending(self) -> int:
+        return len(self.pending)
+
+    def _take(self) -> Dict[str, float]:
+        pending, self.pending = self.pending, {}
+        return pending
+
+    def _write(self, conn: sqlite3.Connection, pending: Dict[str, float]):
+        if pending:
+            conn.executemany("INSERT OR REPLACE INTO seen_products (key, seen_at) VALUES (?, ?)", pending.items())
+        conn.execute("DELETE FROM seen_products WHERE seen_at < ?", (time.time() - self.ttl,))
+
+    def _restore(self, pending: Dict[str, float]):
+        self.pending = {**pending, **self.pending}
+
+    def stats(self) -> Dict:
+        return {'front': len(self.front), 'pending': len(self.pending),
+                'complete': self.complete, 'disk_lookups': self.disk_lookups}
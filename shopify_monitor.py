@@ -1,46 +1,163 @@
 import requests
 import time
 import json
-from typing import Dict, List
+import ipaddress
+import math
 import random
+from email.utils import parsedate_to_datetime
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, FrozenSet, Hashable, List, Optional
 import logging
 import socket
-import dns.resolver
+import dns.asyncresolver
 from urllib.parse import urlparse
 import aiohttp
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-import re
 import trafilatura
 from aiohttp import TCPConnector, ClientTimeout
 from aiohttp.client_exceptions import ClientError
+from config import MAX_PRODUCTS, SHOPIFY_RATE_BURST
+from response_cache import CatalogResponseCache
+from catalog_diff import NEW, CatalogDiffer, ScanEvent
+from keyword_matcher import get_matcher
+from catalog_decode import CatalogProduct, decode_products
+from products import Product
+from store_activity import StoreActivityTracker
+from store_health import FAILED, StoreHealthCache
+from circuit_breaker import (
+    CLIENT_ERROR, CONNECT_ERROR, DNS_ERROR, RATE_LIMITED, SERVER_ERROR, TIMEOUT,
+    CircuitBreaker, StoreFetchError
+)
+
+# Shopify caps products.json at 250 products per page
+SHOPIFY_PAGE_LIMIT = 250
+
+# Longer Retry-After values open the circuit instead of holding the poll
+MAX_INLINE_RETRY_AFTER = 10.0
+
+def classify_fetch_error(error: Exception) -> Optional[str]:
+    """Map a fetch exception to a circuit breaker failure kind"""
+    if isinstance(error, StoreFetchError):
+        return error.kind
+    if isinstance(error, aiohttp.ClientConnectorDNSError):
+        return DNS_ERROR
+    if isinstance(error, aiohttp.ConnectionTimeoutError):
+        return CONNECT_ERROR
+    if isinstance(error, asyncio.TimeoutError):  # Read and total timeouts
+        return TIMEOUT
+    if isinstance(error, aiohttp.ClientConnectionError):
+        return CONNECT_ERROR
+    if isinstance(error, ClientError):
+        return SERVER_ERROR
+    if isinstance(error, ValueError):
+        return CLIENT_ERROR  # Body was not a products.json payload
+    return None
+
+def parse_retry_after(value, default: float = 5.0) -> float:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+class TokenBucket:
+    """Token bucket for a single host; waiting here never blocks other hosts"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
 
-class RateLimiter:
-    def __init__(self, rate_limit):
-        self.rate_limit = rate_limit
-        self.last_request_time = 0
-        self._lock = asyncio.Lock()
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def set_rate(self, rate: float):
+        """Change the refill rate; tokens earned at the old rate are kept"""
+        self._refill(time.monotonic())
+        self.rate = rate
+
+    def block(self, seconds: float):
+        """Pause this host, e.g. for a Retry-After header"""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self._refill(now)
+        self.tokens = 0
 
     async def __aenter__(self):
-        async with self._lock:
-            current_time = time.time()
-            time_passed = current_time - self.last_request_time
-            if time_passed < 1 / self.rate_limit:
-                jitter = random.uniform(0, 0.5)
-                await asyncio.sleep(1/self.rate_limit - time_passed + jitter)
-            self.last_request_time = time.time()
-            return self
+        await self.acquire()
+        return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         pass
 
+class RateLimiter:
+    """Per-host token buckets sharing one rate/burst setting"""
+
+    def __init__(self, rate_limit, burst=SHOPIFY_RATE_BURST):
+        self.rate_limit = max(0.01, float(rate_limit))
+        self.burst = max(1.0, float(burst))
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def host(self, domain: str) -> TokenBucket:
+        """Bucket for a host, created on first use"""
+        bucket = self.buckets.get(domain)
+        if bucket is None:
+            bucket = self.buckets[domain] = TokenBucket(self.rate_limit, self.burst)
+        return bucket
+
+    def set_rate(self, rate_limit):
+        """Apply a new requests-per-second limit to every host, including known ones"""
+        self.rate_limit = max(0.01, float(rate_limit))
+        for bucket in self.buckets.values():
+            bucket.set_rate(self.rate_limit)
+
+    def retry_after(self, domain: str, seconds: float):
+        """Honour a Retry-After for one host without affecting the others"""
+        self.host(domain).block(seconds)
+
+class CatalogPage:
+    """One page of a store catalog; ``products`` is None when served from cache"""
+
+    __slots__ = ('url', 'products', 'product_count')
+
+    def __init__(self, url: str, products: List[CatalogProduct], product_count: int):
+        self.url = url
+        self.products = products
+        self.product_count = product_count
+
 class ShopifyMonitor:
-    def __init__(self, rate_limit=0.5):
-        self.rate_limiter = RateLimiter(rate_limit)
-        self.failed_stores = set()
-        self.retry_counts = {}
-        self.last_request_time = time.time()
+    def __init__(self, rate_limit=0.5, page_concurrency=2, rate_burst=SHOPIFY_RATE_BURST):
+        self.rate_limiter = RateLimiter(rate_limit, rate_burst)
+        self.page_concurrency = max(1, page_concurrency)  # Pages fetched ahead of matching
+        self.max_retries = 2  # In-cycle retries per page for 429 and 5xx
+        self.circuit_breaker = CircuitBreaker()
         self.dns_cache = {}
+        self.response_cache = CatalogResponseCache()
+        self.catalog_differ = CatalogDiffer()
+        self.store_activity = StoreActivityTracker()
+        self.catalog_pages: Dict[str, int] = {}  # Pages each store had last cycle, for prefetching
 
         # Enhanced connection pooling settings
         self.max_connections = 100  # Concurrent connection limit
@@ -65,15 +182,26 @@ class ShopifyMonitor:
         self._session_pools = {}
         self._session_pool_lock = asyncio.Lock()
 
-        # Thread pool for CPU-bound tasks
-        self.thread_pool = ThreadPoolExecutor(max_workers=20)
-
-        # DNS resolvers with fallback
-        self.resolvers = [
-            dns.resolver.Resolver(),
-            dns.resolver.Resolver(configure=False)
-        ]
-        self.resolvers[1].nameservers = ['8.8.8.8', '8.8.4.4']  # Google DNS backup
+        # asyncio-native DNS resolvers with fallback, created once and reused
+        self.resolvers = []
+        for name, nameservers in [
+            ("Default", None),
+            ("Google", ['8.8.8.8', '8.8.4.4']),
+            ("Cloudflare", ['1.1.1.1', '1.0.0.1']),
+            ("OpenDNS", ['208.67.222.222', '208.67.220.220'])
+        ]:
+            try:
+                resolver = dns.asyncresolver.Resolver(configure=nameservers is None)
+            except Exception:
+                continue  # No usable system resolver configuration
+            if nameservers:
+                resolver.nameservers = nameservers
+            resolver.timeout = 2.0
+            resolver.lifetime = 4.0
+            self.resolvers.append((resolver, name))
+
+        # Reachability learned from real requests; only failed hosts get probed
+        self.store_health = StoreHealthCache()
 
         # Initialize logging
         self.logger = logging.getLogger('ShopifyMonitor')
@@ -101,27 +229,9 @@ class ShopifyMonitor:
                 return self.dns_cache[domain]['ip']
             del self.dns_cache[domain]
 
-        resolver_list = [
-            (dns.resolver.Resolver(), "Default"),
-            (dns.resolver.Resolver(configure=False), "Google"),
-            (dns.resolver.Resolver(configure=False), "Cloudflare"),
-            (dns.resolver.Resolver(configure=False), "OpenDNS")
-        ]
-
-        resolver_list[1][0].nameservers = ['8.8.8.8', '8.8.4.4']
-        resolver_list[2][0].nameservers = ['1.1.1.1', '1.0.0.1']
-        resolver_list[3][0].nameservers = ['208.67.222.222', '208.67.220.220']
-
-        for resolver, name in resolver_list:
+        for resolver, name in self.resolvers:
             try:
-                resolver.timeout = 2.0
-                resolver.lifetime = 4.0
-                answers = await asyncio.get_event_loop().run_in_executor(
-                    self.thread_pool,
-                    resolver.resolve,
-                    domain,
-                    'A'
-                )
+                answers = await resolver.resolve(domain, 'A')
                 if answers:
                     ip = answers[0].address
                     self.dns_cache[domain] = {
@@ -137,182 +247,274 @@ class ShopifyMonitor:
         self.logger.error(f"All DNS resolution methods failed for {domain}")
         return None
 
-    async def _validate_store_url(self, store_url: str) -> bool:
-        """Validate store URL with enhanced error handling"""
+    async def _probe_store(self, store_url: str) -> Optional[str]:
+        """Explicit DNS + TCP reachability probe; returns the failure kind or None if reachable"""
+        parsed_url = urlparse(store_url)
+        host = parsed_url.hostname
+        port = parsed_url.port or (80 if parsed_url.scheme == 'http' else 443)
+
         try:
-            parsed_url = urlparse(store_url)
-            domain = parsed_url.netloc
+            ip = str(ipaddress.ip_address(host))
+        except ValueError:
+            ip = await self._resolve_domain_async(host)
+        if not ip:
+            return DNS_ERROR
 
-            ip = await self._resolve_domain_async(domain)
-            if not ip:
-                return False
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout=10)
+            writer.close()
+            await writer.wait_closed()
+            return None
+        except Exception as e:
+            self.logger.error(f"Connection test failed for {host} ({ip}:{port}): {e}")
+            return CONNECT_ERROR
 
-            try:
-                reader, writer = await asyncio.open_connection(ip, 443)
-                writer.close()
-                await writer.wait_closed()
-                return True
-            except Exception as e:
-                self.logger.error(f"Connection test failed for {domain} ({ip}:443): {e}")
+    async def _validate_store_url(self, store_url: str) -> bool:
+        """Probe hosts that last failed at the network level; everything else goes straight through"""
+        try:
+            domain = urlparse(store_url).netloc
+            if not domain:
                 return False
 
+            # The circuit breaker decides when a failed host is retried; the probe
+            # keeps that retry from costing a full catalog request if it is still down
+            if self.store_health.state(domain) == FAILED:
+                failure = await self._probe_store(store_url)
+                if failure:
+                    self.store_health.record_failure(domain, "probe failed")
+                    self.circuit_breaker.record_failure(store_url, failure, "probe failed")
+                    return False
+                self.store_health.record_success(domain)
+
+            return True
+
         except Exception as e:
             self.logger.error(f"Store validation error for {store_url}: {e}")
             return False
 
-    async def async_fetch_products(self, store_url: str, keywords: List[str]) -> List[Dict]:
-        """Fetch products with improved concurrency and error handling"""
-        self.logger.info(f"Fetching products from {store_url} with keywords: {keywords}")
-
-        if not await self._validate_store_url(store_url):
-            self.logger.error(f"Store validation failed for {store_url}")
-            return []
-
-        if store_url in self.failed_stores:
-            retry_count = self.retry_counts.get(store_url, 0)
-            backoff = min(300, 2 ** retry_count)  # Cap at 5 minutes
-            if time.time() - self.last_request_time < backoff:
-                self.logger.info(f"Skipping {store_url} due to recent failure (backoff: {backoff}s)")
-                return []
-            self.retry_counts[store_url] = retry_count + 1
-
+    async def _fetch_page(self, session: aiohttp.ClientSession, store_url: str, page: int,
+                          limit: int, match_key: Hashable) -> CatalogPage:
+        """Fetch a single page of products.json, short-circuiting unchanged pages"""
         domain = urlparse(store_url).netloc
-        session = await self.get_session(domain)
-
-        try:
-            initial_limit = 250  # Increased initial fetch
-            products_url = f"{store_url}/products.json?limit={initial_limit}"
-
-            self.logger.info(f"Making initial request to {products_url}")
-
-            async with self.rate_limiter:
-                async with session.get(products_url, timeout=self.timeout) as response:
-                    if response.status == 200:
-                        products_data = await response.json()
+        products_url = f"{store_url}/products.json?limit={limit}&page={page}"
+
+        attempt = 0
+        while True:
+            headers = self.response_cache.conditional_headers(products_url, match_key)
+            retry_delay = 0.0
+            self.logger.info(f"Requesting {products_url}")
+            async with self.rate_limiter.host(domain):
+                async with session.get(products_url, headers=headers, timeout=self.timeout) as response:
+                    # Any HTTP response proves the host is reachable
+                    self.store_health.record_success(domain)
+                    if response.status == 304:
+                        cached = self.response_cache.not_modified(products_url, match_key)
+                        if cached is not None:
+                            return CatalogPage(products_url, None, cached.product_count)
+                        if not headers:
+                            raise StoreFetchError(SERVER_ERROR, f"HTTP 304 from {domain} without validators")
+                        # The entry was invalidated mid-request; ask again for the full body
+                        self.response_cache.invalidate(products_url)
+                        continue
+                    elif response.status == 200:
+                        body = await response.read()
+                        body_hash = self.response_cache.hash_body(body)
+                        cached = self.response_cache.lookup_body(products_url, match_key, body_hash)
+                        if cached is not None:
+                            return CatalogPage(products_url, None, cached.product_count)
+
+                        products = decode_products(body)
+                        self.response_cache.store(products_url, match_key, body_hash, response.headers, len(products))
+                        return CatalogPage(products_url, products, len(products))
                     elif response.status == 429:  # Rate limited
-                        retry_after = int(response.headers.get('Retry-After', 5))
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        # Only this host's bucket pauses; a retry waits on it
+                        self.rate_limiter.retry_after(domain, retry_after)
+                        if attempt >= self.max_retries or retry_after > MAX_INLINE_RETRY_AFTER:
+                            raise StoreFetchError(RATE_LIMITED, f"HTTP 429 from {domain}", retry_after)
                         self.logger.warning(f"Rate limited by {domain}, waiting {retry_after}s")
-                        await asyncio.sleep(retry_after)
-                        return await self.async_fetch_products(store_url, keywords)
+                    elif response.status >= 500:
+                        if attempt >= self.max_retries:
+                            raise StoreFetchError(SERVER_ERROR, f"HTTP {response.status} from {domain}")
+                        retry_delay = 0.5 * (2 ** attempt) * random.uniform(1.0, 1.5)
+                        self.logger.warning(f"Server error {response.status} from {domain}, retrying in {retry_delay:.2f}s")
                     else:
-                        self.logger.error(f"Failed request: {response.status} - {await response.text()}")
-                        return []
+                        raise StoreFetchError(CLIENT_ERROR, f"HTTP {response.status} from {domain}")
+
+            attempt += 1
+            if retry_delay:
+                await asyncio.sleep(retry_delay)
+
+    async def iter_product_pages(self, store_url: str, max_products: int = MAX_PRODUCTS,
+                                 page_size: int = SHOPIFY_PAGE_LIMIT,
+                                 match_key: Hashable = None) -> AsyncIterator[CatalogPage]:
+        """Yield catalog pages in order while the following pages download concurrently.
+
+        At most ``self.page_concurrency`` pages are requested ahead of the
+        consumer, so memory stays bounded to one page per in-flight request.
+        A page is only requested ahead once it is known to exist: the store
+        had that many pages last cycle, or the page before it came back full.
+        Iteration stops at the first short or empty page, or once
+        ``max_products`` products have been yielded. Pages unchanged since the
+        last cycle come back with ``products`` set to ``None``.
+        """
+        page_size = max(1, min(SHOPIFY_PAGE_LIMIT, int(page_size)))
+        max_pages = max(1, math.ceil(max_products / page_size))
+        domain = urlparse(store_url).netloc
+        session = await self.get_session(domain)
+
+        pending = {}
+        next_page = 1
+        known_pages = min(max_pages, self.catalog_pages.get(store_url, 1))
+        remaining = max_products
 
-            if not products_data:
-                return []
+        def request_ahead(up_to: int):
+            nonlocal next_page
+            while next_page <= min(up_to, known_pages):
+                pending[next_page] = asyncio.ensure_future(
+                    self._fetch_page(session, store_url, next_page, page_size, match_key)
+                )
+                next_page += 1
+
+        try:
+            for page in range(1, max_pages + 1):
+                # Keep the download window full before waiting on this page
+                request_ahead(page + self.page_concurrency - 1)
+
+                catalog_page = await pending.pop(page)
+                if not catalog_page or not catalog_page.product_count:
+                    self.catalog_pages[store_url] = max(1, page - 1)
+                    return
+
+                fetched_count = catalog_page.product_count
+                if catalog_page.products is not None and fetched_count > remaining:
+                    catalog_page.products = catalog_page.products[:remaining]
+                    catalog_page.product_count = remaining
+                remaining -= catalog_page.product_count
+                last_page = remaining <= 0 or fetched_count < page_size
+                if last_page:
+                    self.catalog_pages[store_url] = page
+                else:
+                    # A full page means the next one exists; start it before matching this one
+                    known_pages = max(known_pages, min(max_pages, page + 1))
+                    request_ahead(page + self.page_concurrency)
+                yield catalog_page
+
+                if last_page:
+                    return
+        finally:
+            for task in pending.values():
+                task.cancel()
+            # Let cancelled prefetches finish so their responses are released before we return
+            await asyncio.gather(*pending.values(), return_exceptions=True)
+
+    async def async_fetch_products(self, store_url: str, keywords: List[str],
+                                   max_products: int = MAX_PRODUCTS,
+                                   page_size: int = SHOPIFY_PAGE_LIMIT) -> List[Product]:
+        """Fetch products with improved concurrency and error handling"""
+        self.logger.info(f"Fetching products from {store_url} with keywords: {keywords}")
 
-            matching_products = []
-            total_products = len(products_data.get("products", []))
-            self.logger.info(f"Retrieved {total_products} products from initial request")
+        if not self.circuit_breaker.allow(store_url):
+            retry_in = self.circuit_breaker.next_attempt_at(store_url) - time.time()
+            self.logger.info(f"Skipping {store_url}, circuit {self.circuit_breaker.state(store_url)} (retry in {retry_in:.0f}s)")
+            return []
 
-            # Process products in parallel batches
-            batch_size = 50
-            products = products_data.get("products", [])
-            batches = [products[i:i + batch_size] for i in range(0, len(products), batch_size)]
+        if not await self._validate_store_url(store_url):
+            self.logger.error(f"Store validation failed for {store_url}")
+            return []
 
-            async def process_batch(batch):
-                results = []
-                for product in batch:
-                    if await self._matches_keywords(product, keywords):
-                        processed = await self._process_product(store_url, product)
-                        if processed:
-                            results.append(processed)
-                return results
+        # Cached pages and snapshots are only reused for the same keyword set and product cap
+        match_key = (tuple(sorted(keywords)), max_products)
+        scan = self.catalog_differ.begin(store_url, match_key)
+        started = time.monotonic()
+        complete = False
+        matching_products = []
 
-            # Process batches concurrently
-            tasks = [process_batch(batch) for batch in batches]
-            batch_results = await asyncio.gather(*tasks)
+        try:
+            total_products = 0
+            cached_pages = 0
+
+            # Diff and match each page as soon as it arrives while later pages download
+            pages = self.iter_product_pages(store_url, max_products, page_size, match_key)
+            async with aclosing(pages):
+                async for catalog_page in pages:
+                    total_products += catalog_page.product_count
+                    if catalog_page.products is None:
+                        cached_pages += 1
+                        scan.skip_page()
+                        continue
+
+                    events = scan.diff_page(catalog_page.products)
+                    # Products past an early stop are older than the watermark, so the page counts as seen
+                    self.response_cache.mark_processed(catalog_page.url, match_key)
+                    if events:
+                        matching_products.extend(await self._match_products(store_url, events, keywords))
+                    if scan.stopped_early:
+                        break
+            complete = True
 
-            for batch_result in batch_results:
-                matching_products.extend(batch_result)
+            self.logger.info(
+                f"Retrieved {total_products} products from {store_url} "
+                f"({cached_pages} pages unchanged, {scan.compared} compared"
+                f"{', stopped at watermark' if scan.stopped_early else ''})"
+            )
 
-            self.failed_stores.discard(store_url)
-            self.retry_counts.pop(store_url, None)
+            self.circuit_breaker.record_success(store_url)
+            self.store_activity.record(store_url, scan.changes > 0 and not scan.baseline,
+                                       time.monotonic() - started)
 
-            self.logger.info(f"Found {len(matching_products)} matching products")
+            self.logger.info(f"Found {len(matching_products)} changed matching products")
             return matching_products
 
         except Exception as e:
-            self.logger.error(f"Error fetching products from {store_url}: {e}", exc_info=True)
-            if isinstance(e, (ClientError, asyncio.TimeoutError)):
-                self.failed_stores.add(store_url)
-            return []
-
-    async def _matches_keywords(self, product: Dict, keywords: List[str]) -> bool:
-        """Asynchronous keyword matching with improved accuracy"""
-        if not product:
-            return False
-
-        # Prepare searchable text
-        title = product.get("title", "").lower()
-        vendor = product.get("vendor", "").lower()
-        product_type = product.get("product_type", "").lower()
-        tags = [tag.lower() for tag in product.get("tags", [])]
-        searchable_text = f"{title} {vendor} {product_type} {' '.join(tags)}"
-
-        # Convert keywords to lowercase once
-        lowercase_keywords = [kw.lower() for kw in keywords]
-
-        for keyword in lowercase_keywords:
-            keyword_parts = keyword.split()
-            if len(keyword_parts) > 1:
-                # Multi-word keyword matching
-                all_parts_found = True
-                current_pos = 0
-                for part in keyword_parts:
-                    pos = searchable_text.find(part, current_pos)
-                    if pos == -1:
-                        all_parts_found = False
-                        break
-                    current_pos = pos + len(part)
-                if all_parts_found:
-                    return True
+            kind = classify_fetch_error(e)
+            error = str(e) or type(e).__name__
+            if kind is None:
+                self.logger.error(f"Error fetching products from {store_url}: {e}", exc_info=True)
             else:
-                # Single-word keyword matching with word boundaries
-                pattern = f"\\b{re.escape(keyword)}\\b"
-                if re.search(pattern, searchable_text):
-                    return True
-
-        return False
-
-    async def _process_product(self, store_url: str, product: Dict) -> Dict:
-        """Process product data asynchronously"""
+                backoff = self.circuit_breaker.record_failure(
+                    store_url, kind, error, getattr(e, 'retry_after', None)
+                )
+                self.logger.error(f"Error fetching products from {store_url} ({kind}): {error}"
+                                  + (f", circuit open for {backoff:.1f}s" if backoff else ""))
+                if kind in (DNS_ERROR, CONNECT_ERROR):
+                    self.store_health.record_failure(urlparse(store_url).netloc, error)
+            # Pages diffed before the failure are already in the snapshot, so report them now
+            return matching_products
+        finally:
+            scan.finish(complete)
+
+    def retry_product(self, store_url: str, product_id: int, event: str, user_id: int):
+        """Report a product's event to a user again next cycle (e.g. after a failed webhook)"""
+        self.catalog_differ.retry_event(store_url, product_id, event, user_id)
+        self.response_cache.invalidate_store(store_url)
+
+    async def _match_products(self, store_url: str, events: List[ScanEvent],
+                              keywords: List[str]) -> List[Product]:
+        """Match changed products as one batch and process the hits, tagging each with its event"""
+        matcher = get_matcher(keywords)
+        flags = matcher.match_batch([product for _, product, _ in events])
+
+        matching_products = []
+        for (event, product, recipients), matched in zip(events, flags):
+            if not matched:
+                continue
+            processed = await self._process_product(store_url, product, event, recipients)
+            if processed:
+                matching_products.append(processed)
+        return matching_products
+
+    async def _process_product(self, store_url: str, product: CatalogProduct, event: str = NEW,
+                               recipients: Optional[FrozenSet[int]] = None) -> Product:
+        """Build the compact Product record passed on to notification"""
         try:
-            variants = product.get("variants", [])
-            sizes = {}
-            variant_ids = {}
-            stock = 0
-
-            for variant in variants:
-                if variant.get("available"):
-                    size = str(variant.get("title"))
-                    inventory = variant.get("inventory_quantity", 1)
-                    stock += inventory
-                    sizes[size] = inventory
-                    variant_ids[size] = str(variant.get("id", ""))
-
-            return {
-                "title": product["title"],
-                "url": f"{store_url}/products/{product['handle']}",
-                "price": variants[0].get("price") if variants else "N/A",
-                "image_url": product.get("images", [{}])[0].get("src", ""),
-                "stock": stock,
-                "sizes": sizes,
-                "variants": variant_ids,
-                "full_size_run": "Bot 1 FSR" if stock > 0 else "OOS",
-                "variant_id": variants[0].get("id") if variants else None,
-                "vendor": product.get("vendor"),
-                "type": product.get("product_type"),
-                "tags": product.get("tags", []),
-                "retailer": store_url.split('/')[2]
-            }
+            return Product.from_catalog(store_url, product, event, recipients)
         except Exception as e:
-            self.logger.error(f"Error processing product {product.get('title', 'Unknown')}: {e}")
+            self.logger.error(f"Error processing product {product.title or 'Unknown'}: {e}")
             return None
 
     async def cleanup(self):
         """Cleanup resources"""
         for session in self._session_pools.values():
             await session.close()
-        await self.connector.close()
-        self.thread_pool.shutdown(wait=True)
\ No newline at end of file
+        await self.connector.close()
\ No newline at end of file
@@ -0,0 +1,106 @@
+import abc
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, List, Sequence
+
+
+class SQLiteWriteBack(abc.ABC):
+    """Buffered write-back to one SQLite (WAL) database.
+
+    Subclasses keep their changes in memory and implement ``_pending``,
+    ``_take``, ``_write`` and ``_restore``. A flush takes the whole buffer as
+    one batch and writes it in a single transaction; ``flush_if_due`` does so
+    off the event loop once ``flush_batch`` changes are buffered or
+    ``flush_interval`` seconds have passed. A batch that fails to write goes
+    back into the buffer for the next attempt.
+    """
+
+    def __init__(self, path: str, schema: Sequence[str], logger: logging.Logger, description: str,
+                 flush_interval: float, flush_batch: int):
+        self.path = path
+        self.schema = schema
+        self.logger = logger
+        self.description = description  # What failed to persist, for log messages
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @abc.abstractmethod
+    def _pending(self) -> int:
+        """Number of buffered changes"""
+
+    @abc.abstractmethod
+    def _take(self) -> Any:
+        """Empty the buffer, returning its contents as one batch"""
+
+    @abc.abstractmethod
+    def _write(self, conn: sqlite3.Connection, batch: Any):
+        """Apply a batch; runs under the lock, inside one transaction"""
+
+    @abc.abstractmethod
+    def _restore(self, batch: Any):
+        """Put a batch that failed to write back, without undoing newer changes"""
+
+    def query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _commit(self, batch: Any):
+        with self._lock:
+            conn = self._connect()
+            self._write(conn, batch)
+            conn.commit()
+
+    def _take_batch(self) -> Any:
+        self.last_flush = time.monotonic()
+        return self._take()
+
+    def flush(self):
+        """Write everything buffered in one transaction"""
+        batch = self._take_batch()
+        try:
+            self._commit(batch)
+        except sqlite3.Error:
+            self._restore(batch)
+            raise
+
+    async def flush_if_due(self):
+        """Write back off the event loop once the batch is full or the interval has passed"""
+        pending = self._pending()
+        if not pending:
+            return
+        if pending < self.flush_batch and time.monotonic() - self.last_flush < self.flush_interval:
+            return
+        # Taken on the loop, so changes made while the thread writes land in the next batch
+        batch = self._take_batch()
+        try:
+            await asyncio.to_thread(self._commit, batch)
+        except sqlite3.Error as e:
+            self._restore(batch)
+            self.logger.error(f"Failed to persist {self.description}: {e}")
+
+    def close(self):
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            self.logger.error(f"Failed to persist {self.description}: {e}")
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,89 @@
+import time
+from typing import Dict
+
+# Activity decays by half every CHANGE_HALF_LIFE seconds without a change
+CHANGE_HALF_LIFE = 3600.0
+# A store quiet for longer than this starts backing off, doubling per further quiet period
+QUIET_AFTER = 3600.0
+MAX_QUIET_DOUBLINGS = 5
+# Never poll a store more often than this multiple of its own poll latency
+LATENCY_FLOOR_FACTOR = 2.0
+LATENCY_ALPHA = 0.3
+
+
+class StoreActivity:
+    """Observed behaviour of one store"""
+
+    __slots__ = ('change_rate', 'latency', 'last_change', 'updated')
+
+    def __init__(self, now: float):
+        self.change_rate = 0.0  # Time-decayed count of polls that saw catalog changes
+        self.latency = None     # EWMA of poll duration in seconds
+        self.last_change = now  # Treat a new store as freshly active
+        self.updated = now
+
+
+class StoreActivityTracker:
+    """Learns per-store polling intervals from how often catalogs actually change.
+
+    ``change_rate`` is an exponentially weighted rate: it decays with wall-clock
+    time rather than per poll, so polling a store faster does not dilute it.
+    Active stores are polled up to ``1 + change_rate`` times faster than the
+    base delay, but never faster than ``min_delay``, which callers set to
+    their post-drop cadence so the request budget stays bounded; stores
+    unchanged for hours back off towards the ceiling.
+    """
+
+    def __init__(self):
+        self.stores: Dict[str, StoreActivity] = {}
+
+    def _decayed_rate(self, activity: StoreActivity, now: float) -> float:
+        return activity.change_rate * 0.5 ** ((now - activity.updated) / CHANGE_HALF_LIFE)
+
+    def record(self, store_url: str, changed: bool, latency: float):
+        """Record one completed poll"""
+        now = time.time()
+        activity = self.stores.get(store_url)
+        if activity is None:
+            activity = self.stores[store_url] = StoreActivity(now)
+
+        activity.change_rate = self._decayed_rate(activity, now) + (1.0 if changed else 0.0)
+        activity.updated = now
+        if changed:
+            activity.last_change = now
+        if activity.latency is None:
+            activity.latency = latency
+        else:
+            activity.latency += LATENCY_ALPHA * (latency - activity.latency)
+
+    def interval(self, store_url: str, base_delay: float, min_delay: float, max_delay: float) -> float:
+        """Seconds until the store's next poll, within [min_delay, max_delay]"""
+        activity = self.stores.get(store_url)
+        if activity is None:
+            return max(min_delay, min(max_delay, base_delay))
+
+        now = time.time()
+        delay = base_delay / (1.0 + self._decayed_rate(activity, now))
+
+        quiet_for = now - activity.last_change
+        if quiet_for > QUIET_AFTER:
+            doublings = min(MAX_QUIET_DOUBLINGS, (quiet_for - QUIET_AFTER) / QUIET_AFTER + 1)
+            delay *= 2 ** doublings
+
+        floor = max(min_delay, (activity.latency or 0.0) * LATENCY_FLOOR_FACTOR)
+        return max(floor, min(max_delay, delay))
+
+    def forget(self, store_url: str):
+        self.stores.pop(store_url, None)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-store activity for health reporting"""
+        now = time.time()
+        return {
+            store_url: {
+                'change_rate': round(self._decayed_rate(activity, now), 2),
+                'latency': round(activity.latency or 0.0, 2),
+                'quiet_for': round(now - activity.last_change),
+            }
+            for store_url, activity in self.stores.items()
+        }
@@ -0,0 +1,64 @@
+import time
+from typing import Dict, Optional
+
+# Reachability states
+UNKNOWN = 'unknown'
+HEALTHY = 'healthy'
+FAILED = 'failed'
+
+
+class HostHealth:
+    """Last known reachability of one store host"""
+
+    __slots__ = ('state', 'updated_at', 'failures', 'last_error')
+
+    def __init__(self):
+        self.state = UNKNOWN
+        self.updated_at = 0.0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+
+class StoreHealthCache:
+    """Reachability cache fed by the outcome of real HTTP requests.
+
+    Every request updates its host, so the state is only as old as the last
+    poll and healthy hosts are never probed. Failed hosts stay failed until a
+    request or an explicit probe succeeds; when they are retried is up to the
+    per-store circuit breaker.
+    """
+
+    def __init__(self):
+        self.hosts: Dict[str, HostHealth] = {}
+
+    def _entry(self, domain: str) -> HostHealth:
+        entry = self.hosts.get(domain)
+        if entry is None:
+            entry = self.hosts[domain] = HostHealth()
+        return entry
+
+    def record_success(self, domain: str):
+        entry = self._entry(domain)
+        entry.state = HEALTHY
+        entry.updated_at = time.time()
+        entry.failures = 0
+        entry.last_error = None
+
+    def record_failure(self, domain: str, error: str = None):
+        entry = self._entry(domain)
+        entry.state = FAILED
+        entry.updated_at = time.time()
+        entry.failures += 1
+        entry.last_error = error
+
+    def state(self, domain: str) -> str:
+        """Outcome of the last request to ``domain``; unknown until one completes"""
+        entry = self.hosts.get(domain)
+        return entry.state if entry is not None else UNKNOWN
+
+    def stats(self) -> Dict[str, int]:
+        """Number of hosts in each state"""
+        counts = {UNKNOWN: 0, HEALTHY: 0, FAILED: 0}
+        for entry in self.hosts.values():
+            counts[entry.state] += 1
+        return counts
@@ -0,0 +1,148 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger('StoreScheduler')
+
+
+class StoreScheduler:
+    """Polls each store on its own cadence from a heap of next-due times.
+
+    At most ``concurrency`` polls run at once. A store is rescheduled the
+    moment its own poll finishes, using the delay returned by ``interval``,
+    so a slow or timing-out host only ever delays itself. Stores whose
+    circuit is open are pushed back to the breaker's next attempt time
+    without taking a poll slot.
+    """
+
+    def __init__(self, poll: Callable[[str], Awaitable[int]], interval: Callable[[str, Optional[int]], float],
+                 concurrency: int = 20, circuit_breaker: Optional[CircuitBreaker] = None):
+        self.poll = poll
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self.circuit_breaker = circuit_breaker
+        self.stores: Set[str] = set()
+        self.heap: List[Tuple[float, int, str]] = []
+        self.due: Dict[str, float] = {}  # Current due time per store; older heap entries are stale
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.running = False
+        self._sequence = 0
+        self._wakeup = asyncio.Event()
+
+    def _schedule(self, store_url: str, due: float):
+        self._sequence += 1
+        self.due[store_url] = due
+        heapq.heappush(self.heap, (due, self._sequence, store_url))
+
+    def set_stores(self, store_urls: Iterable[str]):
+        """Replace the monitored set; new stores are due immediately, removed ones drop out lazily"""
+        store_urls = set(store_urls)
+        now = time.monotonic()
+        for store_url in store_urls - self.stores:
+            if store_url not in self.in_flight:
+                self._schedule(store_url, now)
+        for store_url in self.stores - store_urls:
+            self.due.pop(store_url, None)
+        self.stores = store_urls
+        self._wakeup.set()
+
+    def set_concurrency(self, concurrency: int):
+        """Change how many polls may run at once; polls already running over a lower cap finish normally"""
+        self.concurrency = max(1, concurrency)
+        self._wakeup.set()
+
+    def _pop_due(self, now: float) -> Optional[str]:
+        """Pop the next store whose due time has passed, discarding stale entries"""
+        while self.heap:
+            due, _, store_url = self.heap[0]
+            if self.due.get(store_url) != due:
+                heapq.heappop(self.heap)
+                continue
+            if due > now:
+                return None
+            heapq.heappop(self.heap)
+            del self.due[store_url]
+            return store_url
+        return None
+
+    def _next_due(self) -> Optional[float]:
+        while self.heap and self.due.get(self.heap[0][2]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    async def _run_poll(self, store_url: str):
+        result = None
+        try:
+            result = await self.poll(store_url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error polling {store_url}: {e}", exc_info=True)
+        finally:
+            self.in_flight.pop(store_url, None)
+            self._wakeup.set()
+
+        if self.running and store_url in self.stores:
+            self._schedule(store_url, time.monotonic() + max(0.0, self.interval(store_url, result)))
+
+    def _start_due_polls(self):
+        now = time.monotonic()
+        while len(self.in_flight) < self.concurrency:
+            store_url = self._pop_due(now)
+            if store_url is None:
+                break
+
+            if self.circuit_breaker and not self.circuit_breaker.is_available(store_url):
+                wait = self.circuit_breaker.next_attempt_at(store_url) - time.time()
+                self._schedule(store_url, now + max(0.0, wait))
+                continue
+
+            self.in_flight[store_url] = asyncio.create_task(self._run_poll(store_url))
+
+    async def run(self):
+        """Dispatch polls until stop() is called"""
+        self.running = True
+        while self.running:
+            self._wakeup.clear()
+            self._start_due_polls()
+
+            # Sleep until the next store is due or a poll frees a slot
+            timeout = None
+            next_due = self._next_due()
+            if next_due is not None and len(self.in_flight) < self.concurrency:
+                timeout = max(0.0, next_due - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        """Stop dispatching and cancel polls still in flight.
+
+        The store set is cleared too, so a later ``set_stores`` and ``run``
+        start every store afresh.
+        """
+        self.running = False
+        self._wakeup.set()
+        tasks = list(self.in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.in_flight.clear()
+        self.stores = set()
+        self.due.clear()
+        self.heap.clear()
+
+    def stats(self) -> Dict:
+        """Scheduler state for health reporting"""
+        now = time.monotonic()
+        next_due = self._next_due()
+        return {
+            'stores': len(self.stores),
+            'in_flight': len(self.in_flight),
+            'next_due_in': round(max(0.0, next_due - now), 1) if next_due is not None else None,
+        }
@@ -0,0 +1,165 @@
+from catalog_decode import CatalogProduct, CatalogVariant
+from catalog_diff import (
+    FULL_SCAN_INTERVAL, NEW, PRICE_CHANGED, RESTOCKED, SOLD_OUT, CatalogDiffer
+)
+
+STORE = "https://store.example"
+
+
+def product(product_id, updated_at, available=(), price="100.00", sizes=2):
+    variants = tuple(
+        CatalogVariant(id=product_id * 10 + size, title=str(size), available=size in available, price=price)
+        for size in range(sizes)
+    )
+    return CatalogProduct(id=product_id, title=f"Product {product_id}", updated_at=updated_at, variants=variants)
+
+
+def scan(differ, products, complete=True):
+    """Diff one single-page fetch; returns (events as (event, id, recipients), scan)"""
+    current = differ.begin(STORE, "keywords")
+    events = current.diff_page(products)
+    current.finish(complete)
+    return [(event, item.id, recipients) for event, item, recipients in events], current
+
+
+def newest_first(count, stamp="2025-01-01T00:00:%02d"):
+    return [product(index, stamp % index, available=(0,)) for index in range(count, 0, -1)]
+
+
+def test_first_scan_reports_everything_as_new():
+    events, first = scan(CatalogDiffer(), newest_first(3))
+    assert events == [(NEW, 3, None), (NEW, 2, None), (NEW, 1, None)]
+    assert first.baseline
+
+
+def test_events_are_classified_by_stock_and_price():
+    differ = CatalogDiffer()
+    scan(differ, [
+        product(1, "a", available=()), product(2, "a", available=(0,)),
+        product(3, "a", available=(0,)), product(4, "a", available=(0,)), product(5, "a", available=(0,)),
+    ])
+    events, second = scan(differ, [
+        product(1, "b", available=(1,)),          # Back in stock
+        product(2, "b", available=()),            # Sold out
+        product(3, "b", available=(0, 1)),        # Another size came back
+        product(4, "b", available=(0,), price="80.00"),
+        product(5, "b", available=(0,)),          # Touched, nothing we report changed
+        product(6, "b"),
+    ])
+    assert events == [
+        (RESTOCKED, 1, None), (SOLD_OUT, 2, None), (RESTOCKED, 3, None),
+        (PRICE_CHANGED, 4, None), (NEW, 6, None),
+    ]
+    assert second.changes == 5
+    assert not second.baseline
+
+
+def test_unchanged_products_produce_no_events():
+    differ = CatalogDiffer()
+    scan(differ, newest_first(3))
+    events, _ = scan(differ, newest_first(3))
+    assert events == []
+
+
+def test_sorted_store_stops_at_the_watermark():
+    differ = CatalogDiffer()
+    scan(differ, newest_first(10))
+    changed = [product(11, "2025-01-01T00:00:11", available=(0,))] + newest_first(10)
+    events, second = scan(differ, changed)
+    assert events == [(NEW, 11, None)]
+    assert second.stopped_early
+    assert second.compared == 2  # The new product and the first one at the watermark
+
+
+def test_unsorted_store_is_always_scanned_in_full():
+    differ = CatalogDiffer()
+    scan(differ, list(reversed(newest_first(10))))
+    _, second = scan(differ, list(reversed(newest_first(10))))
+    assert not second.stopped_early
+    assert second.compared == 10
+
+
+def test_periodic_full_scan_prunes_removed_products():
+    differ = CatalogDiffer()
+    scan(differ, newest_first(5))
+    snapshot = differ.stores[STORE]
+
+    # An early-stopped scan can't tell a removed product from one it never reached
+    scan(differ, newest_first(5)[1:])
+    assert len(snapshot.products) == 5
+
+    snapshot.scans = FULL_SCAN_INTERVAL
+    _, full = scan(differ, newest_first(5)[1:])
+    assert not full.stopped_early
+    assert 5 not in snapshot.products
+
+
+def test_aborted_scan_does_not_prune():
+    differ = CatalogDiffer()
+    scan(differ, list(reversed(newest_first(5))))
+    scan(differ, list(reversed(newest_first(5)))[:2], complete=False)
+    assert len(differ.stores[STORE].products) == 5
+
+
+def test_failed_event_is_redelivered_with_its_type_to_the_users_owed_it():
+    differ = CatalogDiffer()
+    scan(differ, [product(1, "a", available=())])
+    events, _ = scan(differ, [product(1, "b", available=(0,))])
+    assert events == [(RESTOCKED, 1, None)]
+
+    differ.retry_event(STORE, 1, RESTOCKED, 7)
+    differ.retry_event(STORE, 1, RESTOCKED, 8)
+    events, retry = scan(differ, [product(1, "b", available=(0,))])
+    assert events == [(RESTOCKED, 1, frozenset({7, 8}))]
+    assert retry.changes == 0  # Redelivery isn't catalog activity
+
+    events, _ = scan(differ, [product(1, "b", available=(0,))])
+    assert events == []
+
+
+def test_redelivery_reaches_products_below_the_watermark():
+    differ = CatalogDiffer()
+    scan(differ, newest_first(10))
+    scan(differ, newest_first(10))
+    differ.retry_event(STORE, 2, NEW, 7)
+    events, retry = scan(differ, newest_first(10))
+    assert events == [(NEW, 2, frozenset({7}))]
+
+
+def test_newer_change_supersedes_a_failed_event():
+    differ = CatalogDiffer()
+    scan(differ, [product(1, "a", available=(0,))])
+    differ.retry_event(STORE, 1, NEW, 7)
+    events, _ = scan(differ, [product(1, "b", available=(0,), price="90.00")])
+    assert events == [(PRICE_CHANGED, 1, None)]
+    assert not differ.stores[STORE].retries
+
+
+def test_retries_for_removed_products_are_dropped():
+    differ = CatalogDiffer()
+    scan(differ, [product(1, "a"), product(2, "a")])
+    differ.retry_event(STORE, 2, NEW, 7)
+    differ.retry_event(STORE, 3, NEW, 7)  # Never in this snapshot
+    scan(differ, [product(1, "a")])
+    assert differ.stores[STORE].retries == {}
+
+
+def test_retry_before_the_first_scan_is_kept_for_it():
+    differ = CatalogDiffer()
+    differ.retry_event(STORE, 1, RESTOCKED, 7)  # e.g. replayed from the journal after a restart
+    events, _ = scan(differ, [product(1, "a", available=(0,)), product(2, "a", available=(0,))])
+    assert (RESTOCKED, 1, frozenset({7})) in events
+    assert (NEW, 1, None) in events and (NEW, 2, None) in events
+    assert not differ.stores[STORE].retries
+
+
+def test_retries_survive_a_keyword_change():
+    differ = CatalogDiffer()
+    scan(differ, [product(1, "a", available=(0,))])
+    differ.retry_event(STORE, 1, RESTOCKED, 7)
+    current = differ.begin(STORE, "other keywords")
+    events = current.diff_page([product(1, "a", available=(0,))])
+    current.finish(True)
+    assert [(event, item.id, recipients) for event, item, recipients in events] == [
+        (NEW, 1, None), (RESTOCKED, 1, frozenset({7}))
+    ]
@@ -0,0 +1,95 @@
+import time
+
+from circuit_breaker import (
+    CLIENT_ERROR, CLOSED, DNS_ERROR, HALF_OPEN, OPEN, RATE_LIMITED, SERVER_ERROR, CircuitBreaker
+)
+
+STORE = "https://store.example"
+
+
+def expire(breaker, store_url=STORE):
+    breaker.circuits[store_url].open_until = time.time() - 1
+
+
+def test_opens_after_the_failure_kinds_threshold():
+    breaker = CircuitBreaker(jitter=0)
+    assert breaker.record_failure(STORE, SERVER_ERROR) == 0.0
+    assert breaker.record_failure(STORE, SERVER_ERROR) == 0.0
+    assert breaker.state(STORE) == CLOSED
+    assert breaker.record_failure(STORE, SERVER_ERROR) == 5.0
+    assert breaker.state(STORE) == OPEN
+    assert not breaker.allow(STORE)
+    assert not breaker.is_available(STORE)
+
+
+def test_dns_failure_opens_immediately():
+    breaker = CircuitBreaker(jitter=0)
+    assert breaker.record_failure(STORE, DNS_ERROR) == 60.0
+    assert breaker.state(STORE) == OPEN
+
+
+def test_half_open_lets_exactly_one_trial_through():
+    breaker = CircuitBreaker(jitter=0)
+    breaker.record_failure(STORE, DNS_ERROR)
+    expire(breaker)
+    assert breaker.is_available(STORE)
+    assert breaker.allow(STORE)
+    assert breaker.state(STORE) == HALF_OPEN
+    assert not breaker.allow(STORE)
+
+
+def test_lost_trial_is_retried_after_the_trial_timeout():
+    breaker = CircuitBreaker(jitter=0, trial_timeout=60)
+    breaker.record_failure(STORE, DNS_ERROR)
+    expire(breaker)
+    breaker.allow(STORE)
+    breaker.circuits[STORE].trial_started -= 61
+    assert breaker.allow(STORE)
+
+
+def test_failed_trial_reopens_with_doubled_backoff():
+    breaker = CircuitBreaker(jitter=0)
+    breaker.record_failure(STORE, CLIENT_ERROR)
+    breaker.record_failure(STORE, CLIENT_ERROR)
+    assert breaker.record_failure(STORE, CLIENT_ERROR) == 30.0
+    expire(breaker)
+    breaker.allow(STORE)
+    assert breaker.record_failure(STORE, CLIENT_ERROR) == 60.0  # One failure is enough while half-open
+
+
+def test_backoff_is_capped():
+    breaker = CircuitBreaker(max_backoff=100, jitter=0)
+    for _ in range(6):
+        backoff = breaker.record_failure(STORE, DNS_ERROR)
+        expire(breaker)
+        breaker.allow(STORE)
+    assert backoff == 100
+
+
+def test_retry_after_sets_the_first_backoff():
+    breaker = CircuitBreaker(jitter=0)
+    assert breaker.record_failure(STORE, RATE_LIMITED, retry_after=42) == 42
+    expire(breaker)
+    breaker.allow(STORE)
+    # Once the circuit has opened before, the longer of the two wins
+    assert breaker.record_failure(STORE, RATE_LIMITED, retry_after=1) == 10.0
+
+
+def test_success_closes_and_forgets_history():
+    breaker = CircuitBreaker(jitter=0)
+    breaker.record_failure(STORE, DNS_ERROR)
+    expire(breaker)
+    breaker.allow(STORE)
+    breaker.record_success(STORE)
+    assert breaker.state(STORE) == CLOSED
+    assert breaker.stats() == {}
+    assert breaker.record_failure(STORE, DNS_ERROR) == 60.0
+
+
+def test_next_attempt_at_is_side_effect_free():
+    breaker = CircuitBreaker(jitter=0)
+    assert breaker.next_attempt_at(STORE) <= time.time()
+    breaker.record_failure(STORE, DNS_ERROR)
+    assert breaker.next_attempt_at(STORE) == breaker.circuits[STORE].open_until
+    assert breaker.state(STORE) == OPEN
+    assert set(breaker.stats()) == {STORE}
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from discord_bot.db_pool import SQLitePool, create_pool
+
+
+def run_with_pool(database_url, scenario):
+    async def main():
+        pool = await create_pool(database_url)
+        try:
+            await scenario(pool)
+        finally:
+            await pool.close()
+    asyncio.run(main())
+
+
+def test_sqlite_url_gets_a_pool_that_takes_asyncpg_placeholders(tmp_path):
+    async def scenario(pool):
+        assert isinstance(pool, SQLitePool) and pool.size == 4
+        async with pool.acquire() as conn:
+            await conn.execute("CREATE TABLE store (id INTEGER PRIMARY KEY, user_id INTEGER, url TEXT)")
+            await conn.execute("INSERT INTO store (user_id, url) VALUES ($1, $2)", 7, "https://a.example")
+            await conn.execute("INSERT INTO store (user_id, url) VALUES ($1, $2)", 7, "https://b.example")
+        async with pool.acquire() as conn:
+            rows = await conn.fetch("SELECT url FROM store WHERE user_id = $1 ORDER BY url", 7)
+            assert [row['url'] for row in rows] == ["https://a.example", "https://b.example"]
+            assert await conn.fetchval("SELECT COUNT(*) FROM store WHERE url = $2 AND user_id = $1",
+                                       7, "https://a.example") == 1
+            assert await conn.fetchrow("SELECT * FROM store WHERE user_id = $1", 8) is None
+    run_with_pool(f"sqlite:///{tmp_path / 'bot.db'}", scenario)
+
+
+def test_memory_database_shares_one_connection():
+    async def scenario(pool):
+        assert pool.size == 1
+        async with pool.acquire() as conn:
+            await conn.execute("CREATE TABLE t (x INTEGER)")
+        async with pool.acquire() as conn:
+            assert await conn.fetchval("SELECT COUNT(*) FROM t") == 0
+    run_with_pool("sqlite://", scenario)
+
+
+def test_failed_transaction_rolls_back(tmp_path):
+    async def scenario(pool):
+        async with pool.acquire() as conn:
+            await conn.execute("CREATE TABLE t (x INTEGER)")
+            with pytest.raises(RuntimeError):
+                async with conn.transaction():
+                    await conn.execute("INSERT INTO t VALUES ($1)", 1)
+                    raise RuntimeError("abort")
+            async with conn.transaction():
+                await conn.execute("INSERT INTO t VALUES ($1)", 2)
+            assert await conn.fetchval("SELECT SUM(x) FROM t") == 2
+    run_with_pool(f"sqlite:///{tmp_path / 'bot.db'}", scenario)
+
+
+def test_connections_are_handed_out_one_command_at_a_time(tmp_path):
+    async def scenario(pool):
+        in_use = set()
+        peak = 0
+
+        async def command():
+            nonlocal peak
+            async with pool.acquire() as conn:
+                assert conn not in in_use
+                in_use.add(conn)
+                peak = max(peak, len(in_use))
+                await conn.fetchval("SELECT 1")
+                await asyncio.sleep(0.01)
+                in_use.discard(conn)
+
+        await asyncio.gather(*(command() for _ in range(12)))
+        assert peak == pool.size
+    run_with_pool(f"sqlite:///{tmp_path / 'bot.db'}", scenario)
+
+
+def test_missing_database_url_is_refused():
+    with pytest.raises(ValueError):
+        asyncio.run(create_pool(None))
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from discord_ratelimit import DiscordRateLimiter
+
+ROUTE_A = "https://discord.com/api/webhooks/1/a"
+ROUTE_B = "https://discord.com/api/webhooks/2/b"
+
+
+def headers(bucket="bucket-1", limit=5, remaining=4, reset_after=10.0):
+    return {
+        "X-RateLimit-Bucket": bucket,
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset-After": str(reset_after),
+    }
+
+
+async def blocked(limiter, route, timeout=0.05) -> bool:
+    try:
+        bucket = await asyncio.wait_for(limiter.acquire(route), timeout)
+    except asyncio.TimeoutError:
+        return True
+    limiter.release(route, bucket)
+    return False
+
+
+def test_unknown_bucket_sends_one_request_at_a_time():
+    async def main():
+        limiter = DiscordRateLimiter()
+        bucket = await limiter.acquire(ROUTE_A)
+        assert await blocked(limiter, ROUTE_A)
+        limiter.release(ROUTE_A, bucket, 204, headers(remaining=4))
+        assert not await blocked(limiter, ROUTE_A)
+    asyncio.run(main())
+
+
+def test_sends_as_fast_as_remaining_allows():
+    async def main():
+        limiter = DiscordRateLimiter()
+        limiter.release(ROUTE_A, await limiter.acquire(ROUTE_A), 204, headers(remaining=3))
+        started = time.monotonic()
+        buckets = [await limiter.acquire(ROUTE_A) for _ in range(3)]
+        assert time.monotonic() - started < 0.05
+        assert await blocked(limiter, ROUTE_A)
+        for bucket in buckets:
+            limiter.release(ROUTE_A, bucket)
+    asyncio.run(main())
+
+
+def test_routes_sharing_a_discord_bucket_share_its_budget():
+    async def main():
+        limiter = DiscordRateLimiter()
+        limiter.release(ROUTE_A, await limiter.acquire(ROUTE_A), 204, headers(remaining=1))
+        limiter.release(ROUTE_B, await limiter.acquire(ROUTE_B), 204, headers(remaining=0))
+
+        assert limiter.route_buckets == {ROUTE_A: "bucket-1", ROUTE_B: "bucket-1"}
+        assert list(limiter.buckets) == ["bucket-1"]
+        # B's response spent the last request of the shared window, so A waits too
+        assert await blocked(limiter, ROUTE_A)
+    asyncio.run(main())
+
+
+def test_separate_buckets_do_not_block_each_other():
+    async def main():
+        limiter = DiscordRateLimiter()
+        limiter.release(ROUTE_A, await limiter.acquire(ROUTE_A), 204, headers("bucket-a", remaining=0))
+        limiter.release(ROUTE_B, await limiter.acquire(ROUTE_B), 204, headers("bucket-b", remaining=4))
+        assert await blocked(limiter, ROUTE_A)
+        assert not await blocked(limiter, ROUTE_B)
+    asyncio.run(main())
+
+
+def test_exhausted_bucket_reopens_after_reset():
+    async def main():
+        limiter = DiscordRateLimiter()
+        limiter.release(ROUTE_A, await limiter.acquire(ROUTE_A), 204, headers(remaining=0, reset_after=0.1))
+        started = time.monotonic()
+        limiter.release(ROUTE_A, await limiter.acquire(ROUTE_A))
+        assert 0.08 <= time.monotonic() - started < 0.5
+    asyncio.run(main())
+
+
+def test_bucket_429_returns_retry_after_and_blocks_the_bucket():
+    async def main():
+        limiter = DiscordRateLimiter()
+        body = json.dumps({"retry_after": 0.5, "global": False})
+        retry_after = limiter.release(ROUTE_A, await limiter.acquire(ROUTE_A), 429,
+                                      headers(remaining=0, reset_after=0.5), body)
+        assert retry_after == pytest.approx(0.5)
+        assert limiter.bucket_limits == 1
+        assert await blocked(limiter, ROUTE_A)
+    asyncio.run(main())
+
+
+def test_global_429_pauses_every_route():
+    async def main():
+        limiter = DiscordRateLimiter()
+        limiter.release(ROUTE_B, await limiter.acquire(ROUTE_B), 204, headers("bucket-b", remaining=4))
+        body = json.dumps({"retry_after": 0.2, "global": True})
+        limiter.release(ROUTE_A, await limiter.acquire(ROUTE_A), 429, {"X-RateLimit-Global": "true"}, body)
+        assert limiter.global_limits == 1
+
+        started = time.monotonic()
+        limiter.release(ROUTE_B, await limiter.acquire(ROUTE_B))
+        assert time.monotonic() - started >= 0.18
+    asyncio.run(main())
+
+
+def test_stats_report_queue_depth():
+    async def main():
+        limiter = DiscordRateLimiter()
+        limiter.release(ROUTE_A, await limiter.acquire(ROUTE_A), 204, headers(remaining=0, reset_after=10))
+        waiters = [asyncio.create_task(limiter.acquire(ROUTE_A)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["queued"] == 3
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        assert limiter.stats()["queued"] == 0
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+import asyncio
+
+from aiohttp import web
+
+import discord_webhook
+from discord_webhook import RateLimitedDiscordWebhook
+from products import Product, Variant
+from standins import DiscordStandIn
+
+
+def product(product_id, event="new", price="100.00", sizes=1):
+    return Product(
+        id=product_id, title=f"Product {product_id}", handle=f"product-{product_id}",
+        store_url="https://store.example", price=price, image_url="", vendor="Vendor", product_type="Footwear",
+        tags=(), variants=tuple(Variant(product_id * 100 + size, f"US {size}", True, 1) for size in range(sizes)),
+        event=event
+    )
+
+
+def run_against_discord(scenario, **webhook_kwargs):
+    """Run ``scenario(webhook, discord, requests)`` against a local Discord stand-in.
+
+    ``requests`` collects (method, path and query, JSON body) of everything the webhook sent.
+    """
+    async def main():
+        discord = DiscordStandIn(limit=100)
+        requests = []
+
+        @web.middleware
+        async def record(request, handler):
+            requests.append((request.method, request.path_qs, await request.json()))
+            return await handler(request)
+
+        app = discord.app()
+        app.middlewares.append(record)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        webhook = RateLimitedDiscordWebhook("https://discord.com/api/webhooks/1/token",
+                                            **{"batch_window": 0.01, **webhook_kwargs})
+        webhook.webhook_url = f"http://127.0.0.1:{port}/api/webhooks/1/token"
+        try:
+            await scenario(webhook, discord, requests)
+        finally:
+            await discord_webhook.close_webhook_session()
+            await runner.cleanup()
+    asyncio.run(main())
+
+
+def test_thread_webhook_keeps_its_query_when_posting_and_editing():
+    async def scenario(webhook, discord, requests):
+        webhook.webhook_url += "?thread_id=42"
+        assert await webhook.send_product_notification(product(1))
+        assert await webhook.send_product_notification(product(1, event="restocked"))
+        assert [(method, path) for method, path, _ in requests] == [
+            ("POST", "/api/webhooks/1/token?thread_id=42&wait=true"),
+            ("PATCH", "/api/webhooks/1/token/messages/1?thread_id=42"),
+        ]
+    run_against_discord(scenario)
+
+
+def test_notifications_are_packed_up_to_ten_embeds_per_message():
+    async def scenario(webhook, discord, requests):
+        results = await asyncio.gather(*(webhook.send_product_notification(product(index)) for index in range(23)))
+        assert all(results)
+        assert [len(body["embeds"]) for _, _, body in requests] == [10, 10, 3]
+    run_against_discord(scenario)
+
+
+def test_messages_stay_under_the_embed_character_limit():
+    async def scenario(webhook, discord, requests):
+        # Long size runs make each embed over a thousand characters
+        results = await asyncio.gather(*(webhook.send_product_notification(product(index, sizes=30))
+                                         for index in range(8)))
+        assert all(results)
+        sizes = [[discord_webhook.embed_length(embed) for embed in body["embeds"]] for _, _, body in requests]
+        assert len(sizes) > 1
+        assert all(sum(message) <= discord_webhook.DISCORD_EMBED_CHAR_LIMIT for message in sizes)
+        assert sum(len(message) for message in sizes) == 8
+    run_against_discord(scenario)
+
+
+def test_changes_within_the_window_are_one_edit_of_the_original_message():
+    async def scenario(webhook, discord, requests):
+        assert await webhook.send_product_notification(product(1))
+        results = await asyncio.gather(
+            webhook.send_product_notification(product(1, event="price_changed", price="90.00")),
+            webhook.send_product_notification(product(1, event="price_changed", price="80.00")),
+            webhook.send_product_notification(product(1, event="sold_out", price="80.00")),
+        )
+        assert all(results)
+        assert [method for method, _, _ in requests] == ["POST", "PATCH"]
+        (embed,) = requests[1][2]["embeds"]
+        assert embed["fields"][0]["value"] == "80.00"
+        assert webhook.edits_sent == 1 and webhook.edits_coalesced == 2
+    run_against_discord(scenario)
+
+
+def test_changes_after_the_edit_window_are_posted_afresh():
+    async def scenario(webhook, discord, requests):
+        assert await webhook.send_product_notification(product(1))
+        assert await webhook.send_product_notification(product(1, event="restocked"))
+        assert [method for method, _, _ in requests] == ["POST", "POST"]
+        assert webhook.edits_sent == 0
+    run_against_discord(scenario, edit_window=0)
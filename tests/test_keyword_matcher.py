@@ -0,0 +1,52 @@
+import random
+
+from catalog_decode import CatalogProduct
+from keyword_matcher import KeywordIndex, get_matcher
+
+WORDS = ("dunk", "low", "panda", "jordan", "1", "retro", "air", "max", "90", "sb", "yeezy", "350", "v2", "dunks")
+PHRASES = ("dunk low", "air max 90", "air-max", "jordan 1 retro", "yeezy 350 v2", "1/2", "sb dunk")
+
+
+def product(rng, product_id):
+    title = " ".join(rng.choice(WORDS + ("Air-Max", "1/2", "Panda!")) for _ in range(rng.randint(1, 5)))
+    return CatalogProduct(id=product_id, title=title.title() if rng.random() < 0.5 else title,
+                          vendor=rng.choice(("Nike", "Adidas", None)), product_type="Footwear",
+                          tags=rng.sample(WORDS, rng.randint(0, 2)))
+
+
+def test_index_agrees_with_each_subscribers_matcher():
+    rng = random.Random(1)
+    subscriptions = {
+        subscriber: rng.sample(WORDS + PHRASES, rng.randint(1, 4)) + [rng.choice(("", " Dunk ", "LOW"))]
+        for subscriber in range(40)
+    }
+    index = KeywordIndex()
+    for subscriber, keywords in subscriptions.items():
+        for keyword in keywords:
+            index.add(subscriber, keyword)
+
+    products = [product(rng, product_id) for product_id in range(300)]
+    for item in products:
+        expected = {subscriber for subscriber, keywords in subscriptions.items()
+                    if get_matcher(keywords).matches(item)}
+        assert index.match(item) == expected, item.title
+
+
+def test_batch_matching_agrees_with_single_products():
+    rng = random.Random(2)
+    products = [product(rng, product_id) for product_id in range(300)]
+    for keywords in (["dunk"], ["air max 90", "yeezy"], ["1/2", "sb dunk", "panda"], []):
+        matcher = get_matcher(keywords)
+        assert matcher.match_batch(products) == [matcher.matches(item) for item in products]
+
+
+def test_updating_a_subscription_only_changes_that_subscriber():
+    index = KeywordIndex()
+    index.update("a", [], ["dunk", "air max"])
+    index.update("b", [], ["dunk"])
+    index.update("a", ["dunk", "air max"], ["yeezy"])
+    dunk = CatalogProduct(id=1, title="Nike Dunk Low")
+    air_max = CatalogProduct(id=2, title="Nike Air Max 90")
+    assert index.match(dunk) == {"b"}
+    assert index.match(air_max) == set()
+    assert len(index) == 2
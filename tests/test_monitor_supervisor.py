@@ -0,0 +1,132 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+import monitor_supervisor
+from config import EXIT_CONFIG_ERROR
+from monitor_supervisor import BACKOFF, EXITED, MISCONFIGURED, RUNNING, STOPPED, SUPERVISOR_ENV, MonitorSupervisor
+
+# Stands in for main.py: exits with EXIT_CODE if given, otherwise runs until terminated
+FAKE_MONITOR = """
+import os, sys, time
+if 'EXIT_CODE' in os.environ:
+    sys.exit(int(os.environ['EXIT_CODE']))
+time.sleep(60)
+"""
+
+ENV = {"DISCORD_WEBHOOK_URL": "https://discord.com/api/webhooks/1/token", "DATABASE_URL": "sqlite://"}
+
+
+@pytest.fixture
+def fake_monitor(tmp_path, monkeypatch):
+    script = tmp_path / "main.py"
+    script.write_text(FAKE_MONITOR)
+    monkeypatch.setattr(monitor_supervisor, "MAIN_SCRIPT", str(script))
+    monkeypatch.setattr(monitor_supervisor, "PROJECT_ROOT", str(tmp_path))
+    return str(script)
+
+
+def test_concurrent_starts_launch_one_process(fake_monitor):
+    async def main():
+        supervisor = MonitorSupervisor()
+        try:
+            results = await asyncio.gather(*(supervisor.start(1, ENV) for _ in range(3)))
+            assert [result['already_running'] for result in results].count(False) == 1
+            assert len({result['worker']['pid'] for result in results}) == 1
+        finally:
+            await supervisor.stop_all()
+    asyncio.run(main())
+
+
+def test_monitors_left_by_a_previous_supervisor_are_replaced(fake_monitor, tmp_path):
+    socket_path = str(tmp_path / "supervisor.sock")
+    orphan = subprocess.Popen([sys.executable, fake_monitor],
+                              env={**ENV, "MONITOR_USER_ID": "5", SUPERVISOR_ENV: socket_path})
+    unrelated = subprocess.Popen([sys.executable, fake_monitor], env={**ENV, "MONITOR_USER_ID": "6"})
+
+    async def main():
+        supervisor = MonitorSupervisor()
+        supervisor.socket_path = socket_path
+        await supervisor.adopt_orphans()
+        assert orphan.poll() is not None
+        assert unrelated.poll() is None
+        worker = supervisor.status(5)['worker']
+        assert worker['state'] == RUNNING and worker['pid'] != orphan.pid
+        assert supervisor.workers[5].env["DISCORD_WEBHOOK_URL"] == ENV["DISCORD_WEBHOOK_URL"]
+        await supervisor.stop_all()
+    try:
+        asyncio.run(main())
+    finally:
+        for process in (orphan, unrelated):
+            process.kill()
+            process.wait()
+
+
+async def wait_for_state(supervisor, user_id, state, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while supervisor.status(user_id)['worker']['state'] != state:
+        assert loop.time() < deadline, supervisor.status(user_id)
+        await asyncio.sleep(0.02)
+    return supervisor.status(user_id)['worker']
+
+
+def test_crashed_monitor_is_restarted_with_backoff(fake_monitor, monkeypatch):
+    monkeypatch.setattr(monitor_supervisor, "INITIAL_BACKOFF", 0.02)
+
+    async def main():
+        supervisor = MonitorSupervisor(max_backoff=0.1)
+        try:
+            await supervisor.start(1, {**ENV, "EXIT_CODE": "1"})
+            await asyncio.sleep(0.5)
+            worker = supervisor.status(1)['worker']
+            assert worker['restarts'] >= 2
+            assert worker['last_exit'] == 1
+            assert worker['state'] in (RUNNING, BACKOFF)
+        finally:
+            await supervisor.stop_all()
+        assert supervisor.status(1)['worker']['state'] == STOPPED
+    asyncio.run(main())
+
+
+def test_misconfigured_and_finished_monitors_are_not_restarted(fake_monitor):
+    async def main():
+        supervisor = MonitorSupervisor(max_backoff=0.1)
+        try:
+            await supervisor.start(1, {**ENV, "EXIT_CODE": str(EXIT_CONFIG_ERROR)})
+            await supervisor.start(2, {**ENV, "EXIT_CODE": "0"})
+            misconfigured = await wait_for_state(supervisor, 1, MISCONFIGURED)
+            exited = await wait_for_state(supervisor, 2, EXITED)
+            assert misconfigured['restarts'] == exited['restarts'] == 0
+
+            # Starting again once the configuration is fixed launches a new process
+            result = await supervisor.start(1, ENV)
+            assert not result['already_running']
+            await wait_for_state(supervisor, 1, RUNNING)
+        finally:
+            await supervisor.stop_all()
+    asyncio.run(main())
+
+
+def test_restart_keeps_the_previous_environment(fake_monitor):
+    async def main():
+        supervisor = MonitorSupervisor()
+        try:
+            first = (await supervisor.start(1, {**ENV, "EXTRA": "kept"}))['worker']
+            second = (await supervisor.restart(1))['worker']
+            assert second['state'] == RUNNING and second['pid'] != first['pid']
+            assert supervisor.workers[1].env["EXTRA"] == "kept"
+        finally:
+            await supervisor.stop_all()
+    asyncio.run(main())
+
+
+def test_start_refuses_an_incomplete_environment(fake_monitor):
+    async def main():
+        supervisor = MonitorSupervisor()
+        result = await supervisor.start(1, {"DISCORD_WEBHOOK_URL": "https://example.com/hook", "DATABASE_URL": "x"})
+        assert not result['ok'] and "webhook" in result['error']
+        assert supervisor.status(1)['worker']['state'] == STOPPED
+    asyncio.run(main())
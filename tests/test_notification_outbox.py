@@ -0,0 +1,186 @@
+import asyncio
+
+from catalog_diff import NEW, RESTOCKED
+from notification_outbox import NotificationOutbox
+from outbox_journal import OutboxJournal
+from products import Product, Variant
+from seen_store import SeenProductStore
+
+STORE = "https://store.example"
+WEBHOOK = "https://discord.com/api/webhooks/1/a"
+
+
+def product(product_id, event=NEW, price="100.00"):
+    return Product(
+        id=product_id, title=f"Product {product_id}", handle=f"product-{product_id}", store_url=STORE,
+        price=price, image_url="", vendor="Vendor", product_type="Footwear", tags=(),
+        variants=(Variant(product_id * 10, "10", True, 1),), event=event
+    )
+
+
+class Webhook:
+    """Records what it is asked to send; fails while ``failing``"""
+
+    def __init__(self, webhook_url=WEBHOOK):
+        self.webhook_url = webhook_url
+        self.failing = False
+        self.sent = []
+
+    async def send_product_notification(self, product) -> bool:
+        if self.failing:
+            return False
+        self.sent.append((product.id, product.event, product.price))
+        return True
+
+
+class Retries:
+    """Stands in for ShopifyMonitor.retry_product"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, store_url, product_id, event, user_id):
+        self.calls.append((product_id, event, user_id))
+
+
+def make_outbox(tmp_path, **kwargs):
+    seen = SeenProductStore(str(tmp_path / "seen.db"))
+    journal = OutboxJournal(str(tmp_path / "outbox.db"))
+    return NotificationOutbox(seen, journal, **kwargs), journal
+
+
+def journaled(journal):
+    journal.flush()
+    return [key for key, _ in journal.load([WEBHOOK])]
+
+
+async def drain(outbox):
+    while outbox.pending():
+        await asyncio.sleep(0.01)
+
+
+def test_failed_delivery_stays_journaled_until_the_retry_is_delivered(tmp_path):
+    async def main():
+        outbox, journal = make_outbox(tmp_path)
+        webhook, retries = Webhook(), Retries()
+        webhook.failing = True
+        await outbox.submit(webhook, STORE, [product(1, RESTOCKED)], 7, retries)
+        await drain(outbox)
+        assert retries.calls == [(1, RESTOCKED, 7)]
+        assert len(journaled(journal)) == 1  # A crash now still replays it
+
+        webhook.failing = False
+        await outbox.submit(webhook, STORE, [product(1, RESTOCKED)], 7, retries)
+        await drain(outbox)
+        assert webhook.sent == [(1, RESTOCKED, "100.00")]
+        assert journaled(journal) == []
+        await outbox.close(timeout=0)
+    asyncio.run(main())
+
+
+def test_newer_event_supersedes_a_failed_one_in_the_journal(tmp_path):
+    async def main():
+        outbox, journal = make_outbox(tmp_path)
+        webhook, retries = Webhook(), Retries()
+        webhook.failing = True
+        await outbox.submit(webhook, STORE, [product(1, RESTOCKED)], 7, retries)
+        await drain(outbox)
+
+        await outbox.submit(webhook, STORE, [product(1, RESTOCKED, price="80.00")], 7, retries)
+        (key,) = journaled(journal)
+        assert key.endswith(":80.00:1")
+        await outbox.close(timeout=0)
+    asyncio.run(main())
+
+
+def test_dropped_notification_stays_journaled(tmp_path):
+    async def main():
+        outbox, journal = make_outbox(tmp_path, max_pending=2)
+        webhook, retries = Webhook(), Retries()
+        # Submitted without yielding, so the worker can't drain in between
+        await outbox.submit(webhook, STORE, [product(1), product(2), product(3)], 7, retries)
+        assert outbox.dropped == 1
+        assert retries.calls == [(1, NEW, 7)]
+        assert len(journaled(journal)) == 3
+        await outbox.close(timeout=0)
+    asyncio.run(main())
+
+
+def test_newer_event_replaces_a_queued_one_for_the_same_product(tmp_path):
+    async def main():
+        outbox, journal = make_outbox(tmp_path)
+        webhook, retries = Webhook(), Retries()
+        await outbox.submit(webhook, STORE, [product(1, RESTOCKED), product(2)], 7, retries)
+        await outbox.submit(webhook, STORE, [product(1, RESTOCKED, price="80.00")], 7, retries)
+        # Another user's event for the same product is queued separately
+        await outbox.submit(webhook, STORE, [product(1, RESTOCKED)], 8, retries)
+        assert outbox.coalesced == 1
+        assert outbox.pending() == 3
+        await drain(outbox)
+        assert webhook.sent == [(1, RESTOCKED, "80.00"), (2, NEW, "100.00"), (1, RESTOCKED, "100.00")]
+        assert journaled(journal) == []
+        await outbox.close(timeout=0)
+    asyncio.run(main())
+
+
+def test_full_queue_drops_the_oldest_and_hands_it_back(tmp_path):
+    async def main():
+        outbox, _ = make_outbox(tmp_path, max_pending=2)
+        webhook, retries = Webhook(), Retries()
+        await outbox.submit(webhook, STORE, [product(1), product(2), product(3)], 7, retries)
+        assert retries.calls == [(1, NEW, 7)]
+        await drain(outbox)
+        assert [sent[0] for sent in webhook.sent] == [2, 3]
+        await outbox.close(timeout=0)
+    asyncio.run(main())
+
+
+def test_new_product_is_announced_once_per_title(tmp_path):
+    async def main():
+        outbox, _ = make_outbox(tmp_path)
+        webhook, retries = Webhook(), Retries()
+        assert await outbox.submit(webhook, STORE, [product(1)], 7, retries) == 1
+        assert await outbox.submit(webhook, STORE, [product(1)], 7, retries) == 0  # Still queued
+        await drain(outbox)
+        assert await outbox.submit(webhook, STORE, [product(1)], 7, retries) == 0  # Already seen
+        assert await outbox.submit(webhook, STORE, [product(1, RESTOCKED)], 7, retries) == 1
+        await drain(outbox)
+        assert webhook.sent == [(1, NEW, "100.00"), (1, RESTOCKED, "100.00")]
+        await outbox.close(timeout=0)
+    asyncio.run(main())
+
+
+def test_undelivered_notifications_are_replayed_after_a_restart(tmp_path):
+    async def main():
+        outbox, journal = make_outbox(tmp_path)
+        retries = Retries()
+        await outbox.submit(Webhook(), STORE, [product(1), product(2, RESTOCKED)], 7, retries)
+        await outbox.submit(Webhook("https://discord.com/api/webhooks/2/b"), STORE, [product(3)], 8, retries)
+        await outbox.close(timeout=0)  # Killed before the workers ran
+        journal.close()
+
+        restarted, journal = make_outbox(tmp_path)
+        restarted.seen_products.add(f"{STORE}-Product 1-7")  # Delivered just before the kill
+        webhook = Webhook()
+        assert await restarted.replay({WEBHOOK: webhook}, retries, user_id=7) == 1
+        await drain(restarted)
+        assert webhook.sent == [(2, RESTOCKED, "100.00")]
+        journal.flush()
+        # Only the other webhook's notification is left
+        assert [entry[0] for _, entry in journal.load([WEBHOOK, "https://discord.com/api/webhooks/2/b"])] == [
+            "https://discord.com/api/webhooks/2/b"
+        ]
+        await restarted.close(timeout=0)
+    asyncio.run(main())
+
+
+def test_journal_round_trips_products(tmp_path):
+    journal = OutboxJournal(str(tmp_path / "outbox.db"))
+    original = product(1, RESTOCKED, price="80.00")
+    journal.append("key", (WEBHOOK, STORE, 7, "seen-key", original, 1.0))
+    journal.flush()
+    ((key, (webhook_url, store_url, user_id, seen_key, restored, queued_at)),) = journal.load([WEBHOOK])
+    assert (key, webhook_url, store_url, user_id, seen_key, queued_at) == ("key", WEBHOOK, STORE, 7, "seen-key", 1.0)
+    assert restored.to_dict() == original.to_dict()
+    assert restored.event == RESTOCKED
+    journal.close()
@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+from seen_store import SeenProductStore
+
+
+def test_keys_survive_a_restart(tmp_path):
+    path = str(tmp_path / "seen.db")
+    store = SeenProductStore(path)
+    store.add("a")
+    store.close()
+
+    restarted = SeenProductStore(path)
+    assert restarted.load() == 1
+    assert restarted.complete
+    assert asyncio.run(restarted.seen("a"))
+    assert not asyncio.run(restarted.seen("b"))
+    assert restarted.disk_lookups == 0  # Every key is in memory, so a miss is definite
+    restarted.close()
+
+
+def test_keys_beyond_the_lru_are_looked_up_on_disk(tmp_path):
+    path = str(tmp_path / "seen.db")
+    store = SeenProductStore(path, front_size=2)
+    for key in ("a", "b", "c"):
+        store.add(key)
+    store.flush()
+    assert "a" not in store.front
+
+    restarted = SeenProductStore(path, front_size=2)
+    assert restarted.load() == 2
+    assert not restarted.complete
+    assert asyncio.run(restarted.seen("a"))
+    assert not asyncio.run(restarted.seen("d"))
+    assert restarted.disk_lookups == 2
+    store.close()
+    restarted.close()
+
+
+def test_expired_keys_read_as_unseen_and_are_purged(tmp_path):
+    store = SeenProductStore(str(tmp_path / "seen.db"), ttl=60)
+    store.add("fresh")
+    store.pending["stale"] = store.front["stale"] = time.time() - 120
+    assert not asyncio.run(store.seen("stale"))
+    assert asyncio.run(store.seen("fresh"))
+
+    store.flush()
+    assert store.query("SELECT key FROM seen_products") == [("fresh",)]
+    assert store.load() == 1
+    store.close()
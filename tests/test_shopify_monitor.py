@@ -0,0 +1,133 @@
+import asyncio
+
+from aiohttp import web
+
+from shopify_monitor import ShopifyMonitor
+from standins import ShopifyStandIn
+
+
+def run_against_store(catalog_size, scenario):
+    """Run ``scenario(monitor, shop, store_url)`` against one local stand-in store"""
+    async def main():
+        shop = ShopifyStandIn(stores=1, catalog_size=catalog_size, churn=0)
+        runner = web.AppRunner(shop.app())
+        await runner.setup()
+        await shop.start(runner)
+        monitor = ShopifyMonitor(rate_limit=100, rate_burst=100)
+        try:
+            await scenario(monitor, shop, shop.urls[0])
+        finally:
+            await monitor.cleanup()
+            await runner.cleanup()
+    asyncio.run(main())
+
+
+async def poll(monitor, shop, store_url, max_products=250, page_size=150):
+    """Fetch once; returns how many requests the store served"""
+    before = shop.requests
+    await monitor.async_fetch_products(store_url, ["drop0000"], max_products=max_products, page_size=page_size)
+    return shop.requests - before
+
+
+def test_single_page_store_costs_one_request_per_poll():
+    async def scenario(monitor, shop, store_url):
+        assert [await poll(monitor, shop, store_url) for _ in range(3)] == [1, 1, 1]
+    run_against_store(100, scenario)
+
+
+def test_pages_are_only_requested_once_known_to_exist():
+    async def scenario(monitor, shop, store_url):
+        # 500 products at 150 a page: the first poll finds the fourth, short page
+        assert await poll(monitor, shop, store_url, max_products=1000) == 4
+        assert monitor.catalog_pages[store_url] == 4
+    run_against_store(500, scenario)
+
+
+def test_page_that_stopped_a_scan_early_is_served_from_cache_next_time():
+    async def scenario(monitor, shop, store_url):
+        await poll(monitor, shop, store_url, max_products=300)
+        shop.stores[0].add("Classic Runner drop0000")
+        await poll(monitor, shop, store_url, max_products=300)
+
+        # The scan stopped on page 1, which must still count as processed
+        not_modified = shop.not_modified
+        await poll(monitor, shop, store_url, max_products=300)
+        assert shop.not_modified == not_modified + 1
+    run_against_store(300, scenario)
+
+
+def test_not_modified_without_a_cache_entry_refetches_the_page():
+    async def scenario(monitor, shop, store_url):
+        await poll(monitor, shop, store_url)
+        snapshot = monitor.catalog_differ.stores[store_url]
+        assert len(snapshot.products) == 100
+
+        # The entry is invalidated while the conditional request is in flight
+        monitor.response_cache.not_modified = lambda url, match_key: None
+        assert await poll(monitor, shop, store_url) == 2
+        assert len(snapshot.products) == 100
+    run_against_store(100, scenario)
+
+
+def test_failed_restock_is_redelivered_as_a_restock():
+    async def scenario(monitor, shop, store_url):
+        store = shop.stores[0]
+        product = store.add("Classic Runner drop0000")
+        for variant in product["variants"]:
+            variant["available"] = False
+        await monitor.async_fetch_products(store_url, ["drop0000"])
+
+        for variant in product["variants"]:
+            variant["available"] = True
+        product["updated_at"] = store._tick()
+        store.pages.clear()
+        [restock] = await monitor.async_fetch_products(store_url, ["drop0000"])
+        assert restock.event == "restocked"
+
+        monitor.retry_product(store_url, restock.id, restock.event, 7)
+        [retry] = await monitor.async_fetch_products(store_url, ["drop0000"])
+        assert (retry.id, retry.event, retry.recipients) == (restock.id, "restocked", frozenset({7}))
+        assert await monitor.async_fetch_products(store_url, ["drop0000"]) == []
+    run_against_store(20, scenario)
+
+
+def test_token_buckets_are_per_host():
+    async def main():
+        monitor = ShopifyMonitor(rate_limit=1, rate_burst=1)
+        limiter = monitor.rate_limiter
+        async with limiter.host("a.example"):
+            pass
+        limiter.retry_after("b.example", 10)
+        started = asyncio.get_running_loop().time()
+        async with limiter.host("c.example"):
+            pass
+        assert asyncio.get_running_loop().time() - started < 0.05
+        assert limiter.host("b.example").blocked_until > limiter.host("a.example").blocked_until
+        await monitor.cleanup()
+    asyncio.run(main())
+
+
+def test_abandoned_page_iteration_leaves_no_prefetch_running():
+    async def scenario(monitor, shop, store_url):
+        await poll(monitor, shop, store_url, max_products=1000)  # Learn that there are four pages
+        pages = monitor.iter_product_pages(store_url, max_products=1000, page_size=150)
+        await pages.__anext__()
+        await pages.aclose()
+        assert not [task for task in asyncio.all_tasks()
+                    if task.get_coro().__qualname__.endswith("_fetch_page") and not task.done()]
+    run_against_store(500, scenario)
+
+
+def test_new_rate_limit_applies_to_known_hosts():
+    async def main():
+        monitor = ShopifyMonitor(rate_limit=0.1, rate_burst=1)
+        limiter = monitor.rate_limiter
+        async with limiter.host("a.example"):
+            pass
+        limiter.set_rate(50)
+        started = asyncio.get_running_loop().time()
+        async with limiter.host("a.example"):
+            pass
+        assert asyncio.get_running_loop().time() - started < 0.1
+        await monitor.cleanup()
+    asyncio.run(main())
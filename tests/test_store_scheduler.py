@@ -0,0 +1,152 @@
+import asyncio
+
+from circuit_breaker import DNS_ERROR, CircuitBreaker
+from store_scheduler import StoreScheduler
+
+
+def run_for(scheduler, seconds, during=None):
+    async def main():
+        runner = asyncio.create_task(scheduler.run())
+        if during is not None:
+            await during()
+        await asyncio.sleep(seconds)
+        await scheduler.stop()
+        await runner
+    asyncio.run(main())
+
+
+class Recorder:
+    """Poll callback counting calls and concurrency, optionally slow for some stores"""
+
+    def __init__(self, durations=None, result=0):
+        self.durations = durations or {}
+        self.result = result
+        self.polls = {}
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, store_url):
+        self.polls[store_url] = self.polls.get(store_url, 0) + 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.durations.get(store_url, 0))
+        finally:
+            self.in_flight -= 1
+        return self.result
+
+
+def test_each_store_keeps_its_own_interval():
+    poll = Recorder()
+    intervals = {"fast": 0.02, "slow": 0.2}
+    scheduler = StoreScheduler(poll, lambda store_url, result: intervals[store_url])
+    scheduler.set_stores(intervals)
+    run_for(scheduler, 0.5)
+    assert poll.polls["slow"] in (2, 3, 4)
+    assert poll.polls["fast"] >= 10
+
+
+def test_slow_store_only_delays_itself():
+    poll = Recorder(durations={"slow": 0.5})
+    scheduler = StoreScheduler(poll, lambda store_url, result: 0.02, concurrency=2)
+    scheduler.set_stores(["slow", "fast"])
+    run_for(scheduler, 0.3)
+    assert poll.polls["slow"] == 1
+    assert poll.polls["fast"] >= 8
+
+
+def test_concurrency_is_capped():
+    poll = Recorder(durations={f"store-{index}": 0.05 for index in range(10)})
+    scheduler = StoreScheduler(poll, lambda store_url, result: 0.0, concurrency=3)
+    scheduler.set_stores(f"store-{index}" for index in range(10))
+    run_for(scheduler, 0.2)
+    assert poll.peak == 3
+    assert len(poll.polls) == 10
+
+
+def test_interval_sees_the_poll_result():
+    seen = []
+    poll = Recorder(result=4)
+    scheduler = StoreScheduler(poll, lambda store_url, result: seen.append(result) or 10.0)
+    scheduler.set_stores(["store"])
+    run_for(scheduler, 0.05)
+    assert seen == [4]
+
+
+def test_failed_poll_is_rescheduled_with_no_result():
+    seen = []
+
+    async def poll(store_url):
+        raise RuntimeError("boom")
+
+    scheduler = StoreScheduler(poll, lambda store_url, result: seen.append(result) or 0.02)
+    scheduler.set_stores(["store"])
+    run_for(scheduler, 0.1)
+    assert len(seen) >= 2
+    assert set(seen) == {None}
+
+
+def test_open_circuit_is_skipped_without_polling():
+    breaker = CircuitBreaker(jitter=0)
+    breaker.record_failure("dead", DNS_ERROR)
+    poll = Recorder()
+    scheduler = StoreScheduler(poll, lambda store_url, result: 0.02, circuit_breaker=breaker)
+    scheduler.set_stores(["dead", "live"])
+
+    async def check():
+        await asyncio.sleep(0.1)
+        assert "dead" in scheduler.due  # Pushed back to the breaker's next attempt, still scheduled
+
+    run_for(scheduler, 0, during=check)
+    assert "dead" not in poll.polls
+    assert poll.polls["live"] >= 2
+
+
+def test_store_set_changes_apply_while_running():
+    poll = Recorder()
+    scheduler = StoreScheduler(poll, lambda store_url, result: 0.02)
+    scheduler.set_stores(["old"])
+
+    async def swap():
+        await asyncio.sleep(0.1)
+        old_polls = poll.polls["old"]
+        scheduler.set_stores(["new"])
+        await asyncio.sleep(0.1)
+        assert poll.polls["old"] <= old_polls + 1  # At most the poll already in flight
+        assert poll.polls["new"] >= 2
+        assert scheduler.stores == {"new"}
+
+    run_for(scheduler, 0, during=swap)
+
+
+def test_restart_after_stop_polls_every_store_again():
+    poll = Recorder(durations={"busy": 0.5})
+    scheduler = StoreScheduler(poll, lambda store_url, result: 0.02)
+
+    async def main():
+        # As main.monitor_stores does when it is re-entered after an error
+        for _ in range(2):
+            poll.polls.clear()
+            scheduler.set_stores(["busy", "idle"])
+            runner = asyncio.create_task(scheduler.run())
+            await asyncio.sleep(0.1)  # Stops with "busy" in flight and "idle" waiting on the heap
+            await scheduler.stop()
+            await runner
+            assert poll.polls == {"busy": 1, "idle": poll.polls["idle"]}
+            assert poll.polls["idle"] >= 2
+
+    asyncio.run(main())
+
+
+def test_raised_concurrency_applies_while_running():
+    poll = Recorder(durations={f"store-{index}": 0.1 for index in range(6)})
+    scheduler = StoreScheduler(poll, lambda store_url, result: 10.0, concurrency=2)
+    scheduler.set_stores(f"store-{index}" for index in range(6))
+
+    async def raise_cap():
+        await asyncio.sleep(0.02)
+        assert poll.in_flight == 2
+        scheduler.set_concurrency(6)
+        await asyncio.sleep(0.02)
+        assert poll.in_flight == 6
+    run_for(scheduler, 0, during=raise_cap)
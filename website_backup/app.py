@@ -6,36 +6,28 @@ from flask_login import LoginManager, login_user, logout_user, login_required, c
 from models import db, User, Store, Keyword, MonitorConfig
 from forms import LoginForm, RegistrationForm, StoreForm, KeywordForm, ConfigForm, VariantScraperForm
 from discord_webhook import RateLimitedDiscordWebhook
-import subprocess
-import psutil
 import time
+from monitor_supervisor import SupervisorClient, SupervisorError
 from api_routes import api # Import the api blueprint
 from requests_oauthlib import OAuth2Session
 
+supervisor = SupervisorClient()
+
 def is_monitor_running(user_id):
     """Check if a specific user's monitor is running"""
     try:
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'environ']):
-            try:
-                # Check both environment variable and command line
-                env = proc.info.get('environ', {})
-                cmdline = ' '.join(proc.info['cmdline'] or [])
-
-                is_python = 'python' in proc.info['name'].lower()
-                is_monitor = ('main.py' in cmdline or 'start_monitor.py' in cmdline)
-                has_user_id = (
-                    f"MONITOR_USER_ID={user_id}" in cmdline or
-                    env.get('MONITOR_USER_ID') == str(user_id)
-                )
-
-                if is_python and is_monitor and has_user_id:
-                    return True
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        return False
-    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return supervisor.request_sync('status', user_id=user_id)['worker']['state'] == 'running'
+    except SupervisorError:
+        # No supervisor means no monitors
         return False
 
+def monitor_env(user):
+    """Per-user settings handed to the supervisor when starting a monitor"""
+    return {
+        'DISCORD_WEBHOOK_URL': user.discord_webhook_url,
+        'DATABASE_URL': os.environ.get('DATABASE_URL', '')
+    }
+
 def create_app():
     app = Flask(__name__)
     app.secret_key = os.environ.get('FLASK_SECRET_KEY', os.urandom(24))
@@ -256,8 +248,11 @@ def create_app():
             flash('Configuration updated successfully')
 
             if is_monitor_running(current_user.id):
-                subprocess.Popen(['python', 'main.py', f"MONITOR_USER_ID={current_user.id}"])
-                flash('Monitor restarted with new configuration')
+                try:
+                    supervisor.request_sync('restart', user_id=current_user.id, env=monitor_env(current_user))
+                    flash('Monitor restarted with new configuration')
+                except SupervisorError as e:
+                    flash(f'Failed to restart monitor: {e}', 'error')
 
             return redirect(url_for('dashboard'))
 
@@ -318,46 +313,19 @@ def create_app():
 
             if is_monitor_running(current_user.id):
                 # Stop only this user's monitor
-                for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                    try:
-                        cmdline = ' '.join(proc.info['cmdline'] or [])
-                        if ('python' in proc.info['name'] and 
-                            'main.py' in cmdline and 
-                            f"MONITOR_USER_ID={current_user.id}" in cmdline):
-                            process = psutil.Process(proc.info['pid'])
-                            process.terminate()
-                            try:
-                                process.wait(timeout=3)
-                            except psutil.TimeoutExpired:
-                                process.kill()
-                            flash('Monitor stopped successfully')
-                            break
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
+                supervisor.request_sync('stop', user_id=current_user.id)
+                flash('Monitor stopped successfully')
             else:
-                # Start a new monitor process for this user
-                env = os.environ.copy()
-                env['DISCORD_WEBHOOK_URL'] = current_user.discord_webhook_url
-                env['MONITOR_USER_ID'] = str(current_user.id)  # Set environment variable explicitly
-
-                # Start using start_monitor.py which handles logging and process management
-                process = subprocess.Popen(
-                    ['python', 'start_monitor.py', str(current_user.id)],
-                    env=env,
-                    start_new_session=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True
-                )
+                # The supervisor owns the monitor process, its log file and restarts
+                supervisor.ensure_running_sync()
+                supervisor.request_sync('start', user_id=current_user.id, env=monitor_env(current_user))
 
                 time.sleep(1)  # Brief pause to allow process to start
                 if is_monitor_running(current_user.id):
                     flash('Monitor started successfully')
                 else:
-                    # Check process output for errors
-                    output, _ = process.communicate(timeout=2)
-                    error_msg = output.strip() if output else "Unknown error"
-                    flash(f'Failed to start monitor. Error: {error_msg}', 'error')
+                    supervisor.request_sync('stop', user_id=current_user.id)
+                    flash('Failed to start monitor, check its log file for errors', 'error')
 
             return redirect(url_for('dashboard'))
         except Exception as e: